@@ -0,0 +1,59 @@
+"""
+Parse time and peak memory of the syntax tree for a large corpus.
+
+The corpus repeats test_scripts/ with each copy's functions renamed, so the
+whole thing parses as one program.
+
+    python benchmarks/bench_ast.py [--copies 1000] [--repeat 5]
+"""
+import argparse
+import glob
+import pathlib
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import pcpp  # noqa: E402
+
+
+def corpus(copies):
+    root = pathlib.Path(__file__).resolve().parent.parent
+    sources = [
+        pathlib.Path(path).read_text()
+        for path in sorted(glob.glob(str(root / "test_scripts" / "*.py")))
+    ]
+    chunks = []
+    for copy in range(copies):
+        for number, source in enumerate(sources):
+            for name in re.findall(r"def (\w+)", source):
+                source = re.sub(rf"\b{name}\b", f"{name}_{copy}_{number}", source)
+            chunks.append(source)
+    return "\n".join(chunks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--copies", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = corpus(args.copies).split("\n")
+    tokens = list(pcpp.lex(lines))
+
+    elapsed = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        pcpp.parse(tokens)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    tracemalloc.start()
+    tree = pcpp.parse(tokens)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{len(lines)} lines, {len(tokens)} tokens")
+    print(f"parse: {elapsed:.3f}s")
+    print(f"tree: {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB")
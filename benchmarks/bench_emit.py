@@ -0,0 +1,72 @@
+"""
+Emission time and peak memory on a deeply nested, 50k-statement program.
+
+The program is parsed once; then building the whole output as one string
+is compared with streaming it straight to a file through write(). Peak
+memory is what emission allocates on top of the parsed tree.
+
+    python benchmarks/bench_emit.py [--statements 50000] [--depth 50]
+"""
+import argparse
+import pathlib
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import pcpp  # noqa: E402
+
+
+def program(statement_count, depth):
+    lines = []
+    per_function = depth * 10
+    for f in range(statement_count // per_function):
+        lines.append(f"def f{f}(a):")
+        for level in range(depth):
+            indent = "    " * (level + 1)
+            lines.append(f"{indent}x{level} = a + {level}")
+            for i in range(8):
+                lines.append(f"{indent}x{level} = x{level} * {i} + a")
+            lines.append(f"{indent}while x{level} < {level}:")
+        lines.append("    " * (depth + 1) + "break")
+    lines.append("def main():")
+    lines.append("    return 42")
+    return "\n".join(lines) + "\n"
+
+
+def measure(action):
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    action()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--statements", type=int, default=50000)
+    parser.add_argument("--depth", type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    lines = program(args.statements, args.depth).split("\n")
+    _, parsed = pcpp.parse(pcpp.lex(lines))
+    print(f"parse: {time.perf_counter() - start:.3f}s")
+
+    def stream(path):
+        with open(path, "w") as f:
+            pcpp.write(parsed, f)
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = pathlib.Path(directory) / "out.cpp"
+        for name, action in [
+            ("string", lambda: parsed.evaluate()),
+            ("stream", lambda: stream(output)),
+        ]:
+            elapsed, peak = measure(action)
+            print(f"{name}: {elapsed:.3f}s, peak {peak / 2**20:.1f} MiB")
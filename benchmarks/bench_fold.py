@@ -0,0 +1,96 @@
+"""
+Emitted size and compile time of a generated corpus with and without
+constant folding and dead-code elimination.
+
+Each generated program has literal arithmetic, branches on literal
+conditions, statements after return and functions main() never calls. It is
+transpiled both ways and each output compiled --repeat times.
+
+    python benchmarks/bench_fold.py [--files 20] [--repeat 3] [--cxxflags "-O2"]
+"""
+import argparse
+import contextlib
+import pathlib
+import shlex
+import sys
+import tempfile
+import time
+from unittest import mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import build, pcpp  # noqa: E402
+
+
+def generate(seed, functions=40):
+    lines = []
+    for i in range(functions):
+        lines += [
+            f"def f{i}(n: int):",
+            f"    total = n * (60 * 60 * 24) + {seed} * {i} - (3 + 4) * 2",
+            "    if 1 > 2:",
+            "        total = total * 1000 + 7 // 2",
+            "    elif True:",
+            f"        total = total + (10 if {i} > 5 else 20)",
+            "    else:",
+            "        total = 0",
+            f"    for j in range(0, n, {i % 3} + 1):",
+            "        while False:",
+            "            total = total - j",
+            "        total = total + j % (4 * 4)",
+            "    return total",
+            "    total = total * 2",
+        ]
+    # main() calls every other function, the rest are dead
+    calls = " + ".join(f"f{i}(3)" for i in range(0, functions, 2))
+    lines += ["def main():", f"    return {calls}"]
+    return "\n".join(lines) + "\n"
+
+
+def compile_time(toolchain, cpp_file, object_file, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = toolchain.compile(cpp_file, object_file)
+        best = min(best, time.perf_counter() - start)
+        if result.returncode != 0:
+            raise Exception(result.stderr)
+    return best
+
+
+def unoptimized(tree, *args):
+    pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cxxflags")
+    args = parser.parse_args()
+
+    toolchain = build.Toolchain(
+        cxxflags=shlex.split(args.cxxflags) if args.cxxflags is not None else None
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        build.copy_header(directory)
+        object_file = directory / "out.o"
+        codes = [generate(seed) for seed in range(args.files)]
+        passes = ["fold_constants", "eliminate_dead_code"]
+        for name, skipped in [("unoptimized", passes), ("optimized", [])]:
+            size = 0
+            elapsed = 0
+            for i, code in enumerate(codes):
+                with contextlib.ExitStack() as stack:
+                    for skip in skipped:
+                        stack.enter_context(mock.patch.object(pcpp, skip, unoptimized))
+                    text = pcpp.transpile_code(code, False)
+                cpp_file = directory / f"{name}{i}.cpp"
+                cpp_file.write_text(text)
+                size += len(text)
+                elapsed += compile_time(toolchain, cpp_file, object_file, args.repeat)
+            print(
+                f"{name:>12}: {size / 1024:8.1f} KiB emitted, "
+                f"{elapsed:6.2f}s to compile {len(codes)} files"
+            )
@@ -0,0 +1,74 @@
+"""
+Run time of array expressions in pcpp against CPython with NumPy.
+
+benchmarks/programs/array_expr.py is built with pcpp.build and run, and the
+same expressions, written with NumPy, run in this process; each is reported
+with its best wall time over --repeat runs. NumPy is only needed here, not
+by pcpp.
+
+    python benchmarks/bench_numpy.py [--repeat 5] [--cxxflags "-O2"]
+"""
+import argparse
+import pathlib
+import shlex
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from bench_runtime import run_time  # noqa: E402
+
+from pcpp import build  # noqa: E402
+
+PROGRAM = pathlib.Path(__file__).resolve().parent / "programs" / "array_expr.py"
+
+
+def array_expr(np):
+    # the same expressions as PROGRAM; each NumPy operation stores its
+    # result in a temporary array, where pcpp fuses each line into one loop
+    n = 1000000
+    i = np.arange(n)
+    a = i % 1000 * 1.0
+    b = i * 7 % 1000 * 1.0
+    c = a * 2.5 + b
+    total = 0.0
+    for r in range(100):
+        c = a * 2.5 + b - r
+        d = (a - b) * (a + b) / 2.0
+        total = total + np.sum(c) + np.dot(a, d)
+    if total != 3553719875000000.0:
+        raise Exception(f"array_expr computed {total}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cxxflags")
+    args = parser.parse_args()
+
+    try:
+        import numpy
+    except ImportError:
+        sys.exit("bench_numpy.py needs NumPy: pip install numpy")
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        array_expr(numpy)
+        best = min(best, time.perf_counter() - start)
+    print(f"{'numpy ' + numpy.__version__:>20}: {best:.3f}s")
+
+    toolchain = build.Toolchain(
+        cxxflags=shlex.split(args.cxxflags) if args.cxxflags is not None else None
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        executable = pathlib.Path(directory) / PROGRAM.stem
+        report = build.build(
+            [(PROGRAM, executable)],
+            toolchain=toolchain,
+            cache_dir=pathlib.Path(directory) / "objects",
+        )
+        for program in report.failures:
+            sys.exit(f"{program.source}: {program.error}")
+        print(f"{'pcpp':>20}: {run_time(executable, args.repeat):.3f}s")
@@ -0,0 +1,39 @@
+"""
+Parse time as the token count grows from 1k to 1M tokens.
+
+The time per token should stay flat; a growing column means parse() has
+gone super-linear again.
+
+    python benchmarks/bench_parse.py [--max-tokens 1000000]
+"""
+import argparse
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import pcpp  # noqa: E402
+
+
+def statements(token_count):
+    # "a = 1 \n" is four tokens
+    return pcpp.tokenize("a = 1\n" * (token_count // 4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--max-tokens", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    token_count = 1000
+    while token_count <= args.max_tokens:
+        tokens = statements(token_count)
+        start = time.perf_counter()
+        pcpp.parse(tokens)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{len(tokens):>9} tokens: {elapsed:8.3f}s "
+            f"({elapsed / len(tokens) * 1e6:6.2f} us/token)"
+        )
+        token_count *= 10
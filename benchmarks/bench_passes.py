@@ -0,0 +1,37 @@
+"""
+Time and node count of each analysis pass over a large corpus.
+
+The corpus is the one of bench_ast.py. Each pass is reported with its best
+time over --repeat runs and the number of nodes it leaves; --verify adds the
+checks between passes to every run.
+
+    python benchmarks/bench_passes.py [--copies 100] [--repeat 3] [--verify]
+"""
+import argparse
+import io
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from bench_ast import corpus  # noqa: E402
+
+from pcpp import pcpp  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--copies", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--verify", action="store_true")
+    args = parser.parse_args()
+
+    code = corpus(args.copies)
+    best = {}
+    for _ in range(args.repeat):
+        include_flags, tree = pcpp.parse(pcpp.lex(io.StringIO(code)))
+        manager = pcpp.analyze(tree, include_flags, verify=args.verify)
+        for name, seconds, nodes in manager.timings:
+            best[name] = (min(seconds, best.get(name, (seconds,))[0]), nodes)
+    for name, (seconds, nodes) in best.items():
+        print(f"{name:>32}: {seconds * 1000:8.1f} ms, {nodes} nodes")
+    print(f"{'total':>32}: {sum(s for s, _ in best.values()) * 1000:8.1f} ms")
@@ -0,0 +1,73 @@
+"""
+Compile latency of test_scripts/ with and without the precompiled header.
+
+Each script is transpiled once and then compiled --repeat times with each
+configuration; the object cache is bypassed.
+
+    python benchmarks/bench_pch.py [--repeat 3] [--cxxflags "-O2"]
+"""
+import argparse
+import glob
+import pathlib
+import shlex
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import build  # noqa: E402
+
+
+def compile_latency(toolchain, cpp_files, object_file, repeat):
+    latencies = []
+    for cpp_file in cpp_files:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = toolchain.compile(cpp_file, object_file)
+            best = min(best, time.perf_counter() - start)
+            if result.returncode != 0:
+                raise Exception(result.stderr)
+        latencies.append(best)
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cxxflags")
+    args = parser.parse_args()
+
+    root = pathlib.Path(__file__).resolve().parent.parent
+    toolchain = build.Toolchain(
+        cxxflags=shlex.split(args.cxxflags) if args.cxxflags is not None else None
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        build.copy_header(directory)
+        cpp_files = []
+        for source in sorted(glob.glob(str(root / "test_scripts" / "*.py"))):
+            cpp_file = directory / pathlib.Path(source).with_suffix(".cpp").name
+            error, _, _ = build.transpile_file(
+                (source, cpp_file, {"use_template": False}, None)
+            )
+            if error is None:
+                cpp_files.append(cpp_file)
+
+        start = time.perf_counter()
+        with_pch = build.precompiled_header(toolchain, directory / "pch")
+        print(f"building the PCH: {time.perf_counter() - start:.3f}s")
+
+        object_file = directory / "out.o"
+        includes = ["#include" in cpp_file.read_text() for cpp_file in cpp_files]
+        for name, chain in [("without PCH", toolchain), ("with PCH", with_pch)]:
+            latencies = compile_latency(chain, cpp_files, object_file, args.repeat)
+            with_includes = [t for t, i in zip(latencies, includes) if i]
+            print(
+                f"{name:>12}: mean {statistics.mean(latencies) * 1000:7.1f} ms "
+                f"over {len(latencies)} files, "
+                f"{statistics.mean(with_includes) * 1000:7.1f} ms "
+                f"over the {len(with_includes)} that include headers"
+            )
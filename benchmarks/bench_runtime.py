@@ -0,0 +1,64 @@
+"""
+Run time of the pcpp programs in benchmarks/programs/.
+
+Each program is built with pcpp.build, run --repeat times and reported with
+its best wall time. Programs return 42 on success.
+
+    python benchmarks/bench_runtime.py [names...] [--repeat 5] [--cxxflags "-O2"]
+        [--int-model int32] [--bounds unchecked]
+"""
+import argparse
+import pathlib
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import build, pcpp  # noqa: E402
+
+
+def run_time(executable, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([str(executable)])
+        best = min(best, time.perf_counter() - start)
+        if result.returncode != 42:
+            raise Exception(f"{executable} returned {result.returncode}")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("names", nargs="*", help="programs to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cxxflags")
+    parser.add_argument("--int-model", choices=pcpp.INT_MODELS, default="int32")
+    parser.add_argument("--bounds", choices=pcpp.BOUNDS, default="unchecked")
+    args = parser.parse_args()
+
+    programs = pathlib.Path(__file__).resolve().parent / "programs"
+    sources = sorted(programs.glob("*.py"))
+    if args.names:
+        sources = [programs / f"{name}.py" for name in args.names]
+    toolchain = build.Toolchain(
+        cxxflags=shlex.split(args.cxxflags) if args.cxxflags is not None else None
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        report = build.build(
+            [(source, directory / source.stem) for source in sources],
+            toolchain=toolchain,
+            cache_dir=directory / "objects",
+            int_model=args.int_model,
+            bounds=args.bounds,
+        )
+        for program in report.failures:
+            print(f"{program.source}: {program.error}", file=sys.stderr)
+        for program in report.programs:
+            if program.error is None:
+                elapsed = run_time(program.executable, args.repeat)
+                print(f"{program.source.stem:>20}: {elapsed:.3f}s")
@@ -0,0 +1,80 @@
+"""
+Scaling of the prange() programs in benchmarks/programs/ across thread counts.
+
+Each program is built with pcpp.build, which compiles its prange() loops with
+OpenMP, and run --repeat times for each of --threads as OMP_NUM_THREADS. The
+best wall time is reported with the speedup over one thread.
+
+    python benchmarks/bench_threads.py [names...] [--repeat 5] [--threads 1 2 4]
+        [--cxxflags "-O2"]
+"""
+import argparse
+import os
+import pathlib
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import build  # noqa: E402
+
+
+def run_time(executable, repeat, threads):
+    environment = {**os.environ, "OMP_NUM_THREADS": str(threads)}
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([str(executable)], env=environment)
+        best = min(best, time.perf_counter() - start)
+        if result.returncode != 42:
+            raise Exception(f"{executable} returned {result.returncode}")
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("names", nargs="*", help="programs to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count()}),
+    )
+    parser.add_argument("--cxxflags")
+    args = parser.parse_args()
+
+    programs = pathlib.Path(__file__).resolve().parent / "programs"
+    sources = [
+        source
+        for source in sorted(programs.glob("*.py"))
+        if "prange(" in source.read_text()
+    ]
+    if args.names:
+        sources = [programs / f"{name}.py" for name in args.names]
+    toolchain = build.Toolchain(
+        cxxflags=shlex.split(args.cxxflags) if args.cxxflags is not None else None
+    )
+    print(f"{os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        report = build.build(
+            [(source, directory / source.stem) for source in sources],
+            toolchain=toolchain,
+            cache_dir=directory / "objects",
+        )
+        for program in report.failures:
+            print(f"{program.source}: {program.error}", file=sys.stderr)
+        for program in report.programs:
+            if program.error is None:
+                serial = None
+                for threads in args.threads:
+                    elapsed = run_time(program.executable, args.repeat, threads)
+                    serial = serial or elapsed
+                    print(
+                        f"{program.source.stem:>20}: {threads:>3} threads"
+                        f" {elapsed:.3f}s ({serial / elapsed:.2f}x)"
+                    )
@@ -0,0 +1,101 @@
+"""
+Tokenizer throughput in lines per second.
+
+Compares pcpp.tokenize() with the previous per-character symbol scan on a
+corpus built by repeating test_scripts/ until it reaches --lines lines.
+
+    python benchmarks/bench_tokenize.py [--lines 50000] [--repeat 3]
+"""
+import argparse
+import glob
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from pcpp import pcpp  # noqa: E402
+
+Token = pcpp.Token
+
+
+def legacy_tokenize(code):
+    symbols = [(symbol, Token(kind, kind)) for symbol, kind in pcpp.SYMBOLS.items()] + [
+        (word, Token(*token)) for word, token in pcpp.KEYWORDS.items()
+    ]
+    symbols.sort(key=lambda s: len(s[0]), reverse=True)
+    tokens = []
+    i = 0
+    while i < len(code):
+        for symbol, tokenized in symbols:
+            if code[i : i + len(symbol)] == symbol:
+                tokens.append(tokenized)
+                i += len(symbol)
+                break
+        else:
+            if code[i].isdigit():
+                start = i
+                while i < len(code) and (code[i].isdigit() or code[i] == "."):
+                    i += 1
+                if "." in code[start:i]:
+                    tokens.append(Token("float", float(code[start:i])))
+                else:
+                    tokens.append(Token("int", int(code[start:i])))
+            elif code[i].isalpha() or code[i] == "_":
+                start = i
+                while i < len(code) and (code[i].isalnum() or code[i] == "_"):
+                    i += 1
+                tokens.append(Token("name", code[start:i]))
+            elif code[i] == "\n":
+                indent_level = 0
+                while i + 1 < len(code) and code[i + 1] in [" ", "\t"]:
+                    i += 1
+                    indent_level += 1
+                tokens.append(Token("\n", indent_level))
+                i += 1
+            elif code[i] == '"':
+                start = i
+                i += 1
+                while code[i] != '"':
+                    i += 1
+                tokens.append(Token("str", code[start : i + 1]))
+                i += 1
+            elif code[i] == " ":
+                i += 1
+            else:
+                raise Exception("Unknown Symbol: " + code[i])
+    return tokens
+
+
+def corpus(lines):
+    root = pathlib.Path(__file__).resolve().parent.parent
+    sources = [
+        pcpp.unoffside(pathlib.Path(path).read_text())
+        for path in sorted(glob.glob(str(root / "test_scripts" / "*.py")))
+    ]
+    result = []
+    while len(result) < lines:
+        for source in sources:
+            result.extend(source.split("\n"))
+    return "\n".join(result[:lines])
+
+
+def measure(tokenizer, code, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokenizer(code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    code = corpus(args.lines)
+    for name, tokenizer in [("legacy", legacy_tokenize), ("tokenize", pcpp.tokenize)]:
+        elapsed = measure(tokenizer, code, args.repeat)
+        print(f"{name:>10}: {args.lines / elapsed:12,.0f} lines/s ({elapsed:.3f}s)")
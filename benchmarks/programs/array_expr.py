@@ -0,0 +1,13 @@
+def main():
+    n = 1000000
+    a: array[float] = [i % 1000 * 1.0 for i in range(n)]
+    b: array[float] = [i * 7 % 1000 * 1.0 for i in range(n)]
+    c = a * 2.5 + b
+    total = 0.0
+    for r in range(100):
+        c = a * 2.5 + b - r
+        d = (a - b) * (a + b) / 2.0
+        total = total + sum(c) + dot(a, d)
+    if total != 3553719875000000.0:
+        return 1
+    return 42
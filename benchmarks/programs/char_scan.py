@@ -0,0 +1,14 @@
+def main():
+    s = "a scan over a 100 MB str,"
+    i = 0
+    while i < 22:
+        s = s + s
+        i = i + 1
+    n = 0
+    for ch in s:
+        if ch == "a":
+            n = n + 1
+    for i in range(104857600):
+        if s[i] == "a":
+            n = n - 1
+    return n + 42
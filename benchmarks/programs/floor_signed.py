@@ -0,0 +1,14 @@
+def f(n: int):
+    t = 0
+    for i in range(-n, n):
+        t = t + i % 7 + i // 1000
+    return t
+
+
+def main():
+    total = 0
+    i = 0
+    while i < 500:
+        total = (total + f(100000 + i % 2)) % 1000003
+        i = i + 1
+    return total - 500 + 42
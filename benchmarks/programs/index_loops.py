@@ -0,0 +1,25 @@
+def smooth(a: list[int]):
+    total = 0
+    for i in range(1, len(a) - 1):
+        total = total + a[i - 1] * 3 + a[i] * 2 + a[i + 1]
+    return total
+
+
+def checksum(a: list[int]):
+    total = 0
+    i = 0
+    while i < len(a):
+        total = total + a[i] * 5
+        i = i + 1
+    return total
+
+
+def main():
+    a: list[int] = []
+    for i in range(100000):
+        a.append(i * 7919 % 1000)
+    total = 0
+    for r in range(2000):
+        a[r] = r
+        total = (total + smooth(a) + checksum(a)) % 1000
+    return total - 82 + 42
@@ -0,0 +1,13 @@
+def squares(n: int):
+    result: list[int] = []
+    for i in range(n):
+        result.append(i * i % 1000)
+    return result
+
+
+def main():
+    total = 0
+    for r in range(50):
+        doubled = [v * 2 for v in squares(200000 + r)]
+        total = (total + doubled[r + 100]) % 1000
+    return total - 850 + 42
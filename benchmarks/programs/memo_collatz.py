@@ -0,0 +1,18 @@
+from functools import cache
+
+
+@cache
+def steps(n: int):
+    if n == 1:
+        return 0
+    if n % 2 == 0:
+        return steps(n // 2) + 1
+    return steps(3 * n + 1) + 1
+
+
+def main():
+    longest = 0
+    for i in range(1, 100000):
+        if steps(i) > longest:
+            longest = steps(i)
+    return longest - 350 + 42
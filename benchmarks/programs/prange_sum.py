@@ -0,0 +1,14 @@
+def remainders(n: int, k: int):
+    total = 0
+    for j in range(n):
+        total = total + (j * k) % 7
+    return total
+
+
+def main():
+    counts = [0 for i in range(4000)]
+    total = 0
+    for i in prange(len(counts)):
+        counts[i] = remainders(100000 + i % 2, i % 5 + 1)
+        total = total + counts[i] % 1000
+    return total - counts[3999] - 900396 + 42
@@ -0,0 +1,14 @@
+def remainders(n: int):
+    total = 0
+    for j in range(n):
+        total = total + j % 7
+    return total
+
+
+def main():
+    total = 0
+    i = 0
+    while i < 2000:
+        total = total + remainders(100000 + i % 2)
+        i = i + 1
+    return total - 599995000 + 42
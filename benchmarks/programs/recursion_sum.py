@@ -0,0 +1,19 @@
+def digits(n: int):
+    if n == 0:
+        return 0
+    return n % 10 + digits(n // 10)
+
+
+def collatz(n: int, steps: int):
+    if n == 1:
+        return steps
+    if n % 2 == 0:
+        return collatz(n // 2, steps + 1)
+    return collatz(3 * n + 1, steps + 1)
+
+
+def main():
+    total = 0
+    for i in range(1, 100000):
+        total = (total + digits(i) + collatz(i, 0)) % 1000
+    return total - 712 + 42
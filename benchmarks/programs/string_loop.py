@@ -0,0 +1,21 @@
+def count(words: list[str], target: str):
+    n = 0
+    for word in words:
+        if word == target:
+            n = n + 1
+    return n
+
+
+def main():
+    words = [
+        "a string that is longer than sso",
+        "another long string past sso",
+        "a third string, also too long",
+        "a fourth string to compare",
+    ]
+    total = 0
+    i = 0
+    while i < 2000000:
+        total = total + count(words, words[i % 4])
+        i = i + 1
+    return total - 2000000 + 42
@@ -0,0 +1,10 @@
+def score(c: int):
+    table = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5, 8, 9, 7, 9, 3]
+    return table[c % 16]
+
+
+def main():
+    total = 0
+    for i in range(20000000):
+        total = (total + score(i)) % 1000
+    return total + 42
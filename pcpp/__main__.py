@@ -1,26 +1,114 @@
 import argparse
+import os
 import pathlib
-import shutil
+import sys
 
-import pcpp
+from pcpp import build, pcpp
+from pcpp.build import collect_sources, copy_header, transpile_files
+from pcpp.cache import TranspileCache
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["build"]:
+        return build.main(argv[1:])
 
-if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="pcpp: python transpiler to C++")
-    parser.add_argument("input_file", help="input file")
-    parser.add_argument("-o", "--output", help="output file")
+    parser.add_argument(
+        "inputs", nargs="+", help="input files, directories or glob patterns"
+    )
+    parser.add_argument("-o", "--output", help="output file for a single input")
+    parser.add_argument(
+        "-d", "--output-dir", help="mirror the inputs into this directory"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="number of parallel jobs (default: number of CPUs)",
+        type=int,
+        default=os.cpu_count(),
+    )
     parser.add_argument("--use_template", help="use template", action="store_true")
+    parser.add_argument(
+        "--int-model",
+        help="C++ representation of Python ints (default: int32)",
+        choices=pcpp.INT_MODELS,
+        default="int32",
+    )
+    parser.add_argument(
+        "--bounds",
+        help="check list and string indices (default: unchecked)",
+        choices=pcpp.BOUNDS,
+        default="unchecked",
+    )
+    parser.add_argument(
+        "--verify",
+        help="check the syntax tree after every analysis pass",
+        action="store_true",
+    )
+    parser.add_argument("--cache-dir", help="cache transpiled output in this directory")
+    parser.add_argument(
+        "--cache-size",
+        help="maximum size of the cache in MiB (default: 64)",
+        type=int,
+        default=64,
+    )
+    parser.add_argument(
+        "--cache-stats", help="print cache hits and misses", action="store_true"
+    )
+
+    args = parser.parse_args(argv)
+
+    sources, missing = collect_sources(args.inputs)
+    if args.output is not None and (len(sources) != 1 or args.output_dir):
+        parser.error("-o/--output needs exactly one input file and no --output-dir")
 
-    args = parser.parse_args()
-    if args.output is None:
-        args.output = args.input_file.replace(".py", ".cpp")
+    cache = None
+    if args.cache_dir is not None:
+        cache = TranspileCache(args.cache_dir, args.cache_size * 2**20)
 
-    parent_directory = pathlib.Path(args.output).parent
-    parent_directory.mkdir(parents=True, exist_ok=True)
+    options = {
+        "use_template": args.use_template,
+        "int_model": args.int_model,
+        "verify": args.verify,
+        "bounds": args.bounds,
+    }
+    jobs = []
+    for source, relative in sources:
+        if args.output is not None:
+            output = pathlib.Path(args.output)
+        elif args.output_dir is not None:
+            output = pathlib.Path(args.output_dir) / relative.with_suffix(".cpp")
+        else:
+            output = source.with_suffix(".cpp")
+        jobs.append((source, output, options, cache))
 
-    header_directory = pathlib.Path(__file__).parent
+    for directory in sorted({output.parent for _, output, _, _ in jobs}):
+        directory.mkdir(parents=True, exist_ok=True)
+        copy_header(directory)
 
-    shutil.copyfile(header_directory / "pcpp.h", parent_directory / "pcpp.h")
+    results = transpile_files(jobs, args.jobs)
 
-    with open(args.input_file, "r", encoding="utf-8") as f:
-        code = f.read()
-        pcpp.main(code, args.output, args.use_template)
+    failures = [f"{name}: no such file or directory" for name in missing]
+    hits = misses = 0
+    for (source, _, _, _), (error, job_hits, job_misses) in zip(jobs, results):
+        if error is not None:
+            failures.append(f"{source}: {error}")
+        hits += job_hits
+        misses += job_misses
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures:
+        print(
+            f"{len(failures)} of {len(jobs) + len(missing)} inputs failed",
+            file=sys.stderr,
+        )
+    if cache is not None and args.cache_stats:
+        print(f"cache: {hits} hits, {misses} misses", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
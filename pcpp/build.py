@@ -0,0 +1,472 @@
+import argparse
+import concurrent.futures
+import copy
+import filecmp
+import glob
+import hashlib
+import os
+import pathlib
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pcpp import pcpp
+
+HEADER = pathlib.Path(__file__).parent / "pcpp.h"
+
+
+def collect_sources(inputs):
+    """
+    Expand input files, directories and glob patterns.
+
+    Return a list of (source, relative) pairs, where relative is the path the
+    output takes under an output directory: the path below a directory
+    argument, below the fixed prefix of a glob pattern, or just the file name.
+    Inputs that match nothing are returned separately.
+    """
+    sources = []
+    missing = []
+    for name in inputs:
+        path = pathlib.Path(name)
+        if path.is_dir():
+            sources.extend(
+                (source, source.relative_to(path))
+                for source in sorted(path.rglob("*.py"))
+            )
+        elif path.is_file():
+            sources.append((path, pathlib.Path(path.name)))
+        elif glob.has_magic(name):
+            base = pathlib.Path()
+            for part in path.parts:
+                if glob.has_magic(part):
+                    break
+                base /= part
+            matches = [
+                pathlib.Path(match)
+                for match in sorted(glob.glob(name, recursive=True))
+                if os.path.isfile(match)
+            ]
+            sources.extend((match, match.relative_to(base)) for match in matches)
+            if not matches:
+                missing.append(name)
+        else:
+            missing.append(name)
+    return sources, missing
+
+
+def copy_header(directory):
+    """
+    Copy pcpp.h into directory unless an identical copy is already there.
+    """
+    header = directory / "pcpp.h"
+    if not header.exists() or not filecmp.cmp(HEADER, header, shallow=False):
+        shutil.copyfile(HEADER, header)
+
+
+def transpile_file(job):
+    """
+    Transpile one file; run in a worker process.
+
+    job is (input file, output file, options, cache), where options are the
+    keyword arguments of pcpp.main(). Return an error message (None on
+    success) and the cache hits and misses.
+    """
+    input_file, output_file, options, cache = job
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    try:
+        with open(input_file, "r", encoding="utf-8") as f:
+            pcpp.main(f, output_file, cache=cache, **options)
+        error = None
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    if cache is None:
+        return error, 0, 0
+    return error, cache.hits - hits, cache.misses - misses
+
+
+def transpile_files(jobs, workers):
+    """
+    Run transpile_file over jobs, in a process pool when there is more than
+    one job and worker.
+    """
+    if len(jobs) > 1 and workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            return list(executor.map(transpile_file, jobs, chunksize=chunksize))
+    return [transpile_file(job) for job in jobs]
+
+
+def find_compiler():
+    """
+    Return the C++ compiler from $CXX, or the first of clang++, g++ and c++
+    found on PATH.
+    """
+    if os.environ.get("CXX"):
+        return os.environ["CXX"]
+    for name in ("clang++", "g++", "c++"):
+        if shutil.which(name):
+            return name
+    raise Exception("No C++ compiler found; set CXX")
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(base) / "pcpp" / "objects"
+
+
+class Toolchain:
+    """
+    A C++ compiler and the flags to compile and link with.
+    """
+
+    def __init__(self, compiler=None, cxxflags=None, ldflags=None):
+        self.compiler = compiler or find_compiler()
+        if cxxflags is None:
+            cxxflags = shlex.split(os.environ.get("CXXFLAGS", "-O2"))
+        if ldflags is None:
+            ldflags = shlex.split(os.environ.get("LDFLAGS", ""))
+        self.cxxflags = ["-std=c++20", *cxxflags]
+        self.ldflags = ldflags
+        self._identity = None
+
+    def identity(self):
+        """
+        Return the compiler's --version banner, which identifies the exact
+        compiler build for cache keys.
+        """
+        if self._identity is None:
+            result = subprocess.run(
+                [self.compiler, "--version"], capture_output=True, text=True
+            )
+            self._identity = self.compiler + "\0" + result.stdout
+        return self._identity
+
+    def is_clang(self):
+        return "clang" in self.identity()
+
+    def with_flags(self, flags, ldflags=()):
+        """
+        Return a copy of this toolchain that also compiles with flags, and
+        links with ldflags.
+        """
+        toolchain = copy.copy(self)
+        toolchain.cxxflags = [*self.cxxflags, *flags]
+        toolchain.ldflags = [*self.ldflags, *ldflags]
+        return toolchain
+
+    def precompile(self, header, output):
+        command = [self.compiler, *self.cxxflags, "-x", "c++-header", str(header)]
+        return subprocess.run(
+            [*command, "-o", str(output)], capture_output=True, text=True
+        )
+
+    def compile(self, cpp_file, object_file):
+        command = [self.compiler, *self.cxxflags, "-c", str(cpp_file)]
+        return subprocess.run(
+            [*command, "-o", str(object_file)], capture_output=True, text=True
+        )
+
+    def link(self, object_file, executable):
+        return subprocess.run(
+            [self.compiler, str(object_file), *self.ldflags, "-o", str(executable)],
+            capture_output=True,
+            text=True,
+        )
+
+
+class ObjectCache:
+    """
+    Object files keyed on the generated C++, pcpp.h, the compiler and the
+    compile flags, so an unchanged translation unit is never recompiled.
+    """
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+
+    def path(self, cpp_file, toolchain):
+        digest = hashlib.sha256(toolchain.identity().encode())
+        digest.update("\0".join(toolchain.cxxflags).encode())
+        digest.update(b"\0")
+        digest.update(HEADER.read_bytes())
+        digest.update(b"\0")
+        digest.update(pathlib.Path(cpp_file).read_bytes())
+        key = digest.hexdigest()
+        return self.directory / key[:2] / f"{key}.o"
+
+
+def precompiled_header(toolchain, directory):
+    """
+    Build, or reuse, a precompiled header bundling pcpp.h with every standard
+    header the transpiler can emit, and return a toolchain that force-includes
+    it.
+
+    The PCH is stored under directory in a subdirectory named after a hash of
+    pcpp.h, the compiler and the flags, so changing any of them builds a
+    fresh one.
+    """
+    text = pcpp.evaluate_include_flags({flag: True for flag in pcpp.INCLUDE_FLAGS})
+    digest = hashlib.sha256(toolchain.identity().encode())
+    digest.update("\0".join(toolchain.cxxflags).encode())
+    digest.update(b"\0")
+    digest.update(HEADER.read_bytes())
+    digest.update(b"\0")
+    digest.update(text.encode())
+    directory = pathlib.Path(directory) / digest.hexdigest()
+    header = directory / "pcpp_pch.h"
+    # clang and gcc both pick up header.pch/header.gch for "-include header"
+    suffix = ".pch" if toolchain.is_clang() else ".gch"
+    compiled = header.with_name(header.name + suffix)
+
+    if not compiled.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        copy_header(directory)
+        header.write_text(text)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix=suffix)
+        os.close(fd)
+        result = toolchain.precompile(header, temporary)
+        if result.returncode != 0:
+            os.unlink(temporary)
+            raise Exception(f"Precompiling {header} failed: {result.stderr.strip()}")
+        os.replace(temporary, compiled)
+
+    return toolchain.with_flags(["-include", str(header)])
+
+
+class Program:
+    """
+    One input file on its way to an executable.
+    """
+
+    def __init__(self, source, executable):
+        self.source = source
+        self.executable = executable
+        self.cpp = executable.with_suffix(".cpp")
+        self.object = None
+        self.cached = False
+        self.error = None
+
+
+class BuildReport:
+    def __init__(self, programs, timings):
+        self.programs = programs
+        self.timings = timings
+
+    @property
+    def failures(self):
+        return [program for program in self.programs if program.error is not None]
+
+    def summary(self):
+        compiled = [p for p in self.programs if p.object is not None]
+        cached = sum(1 for p in compiled if p.cached)
+        counts = {
+            "transpile": f"{len(self.programs)} files",
+            "compile": f"{len(compiled) - cached} compiled, {cached} cached",
+            "link": f"{sum(1 for p in compiled if p.error is None)} linked",
+        }
+        return "\n".join(
+            f"{stage}: {seconds:.3f}s"
+            + (f" ({counts[stage]})" if stage in counts else "")
+            for stage, seconds in self.timings.items()
+        )
+
+
+def compile_program(program, toolchain, cache):
+    """
+    Compile program.cpp into the object cache unless it is already there.
+    """
+    object_file = cache.path(program.cpp, toolchain)
+    if object_file.exists():
+        program.object = object_file
+        program.cached = True
+        return
+    object_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=object_file.parent, suffix=".tmp.o")
+    os.close(fd)
+    result = toolchain.compile(program.cpp, temporary)
+    if result.returncode != 0:
+        os.unlink(temporary)
+        program.error = result.stderr.strip() or "compilation failed"
+        return
+    os.replace(temporary, object_file)
+    program.object = object_file
+
+
+def link_program(program, toolchain):
+    result = toolchain.link(program.object, program.executable)
+    if result.returncode != 0:
+        program.error = result.stderr.strip() or "linking failed"
+
+
+def build(
+    targets,
+    toolchain=None,
+    jobs=None,
+    cache_dir=None,
+    use_template=False,
+    transpile_cache=None,
+    pch=False,
+    int_model="int32",
+    bounds="unchecked",
+):
+    """
+    Transpile, compile and link each (source, executable) pair in targets.
+    The generated C++ is written next to the executable.
+
+    Compiler and linker jobs run in parallel, and objects are reused from
+    cache_dir when the generated C++ is unchanged. With pch, every unit that
+    includes headers is compiled against a precompiled header (see
+    precompiled_header()). A unit with prange() loops is compiled and linked
+    with -fopenmp, against a PCH of its own. Return a
+    BuildReport with the wall time of each stage.
+    """
+    toolchain = toolchain or Toolchain()
+    jobs = jobs or os.cpu_count()
+    cache = ObjectCache(cache_dir or default_cache_dir())
+    programs = [
+        Program(pathlib.Path(source), pathlib.Path(executable))
+        for source, executable in targets
+    ]
+    timings = {}
+
+    start = time.perf_counter()
+    for directory in sorted({program.cpp.parent for program in programs}):
+        directory.mkdir(parents=True, exist_ok=True)
+        copy_header(directory)
+    options = {"use_template": use_template, "int_model": int_model, "bounds": bounds}
+    results = transpile_files(
+        [(p.source, p.cpp, options, transpile_cache) for p in programs], jobs
+    )
+    for program, (error, _, _) in zip(programs, results):
+        program.error = error
+    timings["transpile"] = time.perf_counter() - start
+
+    # prange() loops are OpenMP parallel for pragmas
+    parallel = {
+        program
+        for program in programs
+        if program.error is None and "#pragma omp" in program.cpp.read_text()
+    }
+    toolchains = {False: toolchain}
+    if parallel:
+        toolchains[True] = toolchain.with_flags(["-fopenmp"], ["-fopenmp"])
+    pch_toolchains = toolchains
+    if pch:
+        start = time.perf_counter()
+        # a PCH is only used with the OpenMP setting it was built with
+        pch_toolchains = {
+            openmp: precompiled_header(base, cache.directory / "pch")
+            for openmp, base in toolchains.items()
+        }
+        timings["pch"] = time.perf_counter() - start
+
+    def compile_one(program):
+        # loading the PCH costs more than it saves for a unit without includes
+        if "#include" in program.cpp.read_text():
+            compile_program(program, pch_toolchains[program in parallel], cache)
+        else:
+            compile_program(program, toolchains[program in parallel], cache)
+
+    def link_one(program):
+        link_program(program, toolchains[program in parallel])
+
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        start = time.perf_counter()
+        pending = [p for p in programs if p.error is None]
+        list(executor.map(compile_one, pending))
+        timings["compile"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pending = [p for p in programs if p.error is None]
+        list(executor.map(link_one, pending))
+        timings["link"] = time.perf_counter() - start
+
+    return BuildReport(programs, timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="pcpp build",
+        description="pcpp build: transpile, compile and link into executables",
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="input files, directories or glob patterns"
+    )
+    parser.add_argument("-o", "--output", help="executable for a single input")
+    parser.add_argument(
+        "-d",
+        "--output-dir",
+        help="directory for executables and generated C++ (default: build)",
+        default="build",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="number of parallel jobs (default: number of CPUs)",
+        type=int,
+        default=os.cpu_count(),
+    )
+    parser.add_argument("--cxx", help="C++ compiler (default: $CXX)")
+    parser.add_argument("--cxxflags", help="compile flags (default: $CXXFLAGS or -O2)")
+    parser.add_argument("--ldflags", help="link flags (default: $LDFLAGS)")
+    parser.add_argument(
+        "--object-cache",
+        help=f"object cache directory (default: {default_cache_dir()})",
+    )
+    parser.add_argument(
+        "--pch",
+        help="compile against a precompiled pcpp.h and standard headers",
+        action="store_true",
+    )
+    parser.add_argument("--use_template", help="use template", action="store_true")
+    parser.add_argument(
+        "--int-model",
+        help="C++ representation of Python ints (default: int32)",
+        choices=pcpp.INT_MODELS,
+        default="int32",
+    )
+    parser.add_argument(
+        "--bounds",
+        help="check list and string indices (default: unchecked)",
+        choices=pcpp.BOUNDS,
+        default="unchecked",
+    )
+
+    args = parser.parse_args(argv)
+
+    sources, missing = collect_sources(args.inputs)
+    if args.output is not None:
+        if len(sources) != 1:
+            parser.error("-o/--output needs exactly one input file")
+        targets = [(sources[0][0], args.output)]
+    else:
+        output_dir = pathlib.Path(args.output_dir)
+        targets = [
+            (source, output_dir / relative.with_suffix(""))
+            for source, relative in sources
+        ]
+
+    toolchain = Toolchain(
+        args.cxx,
+        shlex.split(args.cxxflags) if args.cxxflags is not None else None,
+        shlex.split(args.ldflags) if args.ldflags is not None else None,
+    )
+    report = build(
+        targets,
+        toolchain,
+        args.jobs,
+        args.object_cache,
+        args.use_template,
+        pch=args.pch,
+        int_model=args.int_model,
+        bounds=args.bounds,
+    )
+
+    failures = [f"{name}: no such file or directory" for name in missing]
+    failures.extend(f"{p.source}: {p.error}" for p in report.failures)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    print(report.summary(), file=sys.stderr)
+    return 1 if failures else 0
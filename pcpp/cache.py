@@ -0,0 +1,102 @@
+import hashlib
+import os
+import pathlib
+import tempfile
+
+from pcpp import __version__
+
+# the files whose changes change the transpiled output
+SOURCES = [pathlib.Path(__file__).parent / name for name in ("pcpp.py", "pcpp.h")]
+
+
+def transpiler_digest():
+    """
+    Return a hash of the pcpp version and the contents of SOURCES.
+    """
+    digest = hashlib.sha256(__version__.encode())
+    for source in SOURCES:
+        digest.update(b"\0")
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+class TranspileCache:
+    """
+    A content-addressed, on-disk cache of transpiled C++.
+
+    Entries are keyed on a hash of the source, the transpiler (see
+    transpiler_digest()) and the transpile options. Once the entries grow past
+    max_bytes, the least recently used ones are evicted; an entry's mtime
+    records its last use.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 2**20):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.transpiler = transpiler_digest()
+
+    def key(self, code, **options):
+        """
+        Return the cache key for code transpiled with the given options.
+        """
+        digest = hashlib.sha256(self.transpiler.encode())
+        for name in sorted(options):
+            digest.update(f"\0{name}={options[name]!r}".encode())
+        digest.update(b"\0")
+        digest.update(code.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.cpp"
+
+    def get(self, key):
+        """
+        Return the cached output for key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def put(self, key, text):
+        """
+        Store text under key, then evict entries over the size limit.
+
+        The entry is written to a temporary file and renamed into place, so
+        concurrent readers never see a partial entry.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for path in self.directory.glob("*/*.cpp"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -1,20 +1,51 @@
+#ifndef PCPP_H
+#define PCPP_H
+
+#include <cstdint>
+#include <stdexcept>
+#include <vector>
+
+// Arrays and memo tables need headers of their own, so they are only
+// compiled when the generated code defines PCPP_ARRAY or PCPP_MEMO before
+// including this file.
+
+#ifdef PCPP_ARRAY
+#include <algorithm>
+#include <cmath>
+#include <new>
+#include <type_traits>
+#include <utility>
+#endif
+
+#ifdef PCPP_MEMO
+#include <functional>
+#include <list>
+#include <optional>
+#include <tuple>
+#include <unordered_map>
+#include <utility>
+#ifdef PCPP_MEMO_STATS
+#include <cstdio>
+#endif
+#endif
+
 namespace pcpp
 {
 
     class Range
     {
     private:
-        int m_value;
-        const int m_end;
-        const int m_step;
+        std::int64_t m_value;
+        const std::int64_t m_end;
+        const std::int64_t m_step;
 
     public:
-        Range(int begin, int end, int step)
+        Range(std::int64_t begin, std::int64_t end, std::int64_t step)
             : m_value(begin), m_end(end), m_step(step)
         {
         }
 
-        int value() const
+        std::int64_t value() const
         {
             return m_value;
         }
@@ -24,12 +55,12 @@ namespace pcpp
             return *this;
         }
 
-        int end() const
+        std::int64_t end() const
         {
             return m_end;
         }
 
-        bool operator!=(const int value) const
+        bool operator!=(const std::int64_t value) const
         {
             return m_step > 0 ? m_value < value : m_value > value;
         }
@@ -38,9 +69,924 @@ namespace pcpp
         {
             m_value += m_step;
         }
-        const int operator*() const
+        const std::int64_t operator*() const
+        {
+            return m_value;
+        }
+    };
+
+    // // and % rounding toward negative infinity, as in Python; C++ truncates
+    // toward zero, which differs when the remainder and divisor differ in
+    // sign. The conditions use & rather than && so that both compile to a
+    // select rather than a branch.
+
+    template <typename A, typename B>
+    constexpr auto floordiv(A a, B b)
+    {
+        auto quotient = a / b;
+        auto remainder = a % b;
+        return (remainder != 0) & ((remainder < 0) != (b < 0)) ? quotient - 1
+                                                               : quotient;
+    }
+
+    template <typename A, typename B>
+    constexpr auto floormod(A a, B b)
+    {
+        auto remainder = a % b;
+        return (remainder != 0) & ((remainder < 0) != (b < 0)) ? remainder + b
+                                                               : remainder;
+    }
+
+    // --int-model=checked: arithmetic that raises instead of wrapping around
+
+    inline std::int64_t checked_add(std::int64_t a, std::int64_t b)
+    {
+        std::int64_t result;
+        if (__builtin_add_overflow(a, b, &result))
+            throw std::overflow_error("integer overflow");
+        return result;
+    }
+
+    inline std::int64_t checked_sub(std::int64_t a, std::int64_t b)
+    {
+        std::int64_t result;
+        if (__builtin_sub_overflow(a, b, &result))
+            throw std::overflow_error("integer overflow");
+        return result;
+    }
+
+    inline std::int64_t checked_mul(std::int64_t a, std::int64_t b)
+    {
+        std::int64_t result;
+        if (__builtin_mul_overflow(a, b, &result))
+            throw std::overflow_error("integer overflow");
+        return result;
+    }
+
+    inline std::int64_t checked_neg(std::int64_t a)
+    {
+        return checked_sub(0, a);
+    }
+
+    // --bounds=checked: indexing that counts negative indices from the end
+    // and raises on an index out of range, as Python does
+
+    template <typename Sequence, typename Index>
+    decltype(auto) at(Sequence &sequence, Index index)
+    {
+        auto size = static_cast<std::int64_t>(sequence.size());
+        auto i = static_cast<std::int64_t>(index);
+        if (i < 0)
+            i += size;
+        if (i < 0 || i >= size)
+            throw std::out_of_range("index out of range");
+        return sequence[static_cast<std::size_t>(i)];
+    }
+
+    // --int-model=bigint: an arbitrary-precision integer with Python semantics
+
+    class BigInt
+    {
+    private:
+        using Limbs = std::vector<std::uint32_t>;
+
+        // sign and magnitude; limbs are least significant first, without
+        // leading zeros, and zero is never negative
+        bool m_negative = false;
+        Limbs m_limbs;
+
+        void trim()
+        {
+            while (!m_limbs.empty() && m_limbs.back() == 0)
+                m_limbs.pop_back();
+            if (m_limbs.empty())
+                m_negative = false;
+        }
+
+        static int compare(const Limbs &a, const Limbs &b)
+        {
+            if (a.size() != b.size())
+                return a.size() < b.size() ? -1 : 1;
+            for (std::size_t i = a.size(); i-- > 0;)
+                if (a[i] != b[i])
+                    return a[i] < b[i] ? -1 : 1;
+            return 0;
+        }
+
+        static Limbs add(const Limbs &a, const Limbs &b)
+        {
+            const Limbs &longer = a.size() < b.size() ? b : a;
+            const Limbs &shorter = a.size() < b.size() ? a : b;
+            Limbs result(longer.size() + 1);
+            std::uint64_t carry = 0;
+            for (std::size_t i = 0; i < longer.size(); ++i)
+            {
+                carry += longer[i];
+                if (i < shorter.size())
+                    carry += shorter[i];
+                result[i] = static_cast<std::uint32_t>(carry);
+                carry >>= 32;
+            }
+            result[longer.size()] = static_cast<std::uint32_t>(carry);
+            return result;
+        }
+
+        // a - b for a >= b
+        static Limbs subtract(const Limbs &a, const Limbs &b)
+        {
+            Limbs result(a.size());
+            std::int64_t borrow = 0;
+            for (std::size_t i = 0; i < a.size(); ++i)
+            {
+                std::int64_t digit = static_cast<std::int64_t>(a[i]) - borrow;
+                if (i < b.size())
+                    digit -= b[i];
+                borrow = digit < 0;
+                result[i] = static_cast<std::uint32_t>(digit + (borrow << 32));
+            }
+            return result;
+        }
+
+        static Limbs multiply(const Limbs &a, const Limbs &b)
+        {
+            Limbs result(a.size() + b.size());
+            for (std::size_t i = 0; i < a.size(); ++i)
+            {
+                std::uint64_t carry = 0;
+                for (std::size_t j = 0; j < b.size(); ++j)
+                {
+                    carry += static_cast<std::uint64_t>(a[i]) * b[j] + result[i + j];
+                    result[i + j] = static_cast<std::uint32_t>(carry);
+                    carry >>= 32;
+                }
+                result[i + b.size()] = static_cast<std::uint32_t>(carry);
+            }
+            return result;
+        }
+
+        // truncating division of magnitudes, one bit at a time
+        static void divide(const Limbs &a, const Limbs &b, Limbs &quotient,
+                           Limbs &remainder)
+        {
+            quotient.assign(a.size(), 0);
+            remainder.clear();
+            for (std::size_t bit = a.size() * 32; bit-- > 0;)
+            {
+                std::uint32_t carry = (a[bit / 32] >> (bit % 32)) & 1;
+                for (std::uint32_t &limb : remainder)
+                {
+                    std::uint32_t next = limb >> 31;
+                    limb = (limb << 1) | carry;
+                    carry = next;
+                }
+                if (carry)
+                    remainder.push_back(carry);
+                if (compare(remainder, b) >= 0)
+                {
+                    remainder = subtract(remainder, b);
+                    while (!remainder.empty() && remainder.back() == 0)
+                        remainder.pop_back();
+                    quotient[bit / 32] |= std::uint32_t(1) << (bit % 32);
+                }
+            }
+        }
+
+        // floor division and modulo, as in Python
+        static void divmod(const BigInt &a, const BigInt &b, BigInt &quotient,
+                           BigInt &remainder)
+        {
+            if (b.m_limbs.empty())
+                throw std::domain_error("integer division or modulo by zero");
+            divide(a.m_limbs, b.m_limbs, quotient.m_limbs, remainder.m_limbs);
+            quotient.m_negative = a.m_negative != b.m_negative;
+            remainder.m_negative = a.m_negative;
+            quotient.trim();
+            remainder.trim();
+            if (!remainder.m_limbs.empty() && a.m_negative != b.m_negative)
+            {
+                quotient = quotient - 1;
+                remainder = remainder + b;
+            }
+        }
+
+    public:
+        BigInt(std::int64_t value = 0) : m_negative(value < 0)
+        {
+            std::uint64_t magnitude = static_cast<std::uint64_t>(value);
+            if (m_negative)
+                magnitude = 0 - magnitude;
+            for (; magnitude != 0; magnitude >>= 32)
+                m_limbs.push_back(static_cast<std::uint32_t>(magnitude));
+        }
+
+        // an exact match for int, so that BigInt(0) does not also match the
+        // const char * constructor
+        BigInt(int value) : BigInt(static_cast<std::int64_t>(value))
+        {
+        }
+
+        // a decimal literal too large for std::int64_t
+        explicit BigInt(const char *digits)
+        {
+            bool negative = *digits == '-';
+            for (digits += negative; *digits; ++digits)
+                *this = *this * 10 + (*digits - '0');
+            m_negative = negative;
+            trim();
+        }
+
+        explicit operator std::int64_t() const
+        {
+            if (m_limbs.size() > 2)
+                throw std::overflow_error("int too large to convert");
+            std::uint64_t magnitude = 0;
+            for (std::size_t i = m_limbs.size(); i-- > 0;)
+                magnitude = (magnitude << 32) | m_limbs[i];
+            if (magnitude > (std::uint64_t(1) << 63) - !m_negative)
+                throw std::overflow_error("int too large to convert");
+            return static_cast<std::int64_t>(m_negative ? 0 - magnitude : magnitude);
+        }
+
+        explicit operator double() const
+        {
+            double result = 0;
+            for (std::size_t i = m_limbs.size(); i-- > 0;)
+                result = result * 4294967296.0 + m_limbs[i];
+            return m_negative ? -result : result;
+        }
+
+        explicit operator bool() const
+        {
+            return !m_limbs.empty();
+        }
+
+        friend BigInt operator-(const BigInt &a)
+        {
+            BigInt result = a;
+            result.m_negative = !a.m_negative && !a.m_limbs.empty();
+            return result;
+        }
+
+        friend BigInt operator+(const BigInt &a, const BigInt &b)
+        {
+            BigInt result;
+            if (a.m_negative == b.m_negative)
+            {
+                result.m_limbs = add(a.m_limbs, b.m_limbs);
+                result.m_negative = a.m_negative;
+            }
+            else if (compare(a.m_limbs, b.m_limbs) >= 0)
+            {
+                result.m_limbs = subtract(a.m_limbs, b.m_limbs);
+                result.m_negative = a.m_negative;
+            }
+            else
+            {
+                result.m_limbs = subtract(b.m_limbs, a.m_limbs);
+                result.m_negative = b.m_negative;
+            }
+            result.trim();
+            return result;
+        }
+
+        friend BigInt operator-(const BigInt &a, const BigInt &b)
+        {
+            return a + -b;
+        }
+
+        friend BigInt operator*(const BigInt &a, const BigInt &b)
+        {
+            BigInt result;
+            result.m_limbs = multiply(a.m_limbs, b.m_limbs);
+            result.m_negative = a.m_negative != b.m_negative;
+            result.trim();
+            return result;
+        }
+
+        friend BigInt operator/(const BigInt &a, const BigInt &b)
+        {
+            BigInt quotient, remainder;
+            divmod(a, b, quotient, remainder);
+            return quotient;
+        }
+
+        friend BigInt operator%(const BigInt &a, const BigInt &b)
+        {
+            BigInt quotient, remainder;
+            divmod(a, b, quotient, remainder);
+            return remainder;
+        }
+
+        friend bool operator==(const BigInt &a, const BigInt &b)
+        {
+            return a.m_negative == b.m_negative && a.m_limbs == b.m_limbs;
+        }
+
+        friend bool operator!=(const BigInt &a, const BigInt &b)
+        {
+            return !(a == b);
+        }
+
+        friend bool operator<(const BigInt &a, const BigInt &b)
+        {
+            if (a.m_negative != b.m_negative)
+                return a.m_negative;
+            int order = compare(a.m_limbs, b.m_limbs);
+            return a.m_negative ? order > 0 : order < 0;
+        }
+
+        friend bool operator>(const BigInt &a, const BigInt &b)
+        {
+            return b < a;
+        }
+
+        friend bool operator<=(const BigInt &a, const BigInt &b)
+        {
+            return !(b < a);
+        }
+
+        friend bool operator>=(const BigInt &a, const BigInt &b)
+        {
+            return !(a < b);
+        }
+
+        BigInt &operator+=(const BigInt &b)
+        {
+            return *this = *this + b;
+        }
+
+        BigInt &operator-=(const BigInt &b)
+        {
+            return *this = *this - b;
+        }
+
+        BigInt &operator++()
+        {
+            return *this += 1;
+        }
+
+        BigInt &operator--()
+        {
+            return *this -= 1;
+        }
+
+        friend std::size_t hash_value(const BigInt &a)
+        {
+            std::size_t result = a.m_negative;
+            for (std::uint32_t limb : a.m_limbs)
+                result = result * 1000003 ^ limb;
+            return result;
+        }
+    };
+
+#ifdef PCPP_ARRAY
+
+    // array[int] and array[float]: a contiguous buffer aligned for SIMD
+    // loads. Elementwise + - * // on arrays and scalars, and / through
+    // true_divide(), build expression templates, which assigning to an Array
+    // evaluates in a single loop, without temporary arrays.
+
+    template <typename T>
+    class Array;
+
+    template <typename Operation, typename Left, typename Right>
+    class Elementwise;
+
+    template <typename T>
+    constexpr bool is_array_expression = false;
+
+    template <typename T>
+    constexpr bool is_array_expression<Array<T>> = true;
+
+    template <typename Operation, typename Left, typename Right>
+    constexpr bool is_array_expression<Elementwise<Operation, Left, Right>> = true;
+
+    // a scalar operand, the same at every index
+    template <typename T>
+    struct Broadcast
+    {
+        T m_value;
+
+        Broadcast(T value) : m_value(value)
+        {
+        }
+
+        T operator[](std::size_t) const
         {
             return m_value;
         }
     };
+
+    // how an operand is held: arrays by reference, as they outlive the
+    // statement that uses them, and expressions and scalars by value
+    template <typename T>
+    struct Operand
+    {
+        using type = Broadcast<T>;
+    };
+
+    template <typename T>
+    struct Operand<Array<T>>
+    {
+        using type = const Array<T> &;
+    };
+
+    template <typename Operation, typename Left, typename Right>
+    struct Operand<Elementwise<Operation, Left, Right>>
+    {
+        using type = Elementwise<Operation, Left, Right>;
+    };
+
+    struct Add
+    {
+        template <typename A, typename B>
+        static auto apply(A a, B b)
+        {
+            return a + b;
+        }
+    };
+
+    struct Subtract
+    {
+        template <typename A, typename B>
+        static auto apply(A a, B b)
+        {
+            return a - b;
+        }
+    };
+
+    struct Multiply
+    {
+        template <typename A, typename B>
+        static auto apply(A a, B b)
+        {
+            return a * b;
+        }
+    };
+
+    // Python's //, rounding toward negative infinity
+    struct FloorDivide
+    {
+        template <typename A, typename B>
+        static auto apply(A a, B b)
+        {
+            if constexpr (std::is_integral_v<A> && std::is_integral_v<B>)
+                return floordiv(a, b);
+            else
+                return std::floor(a / b);
+        }
+    };
+
+    // Python's /, which divides ints as floats
+    struct TrueDivide
+    {
+        template <typename A, typename B>
+        static double apply(A a, B b)
+        {
+            return static_cast<double>(a) / b;
+        }
+    };
+
+    template <typename Operation, typename Left, typename Right>
+    class Elementwise
+    {
+    private:
+        typename Operand<Left>::type m_left;
+        typename Operand<Right>::type m_right;
+        std::size_t m_size;
+
+    public:
+        using LeftOperand = typename Operand<Left>::type;
+        using RightOperand = typename Operand<Right>::type;
+        using value_type = decltype(Operation::apply(
+            std::declval<LeftOperand>()[0], std::declval<RightOperand>()[0]));
+
+        Elementwise(const Left &left, const Right &right)
+            : m_left(left), m_right(right)
+        {
+            if constexpr (!is_array_expression<Right>)
+                m_size = left.size();
+            else if constexpr (!is_array_expression<Left>)
+                m_size = right.size();
+            else if (left.size() != right.size())
+                throw std::invalid_argument(
+                    "operands could not be broadcast together");
+            else
+                m_size = left.size();
+        }
+
+        std::size_t size() const
+        {
+            return m_size;
+        }
+
+        value_type operator[](std::size_t i) const
+        {
+            return Operation::apply(m_left[i], m_right[i]);
+        }
+    };
+
+    template <typename Left, typename Right>
+    constexpr bool is_elementwise =
+        is_array_expression<Left> || is_array_expression<Right>;
+
+    template <typename Left, typename Right,
+              typename = std::enable_if_t<is_elementwise<Left, Right>>>
+    Elementwise<Add, Left, Right> operator+(const Left &left, const Right &right)
+    {
+        return {left, right};
+    }
+
+    template <typename Left, typename Right,
+              typename = std::enable_if_t<is_elementwise<Left, Right>>>
+    Elementwise<Subtract, Left, Right> operator-(const Left &left,
+                                                 const Right &right)
+    {
+        return {left, right};
+    }
+
+    // -x is -1 * x, which keeps the sign of zero as negation does
+    template <typename Expression,
+              typename = std::enable_if_t<is_array_expression<Expression>>>
+    Elementwise<Multiply, Expression, int> operator-(const Expression &expression)
+    {
+        return {expression, -1};
+    }
+
+    template <typename Left, typename Right,
+              typename = std::enable_if_t<is_elementwise<Left, Right>>>
+    Elementwise<Multiply, Left, Right> operator*(const Left &left,
+                                                 const Right &right)
+    {
+        return {left, right};
+    }
+
+    template <typename Left, typename Right,
+              typename = std::enable_if_t<is_elementwise<Left, Right>>>
+    Elementwise<FloorDivide, Left, Right> operator/(const Left &left,
+                                                    const Right &right)
+    {
+        return {left, right};
+    }
+
+    template <typename Left, typename Right,
+              typename = std::enable_if_t<is_elementwise<Left, Right>>>
+    Elementwise<TrueDivide, Left, Right> true_divide(const Left &left,
+                                                     const Right &right)
+    {
+        return {left, right};
+    }
+
+    template <typename T>
+    class Array
+    {
+    private:
+        static constexpr std::align_val_t ALIGNMENT{64};
+
+        T *m_data = nullptr;
+        std::size_t m_size = 0;
+
+        void allocate(std::size_t size)
+        {
+            m_size = size;
+            m_data = size == 0 ? nullptr
+                               : static_cast<T *>(::operator new[](
+                                     size * sizeof(T), ALIGNMENT));
+        }
+
+        void release()
+        {
+            if (m_data != nullptr)
+                ::operator delete[](m_data, ALIGNMENT);
+            m_data = nullptr;
+            m_size = 0;
+        }
+
+        // each element only depends on the same index of the operands, so
+        // an expression may read the array it is written to
+        template <typename Expression>
+        void evaluate(const Expression &expression)
+        {
+            T *data = m_data;
+            for (std::size_t i = 0; i < m_size; ++i)
+                data[i] = static_cast<T>(expression[i]);
+        }
+
+    public:
+        using value_type = T;
+
+        Array() = default;
+
+        explicit Array(std::size_t size)
+        {
+            allocate(size);
+            std::fill(m_data, m_data + size, T(0));
+        }
+
+        template <typename U>
+        Array(const std::vector<U> &values)
+        {
+            allocate(values.size());
+            for (std::size_t i = 0; i < m_size; ++i)
+                m_data[i] = static_cast<T>(values[i]);
+        }
+
+        template <typename Expression,
+                  typename = std::enable_if_t<is_array_expression<Expression>>>
+        Array(const Expression &expression)
+        {
+            allocate(expression.size());
+            evaluate(expression);
+        }
+
+        Array(const Array &other) : Array(other.size())
+        {
+            std::copy(other.begin(), other.end(), m_data);
+        }
+
+        Array(Array &&other) noexcept : m_data(other.m_data), m_size(other.m_size)
+        {
+            other.m_data = nullptr;
+            other.m_size = 0;
+        }
+
+        ~Array()
+        {
+            release();
+        }
+
+        Array &operator=(const Array &other)
+        {
+            if (this != &other)
+                *this = Array(other);
+            return *this;
+        }
+
+        Array &operator=(Array &&other) noexcept
+        {
+            std::swap(m_data, other.m_data);
+            std::swap(m_size, other.m_size);
+            return *this;
+        }
+
+        template <typename Expression,
+                  typename = std::enable_if_t<is_array_expression<Expression>>>
+        Array &operator=(const Expression &expression)
+        {
+            if (expression.size() != m_size)
+            {
+                // an expression over this array has its size, so it is not
+                // read after the buffer is replaced
+                release();
+                allocate(expression.size());
+            }
+            evaluate(expression);
+            return *this;
+        }
+
+        std::size_t size() const
+        {
+            return m_size;
+        }
+
+        T &operator[](std::size_t i)
+        {
+            return m_data[i];
+        }
+
+        const T &operator[](std::size_t i) const
+        {
+            return m_data[i];
+        }
+
+        T *begin()
+        {
+            return m_data;
+        }
+
+        T *end()
+        {
+            return m_data + m_size;
+        }
+
+        const T *begin() const
+        {
+            return m_data;
+        }
+
+        const T *end() const
+        {
+            return m_data + m_size;
+        }
+    };
+
+    // sum() of a list, array or array expression, with four partial sums
+    // so that consecutive additions do not wait on each other
+    template <typename Sequence>
+    auto sum(const Sequence &values)
+    {
+        using Value = std::decay_t<decltype(values[0])>;
+        Value partial[4] = {Value(0), Value(0), Value(0), Value(0)};
+        std::size_t size = values.size();
+        std::size_t i = 0;
+        for (; i + 4 <= size; i += 4)
+            for (std::size_t j = 0; j < 4; ++j)
+                partial[j] = partial[j] + values[i + j];
+        for (; i < size; ++i)
+            partial[0] = partial[0] + values[i];
+        return (partial[0] + partial[1]) + (partial[2] + partial[3]);
+    }
+
+    template <typename Left, typename Right>
+    auto dot(const Left &left, const Right &right)
+    {
+        return sum(left * right);
+    }
+
+#endif // PCPP_ARRAY
+
+#ifdef PCPP_MEMO
+
+    // @cache and @lru_cache: memo tables keyed on a tuple of arguments.
+    // Compiling with -DPCPP_MEMO_STATS counts hits and misses and prints
+    // them to stderr when the program exits.
+
+    template <typename T>
+    std::size_t hash_value(const T &value)
+    {
+        return std::hash<T>{}(value);
+    }
+
+    // std::hash of an integer is the integer itself; mix the bits so that
+    // keys in arithmetic progression spread over a power-of-two table
+    inline std::size_t mix(std::uint64_t x)
+    {
+        x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9;
+        x = (x ^ (x >> 27)) * 0x94d049bb133111eb;
+        return x ^ (x >> 31);
+    }
+
+    struct TupleHash
+    {
+        template <typename... T>
+        std::size_t operator()(const std::tuple<T...> &key) const
+        {
+            std::size_t result = 0;
+            std::apply([&](const auto &...values)
+                       { ((result = mix(result ^ hash_value(values))), ...); },
+                       key);
+            return result;
+        }
+    };
+
+    class MemoStats
+    {
+    protected:
+        const char *m_name;
+
+        explicit MemoStats(const char *name) : m_name(name)
+        {
+        }
+
+#ifdef PCPP_MEMO_STATS
+        std::uint64_t m_hits = 0;
+        std::uint64_t m_misses = 0;
+
+        void hit()
+        {
+            ++m_hits;
+        }
+
+        void miss()
+        {
+            ++m_misses;
+        }
+
+        ~MemoStats()
+        {
+            std::fprintf(stderr, "%s: %llu hits, %llu misses\n", m_name,
+                         static_cast<unsigned long long>(m_hits),
+                         static_cast<unsigned long long>(m_misses));
+        }
+#else
+        void hit()
+        {
+        }
+
+        void miss()
+        {
+        }
+#endif
+    };
+
+    // @cache: an open-addressing table with linear probing, which never
+    // removes entries
+    template <typename Result, typename... Args>
+    class Memo : MemoStats
+    {
+    private:
+        using Entry = std::pair<std::tuple<Args...>, Result>;
+
+        std::vector<std::optional<Entry>> m_slots;
+        std::size_t m_size = 0;
+
+        // the slot holding key, or the empty slot where it belongs
+        template <typename Key>
+        std::size_t find(const Key &key) const
+        {
+            std::size_t mask = m_slots.size() - 1;
+            std::size_t i = TupleHash{}(key) & mask;
+            while (m_slots[i] && !(m_slots[i]->first == key))
+                i = (i + 1) & mask;
+            return i;
+        }
+
+        void grow()
+        {
+            std::vector<std::optional<Entry>> slots(
+                m_slots.empty() ? 16 : m_slots.size() * 2);
+            std::swap(slots, m_slots);
+            for (std::optional<Entry> &slot : slots)
+                if (slot)
+                    m_slots[find(slot->first)] = std::move(slot);
+        }
+
+    public:
+        explicit Memo(const char *name) : MemoStats(name)
+        {
+        }
+
+        template <typename Compute>
+        Result get(Compute compute, const Args &...args)
+        {
+            auto key = std::tie(args...);
+            if (m_size != 0)
+            {
+                std::size_t i = find(key);
+                if (m_slots[i])
+                {
+                    hit();
+                    return m_slots[i]->second;
+                }
+            }
+            miss();
+            // compute may recurse into get() and grow the table, so the slot
+            // is found only afterwards
+            Result result = compute();
+            if ((m_size + 1) * 2 > m_slots.size())
+                grow();
+            m_slots[find(key)].emplace(std::tuple<Args...>(args...), result);
+            ++m_size;
+            return result;
+        }
+    };
+
+    // @lru_cache(maxsize=N): at most capacity entries, evicting the least
+    // recently used
+    template <typename Result, typename... Args>
+    class LruMemo : MemoStats
+    {
+    private:
+        using Key = std::tuple<Args...>;
+        using Entry = std::pair<Key, Result>;
+
+        // most recently used first
+        std::list<Entry> m_order;
+        std::unordered_map<Key, typename std::list<Entry>::iterator, TupleHash>
+            m_index;
+        const std::size_t m_capacity;
+
+    public:
+        LruMemo(const char *name, std::size_t capacity)
+            : MemoStats(name), m_capacity(capacity)
+        {
+        }
+
+        template <typename Compute>
+        Result get(Compute compute, const Args &...args)
+        {
+            Key key(args...);
+            auto found = m_index.find(key);
+            if (found != m_index.end())
+            {
+                hit();
+                m_order.splice(m_order.begin(), m_order, found->second);
+                return found->second->second;
+            }
+            miss();
+            Result result = compute();
+            m_order.emplace_front(key, result);
+            m_index.emplace(std::move(key), m_order.begin());
+            if (m_index.size() > m_capacity)
+            {
+                m_index.erase(m_order.back().first);
+                m_order.pop_back();
+            }
+            return result;
+        }
+    };
+
+#endif // PCPP_MEMO
 }
+
+#endif
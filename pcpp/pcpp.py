@@ -1,330 +1,1335 @@
+import io
+import itertools
+import math
+import re
+import time
+
 TEMPLATE = """int main(void) {
     {{STATEMENTS}}
 }"""
 
+# Every header the generated code may include, in the order they are emitted.
+# pcpp_array and pcpp_memo define the macros that enable the optional parts of
+# pcpp.h, see header_parts().
+INCLUDE_FLAGS = (
+    "string",
+    "vector",
+    "array",
+    "initializer_list",
+    "utility",
+    "cstdint",
+    "pcpp_array",
+    "pcpp_memo",
+    "pcpp",
+)
+# how Python ints are represented in C++, see lower_ints()
+INT_MODELS = ("int32", "int64", "checked", "bigint")
+# how list and string indexing is checked, see eliminate_bounds_checks()
+BOUNDS = ("unchecked", "checked")
+# the calls a counted loop iterates over; prange() loops run in parallel
+RANGES = ("range", "prange")
+
+
+class Type:
+    """
+    Base class of value types.
+    Types are interned, so each distinct type is a single object and types
+    are compared with `is`. The C++ spelling is only produced by cpp().
+    """
+
+    __slots__ = ()
+    _interned = {}
+    # whether values are cheap to copy, so they are always passed by value
+    scalar = False
+
+    def __new__(cls, *args):
+        key = (cls, *args)
+        if key not in Type._interned:
+            Type._interned[key] = super().__new__(cls)
+        return Type._interned[key]
+
+    def cpp(self):
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.cpp()
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class IntType(Type):
+    __slots__ = ()
+    scalar = True
+
+    def cpp(self):
+        return "int"
+
+
+class Int64Type(Type):
+    __slots__ = ()
+    scalar = True
+
+    def cpp(self):
+        return "std::int64_t"
+
+
+class BigIntType(Type):
+    """
+    An arbitrary-precision int, pcpp::BigInt from pcpp.h.
+    """
+
+    __slots__ = ()
+
+    def cpp(self):
+        return "pcpp::BigInt"
+
+
+class DoubleType(Type):
+    __slots__ = ()
+    scalar = True
+
+    def cpp(self):
+        return "double"
+
+
+class BoolType(Type):
+    __slots__ = ()
+    scalar = True
+
+    def cpp(self):
+        return "bool"
+
+
+class StringType(Type):
+    __slots__ = ()
+
+    def cpp(self):
+        return "std::string"
+
+
+class CharType(Type):
+    """
+    A single character of a string, as produced by indexing or iterating
+    over it. It becomes a std::string where it is used as one.
+    """
+
+    __slots__ = ()
+    scalar = True
+
+    def cpp(self):
+        return "char"
+
+
+class VoidType(Type):
+    """
+    The return type of a function that returns no value.
+    """
+
+    __slots__ = ()
+
+    def cpp(self):
+        return "void"
+
+
+class AutoType(Type):
+    """
+    A type left for the C++ compiler to deduce.
+    """
+
+    __slots__ = ()
+
+    def cpp(self):
+        return "auto"
+
+
+class VectorType(Type):
+    __slots__ = ("element",)
+
+    def __init__(self, element):
+        self.element = element
+
+    def cpp(self):
+        return f"std::vector<{self.element.cpp()}>"
+
+    def __repr__(self):
+        return f"VectorType({self.element!r})"
+
+
+class ArrayType(Type):
+    """
+    A NumPy-style array of ints or floats, pcpp::Array from pcpp.h, with
+    elementwise arithmetic.
+    """
+
+    __slots__ = ("element",)
+
+    def __init__(self, element):
+        self.element = element
+
+    def cpp(self):
+        return f"pcpp::Array<{self.element.cpp()}>"
+
+    def __repr__(self):
+        return f"ArrayType({self.element!r})"
+
+
+INT = IntType()
+INT64 = Int64Type()
+BIGINT = BigIntType()
+DOUBLE = DoubleType()
+BOOL = BoolType()
+STRING = StringType()
+CHAR = CharType()
+VOID = VoidType()
+AUTO = AutoType()
+
+
+def parse_type(type_str):
+    """
+    Convert a type annotation such as `int`, `list[float]` or `array[float]`
+    to a Type.
+    """
+    if type_str == "auto":
+        return AUTO
+    if type_str == "int":
+        return INT
+    if type_str == "float":
+        return DOUBLE
+    if type_str == "bool":
+        return BOOL
+    if type_str in ("str", "string"):
+        return STRING
+    if type_str.startswith("list[") and type_str.endswith("]"):
+        return VectorType(parse_type(type_str[5:-1]))
+    if type_str.startswith("array[") and type_str.endswith("]"):
+        element = parse_type(type_str[6:-1])
+        if element not in (INT, DOUBLE):
+            raise ValueError(f"Arrays hold int or float, not {type_str[6:-1]}")
+        return ArrayType(element)
+
+    raise ValueError(f"Unknown type {type_str}")
+
+
+class Node:
+    """
+    Base class of the syntax tree.
+    A node describes its C++ output in emit() as a sequence of strings and
+    child nodes; write() turns that into text.
+    """
+
+    __slots__ = ()
+
+    def emit(self):
+        raise NotImplementedError
+
+    def infer(self):
+        """
+        Recompute the type of this node from the types of its children.
+        """
+
+    def children(self):
+        """
+        Yield the nodes directly below this one, in the order of __slots__.
+        """
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                value = getattr(self, name, None)
+                if isinstance(value, Node):
+                    yield value
+                elif isinstance(value, list):
+                    yield from (item for item in value if isinstance(item, Node))
+
+    def evaluate(self):
+        """
+        Return the C++ code for this node as a string.
+        """
+        buffer = []
+        write(self, buffer)
+        return "".join(buffer)
+
+
+class IntNode(Node):
+    __slots__ = ("value", "type")
 
-class IntNode:
     def __init__(self, value):
         self.value = value
-        self.type = "int"
+        self.type = INT
+
+    def emit(self):
+        if self.type is BIGINT:
+            return [f'pcpp::BigInt("{self.value}")']
+        return [str(self.value)]
 
-    def evaluate(self):
-        return str(self.value)
 
+class FloatNode(Node):
+    __slots__ = ("value", "type")
 
-class FloatNode:
     def __init__(self, value):
         self.value = value
-        self.type = "double"
+        self.type = DOUBLE
+
+    def emit(self):
+        return [str(self.value)]
 
-    def evaluate(self):
-        return str(self.value)
 
+class StringNode(Node):
+    __slots__ = ("value", "type")
 
-class StringNode:
     def __init__(self, value):
         self.value = value
-        self.type = "std::string"
+        self.type = STRING
 
-    def evaluate(self):
-        return f"std::string({self.value})"
+    def emit(self):
+        return ["std::string(", self.value, ")"]
+
+
+class CharNode(Node):
+    """
+    A one-character string literal used as a char, e.g. in `s[i] == "a"`.
+    """
+
+    __slots__ = ("value", "type")
+
+    def __init__(self, value):
+        self.value = value
+        self.type = CHAR
+
+    def emit(self):
+        if self.value in ("'", "\\"):
+            return [f"'\\{self.value}'"]
+        return [f"'{self.value}'"]
 
 
-class ListNode:
+class PromotionNode(Node):
+    """
+    A char used where a std::string is expected. A variable that has since
+    been declared str (see promote_char_variables()) needs no promotion.
+    """
+
+    __slots__ = ("inner", "type")
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.type = STRING
+
+    def emit(self):
+        if self.inner.type is STRING:
+            return [self.inner]
+        return ["std::string(1, ", self.inner, ")"]
+
+
+def as_string(node):
+    """
+    Return node as a std::string, promoting it if it is a char.
+    """
+    if node.type is CHAR:
+        return PromotionNode(node)
+    return node
+
+
+def as_char(node):
+    """
+    Return a CharNode for a one-character string literal, or None.
+    """
+    if not isinstance(node, StringNode):
+        return None
+    text = node.value[1:-1]
+    if len(text) == 1 or (len(text) == 2 and text[0] == "\\"):
+        return CharNode(text)
+    return None
+
+
+class ListNode(Node):
+    __slots__ = ("elements", "type", "element_type")
+
     def __init__(self, elements):
         self.elements = elements
-        self.type = f"std::vector<{elements[0].type}>"
-        self.element_type = elements[0].type
+        # an empty list takes its element type from an annotation, see
+        # typed_list()
+        self.element_type = AUTO
+        self.infer()
+
+    def infer(self):
+        if self.elements:
+            self.element_type = self.elements[0].type
+        self.type = VectorType(self.element_type)
+
+    def emit(self):
+        if self.element_type is AUTO:
+            raise Exception("Cannot infer the type of an empty list; annotate it")
+        parts = [self.type.cpp(), " {"]
+        for i, elem in enumerate(self.elements):
+            if i > 0:
+                parts.append(",")
+            parts.append(elem)
+        parts.append("}")
+        return parts
+
+
+def typed_list(node, list_type):
+    """
+    Return node, giving it the element type of list_type if it is an empty
+    list, as in `a: list[int] = []`, and converting a list to list_type if
+    that is an array, as in `a: array[float] = [1.0, 2.0]`.
+    """
+    if isinstance(node, ListNode) and not node.elements:
+        if isinstance(list_type, (VectorType, ArrayType)):
+            node.element_type = list_type.element
+            node.infer()
+    if (
+        isinstance(list_type, ArrayType)
+        and isinstance(node.type, VectorType)
+        and node.type.element in (INT, DOUBLE, AUTO)
+    ):
+        return ArrayNode(node, list_type)
+    return node
+
+
+class ArrayNode(Node):
+    """
+    A list converted to an array.
+    """
 
-    def evaluate(self):
-        return f'{self.type} {{{",".join(elem.evaluate() for elem in self.elements)}}}'
+    __slots__ = ("value", "type")
+
+    def __init__(self, value, array_type):
+        self.value = value
+        self.type = array_type
+
+    def emit(self):
+        return [self.type.cpp(), "(", self.value, ")"]
+
+
+class AppendNode(Node):
+    __slots__ = ("target", "value", "type")
+
+    def __init__(self, target, value):
+        self.target = target
+        self.value = value
+        self.infer()
+
+    def infer(self):
+        if isinstance(self.target.type, ArrayType):
+            raise Exception(f"Cannot append to array {self.target.name}")
+        if self.target.type is VectorType(STRING):
+            self.value = as_string(self.value)
+        self.type = VOID
+
+    def emit(self):
+        return [self.target, ".push_back(", self.value, ")"]
 
 
-class TrueNode:
+class TrueNode(Node):
+    __slots__ = ("type",)
+
     def __init__(self):
-        self.type = "bool"
+        self.type = BOOL
 
-    def evaluate(self):
-        return "true"
+    def emit(self):
+        return ["true"]
 
 
-class FalseNode:
+class FalseNode(Node):
+    __slots__ = ("type",)
+
     def __init__(self):
-        self.type = "bool"
+        self.type = BOOL
 
-    def evaluate(self):
-        return "false"
+    def emit(self):
+        return ["false"]
 
 
-class VariableNode:
+class VariableNode(Node):
+    __slots__ = ("name", "type")
+
     def __init__(self, name, variable_type=None):
         self.name = name
-        self.type = self._parse_type(variable_type)
-
-    def _parse_type(self, type_str):
-        if type_str == "auto":
-            return "auto"
-        if type_str == "int":
-            return "int"
-        if type_str == "float":
-            return "double"
-        if type_str == "string":
-            return "std::string"
-        if type_str.startswith("list[") and type_str.endswith("]"):
-            return f"std::vector<{self._parse_type(type_str[5:-1])}>"
-
-        raise ValueError(f"Unknown type {type_str}")
+        self.type = parse_type(variable_type)
 
-    def evaluate(self):
-        return self.name
+    def emit(self):
+        return [self.name]
 
 
-class ListElementNode:
+class ListElementNode(Node):
+    __slots__ = ("array", "index", "is_list", "type", "checked")
+
     def __init__(self, array, index, array_type):
         self.array = array
         self.index = index
-        if array_type.startswith("std::vector"):
+        self.set_array_type(array_type)
+        self.checked = False
+
+    def set_array_type(self, array_type):
+        if isinstance(array_type, (VectorType, ArrayType)):
             self.is_list = True
-            self.type = array_type.split("<")[1].split(">")[0]
+            self.type = array_type.element
+        elif array_type is STRING:
+            self.is_list = False
+            self.type = CHAR
         else:
             self.is_list = False
             self.type = array_type
 
-    def evaluate(self):
-        if not self.is_list and self.type == "std::string":
-            return f"{self.array}.substr({self.index.evaluate()}, {self.index.evaluate()} + 1)"
-        return f"{self.array}[{self.index.evaluate()}]"
+    def emit(self):
+        if self.checked:
+            return [f"pcpp::at({self.array}, ", self.index, ")"]
+        return [self.array, "[", self.index, "]"]
+
+
+class LenNode(Node):
+    """
+    len() of a list or string; the size, at most 2**63 - 1, is converted to
+    the int type of the node.
+    """
+
+    __slots__ = ("sequence", "type")
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.type = INT
+
+    def emit(self):
+        return [f"static_cast<{self.type.cpp()}>(", self.sequence, ".size())"]
+
+
+class ReductionNode(Node):
+    """
+    sum() of a list or array, or dot() of two arrays, computed in a single
+    loop over the elements; the operand of either may be an elementwise
+    expression, which is never stored.
+    """
+
+    __slots__ = ("function", "args", "type")
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self.infer()
+
+    def infer(self):
+        types = [arg.type for arg in self.args]
+        self.type = AUTO
+        if AUTO in types:
+            return
+        sequences = (ArrayType,) if self.function == "dot" else (ArrayType, VectorType)
+        if not all(isinstance(type_, sequences) for type_ in types):
+            kinds = ", ".join(str(type_) for type_ in types)
+            raise Exception(f"Cannot compute {self.function}() of {kinds}")
+        elements = [type_.element for type_ in types]
+        self.type = DOUBLE if DOUBLE in elements else elements[0]
+
+    def emit(self):
+        parts = [f"pcpp::{self.function}("]
+        for i, arg in enumerate(self.args):
+            if i > 0:
+                parts.append(", ")
+            parts.append(arg)
+        return parts + [")"]
+
+
+class NegateNode(Node):
+    __slots__ = ("operand", "type", "checked")
+
+    def __init__(self, operand):
+        self.operand = operand
+        # whether the negation raises on overflow, see lower_ints()
+        self.checked = False
+        self.infer()
+
+    def infer(self):
+        self.type = self.operand.type
+
+    def emit(self):
+        if self.checked:
+            return ["pcpp::checked_neg(", self.operand, ")"]
+        # keep "- -x" from turning into a decrement
+        if isinstance(self.operand, NegateNode):
+            return ["-(", self.operand, ")"]
+        return ["-", self.operand]
+
+
+def negate(operand):
+    """
+    Return the negation of operand, folding numeric literals.
+    """
+    if isinstance(operand, IntNode):
+        return IntNode(-operand.value)
+    if isinstance(operand, FloatNode):
+        return FloatNode(-operand.value)
+    return NegateNode(operand)
+
+
+class CastNode(Node):
+    """
+    An explicit conversion between the C++ representations of a value.
+    """
+
+    __slots__ = ("inner", "type")
+
+    def __init__(self, inner, type_):
+        self.inner = inner
+        self.type = type_
+
+    def emit(self):
+        if self.type is BIGINT:
+            return ["pcpp::BigInt(", self.inner, ")"]
+        return [f"static_cast<{self.type.cpp()}>(", self.inner, ")"]
 
 
-class ParenthesisNode:
+class ParenthesisNode(Node):
+    __slots__ = ("inner", "type")
+
     def __init__(self, inner):
         self.inner = inner
+        self.infer()
+
+    def infer(self):
         self.type = self.inner.type
 
-    def evaluate(self):
-        return f"({self.inner.evaluate()})"
+    def emit(self):
+        return ["(", self.inner, ")"]
+
 
+class BinaryOperatorNode(Node):
+    __slots__ = ("operator", "left", "right", "type", "checked", "floored")
+
+    COMPARISONS = ("<", ">", "<=", ">=", "==", "!=")
+    CHECKED = {
+        "+": "pcpp::checked_add",
+        "-": "pcpp::checked_sub",
+        "*": "pcpp::checked_mul",
+    }
+    FLOORED = {"/": "pcpp::floordiv", "%": "pcpp::floormod"}
 
-class BinaryOperatorNode:
     def __init__(self, operator, left, right):
         self.operator = operator
         self.left = left
         self.right = right
+        # whether the operation raises on overflow, see lower_ints()
+        self.checked = False
+        # whether // or % needs Python's rounding, see floor_divisions()
+        self.floored = False
+        self.infer()
+
+    def infer(self):
+        if CHAR in (self.left.type, self.right.type):
+            self.left, self.right = promote_chars(self.operator, self.left, self.right)
+
+        if isinstance(self.left.type, ArrayType) or isinstance(
+            self.right.type, ArrayType
+        ):
+            self.type = elementwise_type(self.operator, self.left.type, self.right.type)
 
-        if self.left.type == self.right.type:
+        elif self.left.type is self.right.type:
             self.type = self.left.type
 
-        elif self.left.type == "auto":
+        elif self.left.type is AUTO:
             self.type = self.right.type
 
-        elif self.right.type == "auto":
+        elif self.right.type is AUTO:
             self.type = self.left.type
 
-        elif self.left.type == "int" and self.right.type == "double":
-            self.type = "double"
+        elif self.left.type is INT and self.right.type is DOUBLE:
+            self.type = DOUBLE
 
-        elif self.left.type == "double" and self.right.type == "int":
-            self.type = "double"
+        elif self.left.type is DOUBLE and self.right.type is INT:
+            self.type = DOUBLE
 
         else:
             raise Exception(
                 f"Cannot perform {self.operator} on {self.left.type} and {self.right.type}"
             )
 
-    def evaluate(self):
-        return f"{self.left.evaluate()} {self.operator} {self.right.evaluate()}"
+        if self.operator in self.COMPARISONS:
+            self.type = BOOL
+
+    def emit(self):
+        if self.checked:
+            return [self.CHECKED[self.operator], "(", self.left, ", ", self.right, ")"]
+        if self.floored:
+            return [self.FLOORED[self.operator], "(", self.left, ", ", self.right, ")"]
+        return [self.left, f" {self.operator} ", self.right]
+
+
+class TrueDivisionNode(Node):
+    """
+    Python's `/`, which divides ints as floats; `//` is a BinaryOperatorNode.
+    Over arrays it is elementwise and always gives an array of floats.
+    """
+
+    __slots__ = ("left", "right", "type")
 
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.infer()
+
+    def infer(self):
+        types = (self.left.type, self.right.type)
+        if any(isinstance(type_, ArrayType) for type_ in types):
+            elementwise_type("/", *types)
+            self.type = ArrayType(DOUBLE)
+        elif all(type_ in (INT, INT64, BIGINT, DOUBLE, AUTO) for type_ in types):
+            self.type = DOUBLE
+        else:
+            raise Exception(f"Cannot perform / on {types[0]} and {types[1]}")
+
+    def emit(self):
+        if isinstance(self.type, ArrayType):
+            return ["pcpp::true_divide(", self.left, ", ", self.right, ")"]
+        if DOUBLE in (self.left.type, self.right.type):
+            return [self.left, " / ", self.right]
+        return ["static_cast<double>(", self.left, ") / ", self.right]
+
+
+def elementwise_type(operator, left, right):
+    """
+    Return the type of an elementwise operation on arrays, or on an array and
+    a scalar, which is broadcast: an array of floats if either operand holds
+    floats, of ints otherwise.
+    """
+    elements = [
+        operand.element if isinstance(operand, ArrayType) else operand
+        for operand in (left, right)
+    ]
+    if operator not in ("+", "-", "*", "/") or any(
+        element not in (INT, DOUBLE, AUTO) for element in elements
+    ):
+        raise Exception(f"Cannot perform {operator} on {left} and {right}")
+    if AUTO in elements:
+        return left if isinstance(left, ArrayType) else right
+    return ArrayType(DOUBLE if DOUBLE in elements else INT)
+
+
+def promote_chars(operator, left, right):
+    """
+    Return the operands of a binary operator with a char operand, rewritten so
+    that they behave as the one-character strings they are in Python.
+
+    A char compared with a one-character literal stays a char comparison;
+    otherwise chars meeting strings, or added together, become strings.
+    """
+    char_or_string = (CHAR, STRING)
+    if left.type not in char_or_string or right.type not in char_or_string:
+        return left, right
+    if operator != "+":
+        if left.type is CHAR and as_char(right) is not None:
+            return left, as_char(right)
+        if right.type is CHAR and as_char(left) is not None:
+            return as_char(left), right
+        if left.type is right.type:
+            return left, right
+    return as_string(left), as_string(right)
+
+
+class AssignmentNode(Node):
+    __slots__ = ("name", "value", "type")
 
-class AssignmentNode:
     def __init__(self, name, value):
         self.name = name
         self.value = value
+        self.infer()
+
+    def infer(self):
+        if self.name.type is STRING:
+            self.value = as_string(self.value)
+        self.value = typed_list(self.value, self.name.type)
         self.type = self.value.type
 
-    def evaluate(self):
-        return f"{self.name.evaluate()} = {self.value.evaluate()}"
+    def emit(self):
+        return [self.name, " = ", self.value]
 
 
-class DeclarationNode:
+class DeclarationNode(Node):
+    __slots__ = ("name", "value", "type", "annotated", "constant")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
+        self.annotated = name.type is not AUTO
+        # a list literal that is only ever read, see constant_lists()
+        self.constant = False
+        self.infer()
+
+    def infer(self):
+        if self.name.type is STRING:
+            self.value = as_string(self.value)
+        self.value = typed_list(self.value, self.name.type)
         self.type = self.value.type
 
-        if self.name.type == "auto":
+        if not self.annotated:
             self.name.type = self.value.type
 
-        if self.name.type != self.value.type:
+        if self.name.type is not self.value.type:
             raise Exception(
                 f"Type mismatch for {self.name.evaluate()}: {self.name.type} != {self.value.type}"
             )
 
-    def evaluate(self):
-        return f"{self.name.type} {self.name.evaluate()} = {self.value.evaluate()}"
+    def emit(self):
+        if self.constant:
+            element = self.value.element_type.cpp()
+            size = len(self.value.elements)
+            parts = [f"static constexpr std::array<{element}, {size}> ", self.name]
+            parts.append(" = {")
+            for i, elem in enumerate(self.value.elements):
+                if i > 0:
+                    parts.append(",")
+                parts.append(elem)
+            return parts + ["}"]
+        return [self.name.type.cpp(), " ", self.name, " = ", self.value]
 
 
-class IfExpressionNode:
+class IfExpressionNode(Node):
+    __slots__ = ("condition", "true_branch", "false_branch", "type")
+
     def __init__(self, condition, true_branch, false_branch):
         self.condition = condition
         self.true_branch = true_branch
         self.false_branch = false_branch
+        self.infer()
 
-        if self.true_branch.type != self.false_branch.type:
+    def infer(self):
+        if self.true_branch.type is not self.false_branch.type:
             raise Exception(
                 f"Type mismatch in if expression: {self.true_branch.type} != {self.false_branch.type}"
             )
 
-        self.type = true_branch.type
+        self.type = self.true_branch.type
 
-    def evaluate(self):
-        return f"{self.condition.evaluate()} ? {self.true_branch.evaluate()} : {self.false_branch.evaluate()}"
+    def emit(self):
+        return [self.condition, " ? ", self.true_branch, " : ", self.false_branch]
 
 
-class ReturnNode:
+class ReturnNode(Node):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
-    def evaluate(self):
-        return f"return {self.value.evaluate()};"
+    def emit(self):
+        return ["return ", self.value, ";"]
 
 
-class FunctionNode:
+class FunctionNode(Node):
+    __slots__ = (
+        "name",
+        "args",
+        "body",
+        "return_type",
+        "mutated",
+        "memoized",
+        "memo_size",
+    )
+
     def __init__(self, name, args, body):
         self.name = name
         self.args = args
         self.body = body
-        self.return_type = "int" if name == "main" else "auto"
+        self.return_type = INT if name == "main" else AUTO
+        # parameters the body assigns to, set by analyze_parameters()
+        self.mutated = set()
+        # @cache or @lru_cache: memo_size is None for an unbounded memo table
+        self.memoized = False
+        self.memo_size = None
+
+    def by_value(self, arg):
+        """
+        Whether arg is passed by value rather than by const reference.
+        """
+        return arg.type.scalar or arg.name in self.mutated
+
+    def emit(self):
+        args = ",".join(
+            f"{arg.type.cpp()} {arg.name}"
+            if self.by_value(arg)
+            else f"const {arg.type.cpp()}& {arg.name}"
+            for arg in self.args
+        )
+        signature = f"{self.return_type.cpp()} {{}}({args})"
+        # a void function has no result to remember
+        if not self.memoized or self.return_type is VOID:
+            return [signature.format(self.name), " { ", self.body, " }"]
+        return [
+            signature.format(self.name),
+            ";\n",
+            signature.format(self.name + "_uncached"),
+            " { ",
+            self.body,
+            " }\n",
+            signature.format(self.name),
+            " { ",
+            self.memo_table(),
+            " }",
+        ]
+
+    def memo_table(self):
+        """
+        The body of a memoized function: look its arguments up in a static
+        memo table and call {name}_uncached on a miss.
+        """
+        if self.return_type is AUTO:
+            raise Exception(f"Cannot memoize {self.name}(): unknown result type")
+        for arg in self.args:
+            if arg.type is AUTO:
+                raise Exception(
+                    f"Cannot memoize {self.name}(): unknown type of {arg.name}"
+                )
+            if isinstance(arg.type, (VectorType, ArrayType)):
+                raise Exception(
+                    f"Cannot memoize {self.name}(): {arg.name} is not hashable"
+                )
+        types = [self.return_type, *(arg.type for arg in self.args)]
+        types = ", ".join(type.cpp() for type in types)
+        names = [arg.name for arg in self.args]
+        if self.memo_size is None:
+            table = f'pcpp::Memo<{types}> memo("{self.name}");'
+        else:
+            table = f'pcpp::LruMemo<{types}> memo("{self.name}", {self.memo_size});'
+        compute = f"[&] {{ return {self.name}_uncached({','.join(names)}); }}"
+        return f"static {table} return memo.get({','.join([compute, *names])});"
 
-    def evaluate(self):
-        return f"{self.return_type} {self.name}({','.join('auto ' + arg.name  for arg in self.args)}) {{ {self.body.evaluate()} }}"
 
+class IfStatementsNode(Node):
+    __slots__ = ("if_node", "elif_nodes", "else_node")
 
-class IfStatementsNode:
     def __init__(self, if_node, elif_nodes, else_node):
         self.if_node = if_node
         self.elif_nodes = elif_nodes
         self.else_node = else_node
 
-    def evaluate(self):
-        return f"{self.if_node.evaluate()}{''.join(elif_node.evaluate() for elif_node in self.elif_nodes)}{self.else_node.evaluate() if self.else_node else ''}"
+    def emit(self):
+        parts = [self.if_node, *self.elif_nodes]
+        if self.else_node:
+            parts.append(self.else_node)
+        return parts
 
 
-class IfNode:
+class IfNode(Node):
+    __slots__ = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
 
-    def evaluate(self):
-        return f"if ({self.condition.evaluate()}) {{ {self.body.evaluate()} }}"
+    def emit(self):
+        return ["if (", self.condition, ") { ", self.body, " }"]
 
 
-class ElifNode:
+class ElifNode(Node):
+    __slots__ = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
 
-    def evaluate(self):
-        return f"else if ({self.condition.evaluate()}) {{ {self.body.evaluate()} }}"
+    def emit(self):
+        return ["else if (", self.condition, ") { ", self.body, " }"]
 
 
-class ElseNode:
+class ElseNode(Node):
+    __slots__ = ("body",)
+
     def __init__(self, body):
         self.body = body
 
-    def evaluate(self):
-        return f"else {{ {self.body.evaluate()} }}"
+    def emit(self):
+        return ["else { ", self.body, " }"]
 
 
-class WhileNode:
+class WhileNode(Node):
+    __slots__ = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
 
-    def evaluate(self):
-        return f"while ({self.condition.evaluate()}) {{ {self.body.evaluate()} }}"
+    def emit(self):
+        return ["while (", self.condition, ") { ", self.body, " }"]
 
 
-class ForNode:
+class ForNode(Node):
+    __slots__ = ("item_type", "item_name", "iterable", "body", "by_reference")
+
     def __init__(self, item_type, item_name, iterable, body):
         self.item_type = item_type
         self.item_name = item_name
         self.iterable = iterable
         self.body = body
+        self.set_item_type(item_type)
 
-    def evaluate(self):
-        return f"for ({self.item_type} {self.item_name} : {self.iterable.evaluate()}) {{ {self.body.evaluate()} }}"
+    def infer(self):
+        self.set_item_type(element_type(self.iterable))
 
+    def set_item_type(self, item_type):
+        self.item_type = item_type
+        # bind items by const reference unless they are scalars or the body
+        # assigns to the loop variable
+        self.by_reference = (
+            not item_type.scalar and self.item_name not in assigned_names(self.body)
+        )
+
+    def emit(self):
+        if self.by_reference:
+            item = f"const {self.item_type.cpp()}& {self.item_name}"
+        else:
+            item = f"{self.item_type.cpp()} {self.item_name}"
+        return [
+            f"for ({item} : ",
+            self.iterable,
+            ") { ",
+            self.body,
+            " }",
+        ]
 
-class BreakNode:
-    def evaluate(self):
-        return "break;"
 
+class CountedForNode(Node):
+    """
+    A for loop over range() with a constant step, lowered to a native counted
+    loop. The stop bound is evaluated once, as Python does, unless it is a
+    literal or a variable the body never assigns.
+
+    A loop over prange() is parallel: it runs as an OpenMP parallel for, with
+    a reduction clause for each accumulator in reductions (see
+    parallel_loops()), and OpenMP itself evaluates the stop bound once.
 
-class ContinueNode:
-    def evaluate(self):
-        return "continue;"
+    A hoisted stop bound is held in stop_name, a temporary chosen by
+    hoist_loop_invariants() so that it cannot shadow a variable of the body.
+    """
 
+    __slots__ = (
+        "item_name",
+        "index_type",
+        "start",
+        "stop",
+        "step",
+        "body",
+        "parallel",
+        "reductions",
+        "stop_name",
+    )
+
+    def __init__(self, item_name, start, stop, step, body, parallel=False):
+        self.item_name = item_name
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.body = body
+        self.parallel = parallel
+        self.reductions = {}
+        self.stop_name = None
+        self.infer()
 
-class FunctionCallNode:
-    def __init__(self, name, args):
-        self.name = name
-        self.args = args
-        self.type = "auto"
+    def infer(self):
+        self.index_type = index_type((self.start, self.stop, self.step))
 
-    def evaluate(self):
-        if self.name == "range":
-            start = None
-            end = None
-            step = None
-            if len(self.args) == 1:
-                start = 0
-                end = int(self.args[0].evaluate())
-                step = 1
-            elif len(self.args) == 2:
-                start = int(self.args[0].evaluate())
-                end = int(self.args[1].evaluate())
-                step = 1
-            elif len(self.args) == 3:
-                start = int(self.args[0].evaluate())
-                end = int(self.args[1].evaluate())
-                step = int(self.args[2].evaluate())
-            else:
-                raise Exception(
-                    f"Invalid number of arguments for range: {len(self.args)}"
+    def hoists_stop(self):
+        if self.parallel or isinstance(self.stop, IntNode):
+            return False
+        if isinstance(self.stop, VariableNode):
+            return self.stop.name in assigned_names(self.body)
+        return True
+
+    def emit(self):
+        name = self.item_name
+        parts = [f"for ({self.index_type} {name} = ", self.start]
+        if self.parallel:
+            # a pragma must start a line of its own
+            clauses = "".join(
+                f" reduction({operator}:{', '.join(names)})"
+                for operator, names in itertools.groupby(
+                    sorted(self.reductions, key=self.reductions.get),
+                    key=self.reductions.get,
                 )
-            return f"pcpp::Range({start}, {end}, {step})"
-        return f"{self.name}({','.join(arg.evaluate() for arg in self.args)})"
+            )
+            parts.insert(0, f"\n#pragma omp parallel for{clauses}\n")
+        if self.hoists_stop():
+            parts += [f", {self.stop_name} = ", self.stop, "; "]
+            stop = [self.stop_name]
+        else:
+            parts.append("; ")
+            stop = [self.stop]
+        comparison = " < " if self.step.value > 0 else " > "
+        parts += [name, comparison, *stop, "; "]
+        if self.step.value == 1:
+            parts.append(f"++{name}")
+        elif self.step.value == -1:
+            parts.append(f"--{name}")
+        elif self.step.value > 0:
+            parts.append(f"{name} += {self.step.value}")
+        else:
+            parts.append(f"{name} -= {-self.step.value}")
+        return parts + [") { ", self.body, " }"]
 
 
-class BraceNode:
-    def __init__(self, statements):
-        self.statements = statements
+def index_type(bounds):
+    """
+    Return the C++ type of a counted loop index: int when every bound is an
+    int that fits in 32 bits, std::int64_t otherwise.
+    """
+    for bound in bounds:
+        if bound.type is not INT:
+            return "std::int64_t"
+        if isinstance(bound, IntNode) and not -(2**31) <= bound.value < 2**31:
+            return "std::int64_t"
+    return "int"
 
-    def evaluate(self):
-        return self.statements.evaluate()
 
+def counted_loop(item_name, iterable, body):
+    """
+    Return a CountedForNode for iterating item_name over iterable, or None if
+    iterable is not a range() or prange() call with a constant step, or if the
+    body assigns the loop variable.
+    """
+    if not (isinstance(iterable, FunctionCallNode) and iterable.name in RANGES):
+        return None
+    start, stop, step = range_arguments(iterable)
+    if not isinstance(step, IntNode) or item_name in assigned_names(body):
+        return None
+    if step.value == 0:
+        raise Exception(f"{iterable.name}() arg 3 must not be zero")
+    parallel = iterable.name == "prange"
+    return CountedForNode(item_name, start, stop, step, body, parallel)
+
+
+def element_type(iterable):
+    """
+    Return the type of the items produced by iterating over iterable.
+    """
+    if isinstance(iterable.type, (VectorType, ArrayType)):
+        return iterable.type.element
+    if iterable.type is STRING:
+        return CHAR
+    if isinstance(iterable, FunctionCallNode) and iterable.name in RANGES:
+        return INT
+    return AUTO
 
-class StatementNode:
-    def __init__(self, statement):
-        self.statement = statement
-        self.type = self.statement.type
 
-    def evaluate(self):
-        return self.statement.evaluate() + ";"
+class ComprehensionNode(Node):
+    """
+    A list comprehension: a lambda, called at once, that declares the vector
+    name and fills it in the loop in body, which appends to it.
+    """
 
+    __slots__ = ("name", "body", "type")
 
-class StatementList:
-    def __init__(self):
-        self.expressions = []
+    def __init__(self, name, body):
+        self.name = name
+        self.body = body
+        self.infer()
+
+    def infer(self):
+        append = next(
+            node
+            for node in walk(self.body)
+            if isinstance(node, AppendNode) and node.target.name == self.name
+        )
+        self.type = VectorType(append.value.type)
+        append.target.type = self.type
+
+    def emit(self):
+        return [
+            f"[&] {{ {self.type.cpp()} {self.name}; ",
+            self.body,
+            f" return {self.name}; }}()",
+        ]
+
+
+class ReserveNode(Node):
+    """
+    Reserve room in the vector target for the appends of the loop after it:
+    per_trip appends for each item of the vector or string items, or for each
+    value of a range(start, stop, step) with literal or variable bounds. A
+    fresh target is known to be empty.
+    """
+
+    __slots__ = ("target", "start", "stop", "step", "items", "per_trip", "fresh")
+
+    def __init__(self, target, per_trip, fresh, items=None, bounds=(None,) * 3):
+        self.target = target
+        self.per_trip = per_trip
+        self.fresh = fresh
+        self.items = items
+        self.start, self.stop, self.step = bounds
+
+    def emit(self):
+        target = self.target.name
+        size = "" if self.fresh else f"{target}.size() + "
+        if self.per_trip != 1:
+            size += f"{self.per_trip} * "
+        if self.items is not None:
+            return [f"{target}.reserve({size}", self.items, ".size());"]
+        step = self.step.value
+        if isinstance(self.start, IntNode) and isinstance(self.stop, IntNode):
+            trips = len(range(self.start.value, self.stop.value, step))
+            return [f"{target}.reserve({size}{trips});"]
+        # ceil((high - low) / |step|) items when high > low, where low is the
+        # start of an increasing range and the stop of a decreasing one
+        low, high = (self.start, self.stop) if step > 0 else (self.stop, self.start)
+        from_zero = isinstance(low, IntNode) and low.value == 0
+        low, high = (
+            ["static_cast<std::int64_t>(", bound, ")"]
+            if bound.type is BIGINT
+            else [bound]
+            for bound in (low, high)
+        )
+        count = high if from_zero else [*high, " - ", *low]
+        if abs(step) != 1:
+            count = ["(", *count, f" + {abs(step) - 1}) / {abs(step)}"]
+        if self.per_trip != 1 and len(count) > 1:
+            count = ["(", *count, ")"]
+        return ["if (", *high, " > ", *low, f") {target}.reserve({size}", *count, ");"]
+
+
+class BreakNode(Node):
+    __slots__ = ()
+
+    def emit(self):
+        return ["break;"]
+
+
+class ContinueNode(Node):
+    __slots__ = ()
+
+    def emit(self):
+        return ["continue;"]
+
+
+class FunctionCallNode(Node):
+    __slots__ = ("name", "args", "type")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.type = AUTO
+
+    def emit(self):
+        if self.name in RANGES:
+            start, stop, step = range_arguments(self)
+            return ["pcpp::Range(", start, ", ", stop, ", ", step, ")"]
+        parts = [self.name, "("]
+        for i, arg in enumerate(self.args):
+            if i > 0:
+                parts.append(",")
+            parts.append(arg)
+        parts.append(")")
+        return parts
+
+
+def range_arguments(call):
+    """
+    Return the (start, stop, step) nodes of a range() call.
+    """
+    if len(call.args) == 1:
+        return IntNode(0), call.args[0], IntNode(1)
+    if len(call.args) == 2:
+        return call.args[0], call.args[1], IntNode(1)
+    if len(call.args) == 3:
+        return tuple(call.args)
+    raise Exception(f"Invalid number of arguments for range: {len(call.args)}")
+
+
+class MoveNode(Node):
+    """
+    The last use of a local, handed over with std::move instead of copied.
+    """
+
+    __slots__ = ("inner", "type")
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.type = inner.type
+
+    def emit(self):
+        return ["std::move(", self.inner, ")"]
+
+
+class BraceNode(Node):
+    __slots__ = ("statements",)
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def emit(self):
+        return [self.statements]
+
+
+class StatementNode(Node):
+    __slots__ = ("statement", "type")
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.type = self.statement.type
+
+    def emit(self):
+        return [self.statement, ";"]
+
+
+class StatementList(Node):
+    __slots__ = ("expressions",)
+
+    def __init__(self):
+        self.expressions = []
 
     def add(self, expr):
         self.expressions.append(expr)
 
-    def evaluate(self):
-        return "\n".join(expr.evaluate() for expr in self.expressions)
+    def emit(self):
+        parts = []
+        for i, expr in enumerate(self.expressions):
+            if i > 0:
+                parts.append("\n")
+            parts.append(expr)
+        return parts
+
+
+def walk(node):
+    """
+    Yield node and every node below it in pre-order.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(node.children())))
+
+
+def postorder(node):
+    """
+    Yield node and every node below it, children before their parent.
+    """
+    stack = [(node, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(list(node.children())))
+
+
+def write(node, sink):
+    """
+    Write the C++ code for node to sink, which is either a list collecting the
+    chunks or anything with a write() method, such as a file or io.StringIO.
+
+    The tree is walked with an explicit stack rather than recursion, so
+    deeply nested input cannot hit the recursion limit, and no intermediate
+    string is built for a subtree.
+    """
+    out = sink.append if isinstance(sink, list) else sink.write
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out(item)
+        else:
+            stack.extend(reversed(item.emit()))
 
 
 class Token:
+    __slots__ = ("kind", "value")
+
     def __init__(self, kind, value):
         self.kind = kind
         self.value = value
@@ -338,15 +1343,99 @@ class Token:
         return f"Token({self.kind}, {self.value})"
 
 
+class TokenStream:
+    """
+    A read cursor over a sequence of tokens.
+    A list is never modified, so consuming a token is O(1).
+    Any other iterable, such as the generator returned by lex(), is read lazily.
+    """
+
+    END = Token("EOF", None)
+
+    COMPACT_AFTER = 1024
+
+    def __init__(self, tokens):
+        if isinstance(tokens, list):
+            self.tokens = tokens
+            self.source = None
+        else:
+            self.tokens = []
+            self.source = iter(tokens)
+        self.position = 0
+
+    def _fill(self, index):
+        """
+        Pull tokens from a lazy source until index is buffered or the source
+        is exhausted.
+        """
+        while self.source is not None and index >= len(self.tokens):
+            token = next(self.source, None)
+            if token is None:
+                self.source = None
+            else:
+                self.tokens.append(token)
+
+    def peek(self, offset=0):
+        """
+        Return the token offset positions ahead of the cursor without consuming it.
+        Past the end of input, return TokenStream.END.
+        """
+        index = self.position + offset
+        self._fill(index)
+        if index < len(self.tokens):
+            return self.tokens[index]
+        return self.END
+
+    def at(self, *kinds):
+        """
+        Check whether the next token is of one of the given kinds.
+        """
+        return self.peek().kind in kinds
+
+    def at_end(self):
+        self._fill(self.position)
+        return self.position >= len(self.tokens)
+
+    def advance(self):
+        """
+        Consume and return the next token.
+
+        If there is no token left, raise an exception.
+        Tokens pulled from a lazy source are dropped once consumed, so only a
+        bounded window of the input is held in memory.
+        """
+        if self.at_end():
+            raise Exception("Unexpected end of input")
+        token = self.tokens[self.position]
+        self.position += 1
+        if self.source is not None and self.position >= self.COMPACT_AFTER:
+            del self.tokens[: self.position]
+            self.position = 0
+        return token
+
+    def expect(self, kind, message):
+        """
+        Consume the next token, raising an exception with message if it is not
+        of the given kind.
+        """
+        token = self.peek()
+        if token.kind != kind:
+            raise Exception(message)
+        return self.advance()
+
+
 class Scope:
     """
     A scope is a collection of variables.
     It has a parent scope, which it inherits variables from.
     It has a child scope, which it can create new variables in.
+    A block scope, such as a loop body, also sees the variables of its parent
+    as its own, so assigning to them does not declare new ones.
     """
 
-    def __init__(self, parent):
+    def __init__(self, parent, block=False):
         self.parent = parent
+        self.block = block
         self.variables = {}
 
     def get(self, name: str):
@@ -377,9 +1466,10 @@ class Scope:
 
     def __contains__(self, item):
         if "[" in item and "]" in item:
-            variable_name = item.split("[")[0]
-            return variable_name in self.variables
-        return item in self.variables
+            item = item.split("[")[0]
+        if item in self.variables:
+            return True
+        return self.block and self.parent is not None and item in self.parent
 
 
 class ScopeStack:
@@ -406,11 +1496,11 @@ class ScopeStack:
         """
         self.scopes[-1].add(name)
 
-    def push(self):
+    def push(self, block=False):
         """
         Push a new scope onto the stack.
         """
-        self.scopes.append(Scope(self.scopes[-1]))
+        self.scopes.append(Scope(self.scopes[-1], block))
 
     def pop(self):
         """
@@ -461,125 +1551,183 @@ def unoffside(code):
     return "\n".join(new_lines) + "}" * len(indents)
 
 
-def tokenize(code):
-    symbols = [
-        ("+", Token("+", "+")),
-        ("-", Token("-", "-")),
-        ("*", Token("*", "*")),
-        ("//", Token("/", "/")),
-        ("%", Token("%", "%")),
-        ("(", Token("(", "(")),
-        (")", Token(")", ")")),
-        ("=", Token("=", "=")),
-        ("+=", Token("+=", "+=")),
-        ("-=", Token("-=", "-=")),
-        ("*=", Token("*=", "*=")),
-        ("/=", Token("/=", "/=")),
-        ("%=", Token("%=", "%=")),
-        (";", Token(";", ";")),
-        ("<", Token("<", "<")),
-        (">", Token(">", ">")),
-        ("<=", Token("<=", "<=")),
-        (">=", Token(">=", ">=")),
-        ("!=", Token("!=", "!=")),
-        ("==", Token("==", "==")),
-        ("if", Token("if", "if")),
-        ("elif", Token("elif", "elif")),
-        ("else", Token("else", "else")),
-        ("return", Token("return", "return")),
-        ("while", Token("while", "while")),
-        ("for", Token("for", "for")),
-        ("in", Token("in", "in")),
-        ("break", Token("break", "break")),
-        ("continue", Token("continue", "continue")),
-        ("def", Token("def", "def")),
-        ("int", Token("type", "int")),
-        ("float", Token("type", "float")),
-        ("bool", Token("type", "bool")),
-        ("str", Token("type", "str")),
-        ("list", Token("type", "list")),
-        (":", Token(":", ":")),
-        (",", Token(",", ",")),
-        ("{", Token("{", "{")),
-        ("}", Token("}", "}")),
-        ("True", Token("True", "True")),
-        ("False", Token("False", "False")),
-        ("[", Token("[", "[")),
-        ("]", Token("]", "]")),
-    ]
-    symbols.sort(key=lambda s: len(s[0]), reverse=True)
-    tokens = []
+SYMBOLS = {
+    "+": "+",
+    "-": "-",
+    "*": "*",
+    "//": "/",
+    "/": "truediv",
+    "%": "%",
+    "(": "(",
+    ")": ")",
+    "=": "=",
+    "+=": "+=",
+    "-=": "-=",
+    "*=": "*=",
+    "/=": "/=",
+    "%=": "%=",
+    ";": ";",
+    "<": "<",
+    ">": ">",
+    "<=": "<=",
+    ">=": ">=",
+    "!=": "!=",
+    "==": "==",
+    ":": ":",
+    ",": ",",
+    "{": "{",
+    "}": "}",
+    "[": "[",
+    "]": "]",
+    "@": "@",
+    ".": ".",
+}
+
+KEYWORDS = {
+    "if": ("if", "if"),
+    "elif": ("elif", "elif"),
+    "else": ("else", "else"),
+    "return": ("return", "return"),
+    "while": ("while", "while"),
+    "for": ("for", "for"),
+    "in": ("in", "in"),
+    "break": ("break", "break"),
+    "continue": ("continue", "continue"),
+    "def": ("def", "def"),
+    "import": ("import", "import"),
+    "from": ("from", "from"),
+    "int": ("type", "int"),
+    "float": ("type", "float"),
+    "bool": ("type", "bool"),
+    "str": ("type", "str"),
+    "list": ("type", "list"),
+    "array": ("type", "array"),
+    "True": ("True", "True"),
+    "False": ("False", "False"),
+}
+
+TOKEN_PATTERN = re.compile(
+    "|".join(
+        [
+            r"(?P<newline>\n[ \t]*)",
+            r"(?P<space> +)",
+            r"(?P<number>\d[\d.]*)",
+            r"(?P<name>[^\W\d]\w*)",
+            r'(?P<str>"[^"]*")',
+            "(?P<symbol>"
+            + "|".join(
+                re.escape(symbol) for symbol in sorted(SYMBOLS, key=len, reverse=True)
+            )
+            + ")",
+        ]
+    )
+)
+
+
+def scan(code):
+    """
+    Yield the tokens of code in a single pass over the input.
+
+    Keywords are only recognised as whole words, so `index` is a name rather
+    than `in` followed by `dex`.
+    """
+    match = TOKEN_PATTERN.match
     i = 0
     while i < len(code):
-        for symbol, tokenized in symbols:
-            if code[i : i + len(symbol)] == symbol:
-                tokens.append(tokenized)
-                i += len(symbol)
-                break
-        else:
-            if code[i].isdigit():
-                dot_exist = False
-                start = i
-                while i < len(code):
-                    if code[i] == ".":
-                        if dot_exist:
-                            raise ValueError("invalid number")
-                        dot_exist = True
-                    elif not code[i].isdigit():
-                        break
-                    i += 1
-                if dot_exist:
-                    tokens.append(Token("float", float(code[start:i])))
-                else:
-                    tokens.append(Token("int", int(code[start:i])))
-            elif code[i].isalpha() or code[i] == "_":
-                start = i
-                while i < len(code) and (code[i].isalnum() or code[i] == "_"):
-                    i += 1
-                tokens.append(Token("name", code[start:i]))
-            elif code[i] == "\n":
-                indent_level = 0
-                while i + 1 < len(code) and code[i + 1] in [" ", "\t"]:
-                    i += 1
-                    indent_level += 1
-                tokens.append(Token("\n", indent_level))
-                i += 1
-            elif code[i] == '"':
-                start = i
-                i += 1
-                while i < len(code) and code[i] != '"':
-                    i += 1
-                if code[i] != '"':
-                    raise ValueError("invalid string")
-                tokens.append(Token("str", code[start : i + 1]))
-                i += 1
-            elif code[i] == " ":
-                i += 1
+        m = match(code, i)
+        if m is None:
+            if code[i] == '"':
+                raise ValueError("invalid string")
+            raise Exception("Unknown Symbol: " + code[i])
+        kind = m.lastgroup
+        value = m.group()
+        i = m.end()
+        if kind == "name":
+            if value in KEYWORDS:
+                yield Token(*KEYWORDS[value])
+            else:
+                yield Token("name", value)
+        elif kind == "symbol":
+            yield Token(SYMBOLS[value], SYMBOLS[value])
+        elif kind == "number":
+            dots = value.count(".")
+            if dots > 1:
+                raise ValueError("invalid number")
+            if dots:
+                yield Token("float", float(value))
             else:
-                raise Exception("Unknown Symbol: " + code[i])
+                yield Token("int", int(value))
+        elif kind == "str":
+            yield Token("str", value)
+        elif kind == "newline":
+            yield Token("\n", len(value) - 1)
+
+
+def tokenize(code):
+    return list(scan(code))
+
+
+def lex(lines):
+    """
+    Lazily tokenize source lines, tracking indentation as it goes.
+
+    This is the streaming counterpart of tokenize(unoffside(code)): instead of
+    splicing { and } into the text, a deeper indent yields an INDENT token and
+    each closed indent level a DEDENT token. lines may be any iterable of
+    lines, such as an open file, and is consumed one line at a time.
+    """
+    indents = []
+    first = True
+    for line in lines:
+        line = line.rstrip("\r\n")
+        i = 0
+        while i < len(line) and line[i] in " \t":
+            i += 1
+        if i == len(line):
+            continue
+        indent = line[:i]
+
+        if not first:
+            yield Token("\n", 0)
+        first = False
+
+        if (len(indents) == 0 and indent != "") or (
+            len(indents) > 0
+            and indents[-1] != indent
+            and indent.startswith(indents[-1])
+        ):
+            yield Token("INDENT", indent)
+            indents.append(indent)
+        elif len(indents) > 0 and indents[-1] != indent:
+            while len(indents) > 0 and not indent.startswith(indents[-1]):
+                yield Token("DEDENT", indents.pop())
+                yield Token("\n", 0)
+
+        yield from scan(line[i:])
+
+    while len(indents) > 0:
+        yield Token("DEDENT", indents.pop())
+
 
-    return tokens
+# the builtins parsed into nodes of their own, with their number of arguments
+BUILTINS = {"len": 1, "sum": 1, "dot": 2}
 
 
 def parse(tokens):
-    include_flags = {
-        "string": False,
-        "vector": False,
-        "initializer_list": False,
-        "pcpp": False,
-    }
+    include_flags = {flag: False for flag in INCLUDE_FLAGS}
     scopes = ScopeStack()
 
     def atom(tokens):
-        token = tokens.pop(0)
+        token = tokens.advance()
         if token.kind == "True":
             return TrueNode()
         if token.kind == "False":
             return FalseNode()
+        if token.kind == "-":
+            return negate(atom(tokens))
         if token.kind == "(":
             result = expr(tokens)
-            if tokens.pop(0).kind != ")":
-                raise Exception("Missing )")
+            tokens.expect(")", "Missing )")
             return ParenthesisNode(result)
         if token.kind == "int":
             return IntNode(token.value)
@@ -590,95 +1738,169 @@ def parse(tokens):
             return StringNode(token.value)
         if token.kind == "[":
             include_flags["vector"] = True
+            item_name = comprehension_variable(tokens)
+            if item_name is not None:
+                return comprehension(tokens, item_name)
             elements = []
-            while len(tokens) > 0 and tokens[0].kind != "]":
+            while not tokens.at_end() and not tokens.at("]"):
                 elements.append(expr(tokens))
-                if tokens[0].kind != ",":
+                if not tokens.at(","):
                     break
-                tokens.pop(0)
-            if len(tokens) == 0:
-                raise Exception("Missing ]")
-            tokens.pop(0)
+                tokens.advance()
+            tokens.expect("]", "Missing ]")
             return ListNode(elements)
         if token.kind == "name":
-            if len(tokens) > 0 and tokens[0].kind == "(":
+            if tokens.at("("):
                 args = []
-                tokens.pop(0)
-                while len(tokens) > 0 and tokens[0].kind != ")":
+                tokens.advance()
+                while not tokens.at_end() and not tokens.at(")"):
                     args.append(expr(tokens))
-                    if tokens[0].kind != ",":
+                    if not tokens.at(","):
                         break
-                    tokens.pop(0)
-                if tokens[0].kind != ")":
-                    raise Exception("Missing )")
-                tokens.pop(0)
-                if token.value == "range":
-                    include_flags["pcpp"] = True
+                    tokens.advance()
+                tokens.expect(")", "Missing )")
+                name = token.value
+                if name in BUILTINS and name not in scopes:
+                    if len(args) != BUILTINS[name]:
+                        raise Exception(
+                            f"Invalid number of arguments for {name}: {len(args)}"
+                        )
+                    if name == "len":
+                        return LenNode(args[0])
+                    return ReductionNode(name, args)
                 return FunctionCallNode(token.value, args)
-            if len(tokens) > 0 and tokens[0].kind == "[":
-                args = []
-                tokens.pop(0)
+            if tokens.at("."):
+                tokens.advance()
+                method = tokens.expect("name", "Expected method name").value
+                if method != "append":
+                    raise Exception("Unsupported method: " + method)
+                if token.value not in scopes:
+                    raise Exception("Undefined variable: " + token.value)
+                target = VariableNode(token.value, "auto")
+                target.type = scopes.get(token.value).type
+                tokens.expect("(", "Expected (")
+                value = expr(tokens)
+                tokens.expect(")", "Missing )")
+                return AppendNode(target, value)
+            if tokens.at("["):
+                tokens.advance()
                 index = expr(tokens)
-                if tokens[0].kind != "]":
-                    raise Exception("Missing ]")
-                tokens.pop(0)
+                tokens.expect("]", "Missing ]")
                 if token.value not in scopes:
                     raise Exception("Undefined variable: " + token.value)
                 return ListElementNode(token.value, index, scopes.get(token.value).type)
-            if len(tokens) > 0 and tokens[0].kind == ":":
-                tokens.pop(0)
-                if len(tokens) > 0 and tokens[0].kind == "type":
-                    type_token = tokens.pop(0)
-                    if type_token.value == "list":
-                        if len(tokens) > 0 and tokens[0].kind != "[":
-                            raise Exception("Missing [")
-                        tokens.pop(0)
-                        item_type = tokens.pop(0)
-                        if item_type.kind != "type":
-                            raise Exception("Invalid type")
-                        if tokens[0].kind != "]":
-                            raise Exception("Missing ]")
-                        tokens.pop(0)
-                        type_token.value = "list[" + item_type.value + "]"
-                    return VariableNode(token.value, type_token.value)
-                tokens.insert(0, Token(":", ":"))
-            return VariableNode(token.value, "auto")
+            if tokens.at(":") and tokens.peek(1).kind == "type":
+                tokens.advance()
+                return VariableNode(token.value, type_annotation(tokens))
+            variable = VariableNode(token.value, "auto")
+            if token.value in scopes:
+                declared = scopes.get(token.value)
+                if isinstance(declared, VariableNode):
+                    variable.type = declared.type
+            return variable
         raise Exception("Unexpected token: " + token.kind)
 
+    def comprehension_variable(tokens):
+        # the element of a comprehension comes before the for that declares
+        # its variable, so look ahead for the for at the same bracket depth
+        depth = 0
+        for offset in itertools.count():
+            token = tokens.peek(offset)
+            if token is TokenStream.END or depth == 0 and token.kind == "]":
+                return None
+            if depth == 0 and token.kind == "for":
+                return tokens.peek(offset + 1).value
+            if token.kind in ("(", "["):
+                depth += 1
+            elif token.kind in (")", "]"):
+                depth -= 1
+
+    def comprehension(tokens, item_name):
+        scopes.push(block=True)
+        scopes.add(VariableNode(item_name, "auto"))
+        element = expr(tokens)
+        scopes.pop()
+        tokens.expect("for", "Expected for")
+        tokens.expect("name", "Expected variable name")
+        tokens.expect("in", "Expected in")
+        # the iterable is evaluated outside the comprehension
+        iterable = atom(tokens)
+        scopes.push(block=True)
+        scopes.add(VariableNode(item_name, "auto"))
+        scopes.get(item_name).type = element_type(iterable)
+        condition = None
+        if tokens.at("if"):
+            tokens.advance()
+            condition = comp(tokens)
+        tokens.expect("]", "Missing ]")
+        scopes.pop()
+
+        parts = [element, iterable, *([condition] if condition else [])]
+        used = set().union(*(assigned_names(part) | read_names(part) for part in parts))
+        name = next(f"_list{i}" for i in itertools.count() if f"_list{i}" not in used)
+        body = StatementList()
+        body.add(StatementNode(AppendNode(VariableNode(name, "auto"), element)))
+        if condition is not None:
+            filtered = IfNode(condition, BraceNode(body))
+            body = StatementList()
+            body.add(IfStatementsNode(filtered, [], None))
+        loop = counted_loop(item_name, iterable, BraceNode(body))
+        if loop is None:
+            loop = ForNode(element_type(iterable), item_name, iterable, BraceNode(body))
+        elif loop.parallel:
+            raise Exception(
+                "Cannot parallelize a list comprehension; assign list elements"
+                " in a for loop over prange() instead"
+            )
+        elif loop.index_type == "std::int64_t":
+            include_flags["cstdint"] = True
+        body = StatementList()
+        body.add(loop)
+        return ComprehensionNode(name, body)
+
+    def type_annotation(tokens):
+        type_token = tokens.expect("type", "Expected type")
+        if type_token.value not in ("list", "array"):
+            return type_token.value
+        tokens.expect("[", "Missing [")
+        item_type = tokens.expect("type", "Invalid type")
+        tokens.expect("]", "Missing ]")
+        return f"{type_token.value}[{item_type.value}]"
+
     def mul(tokens):
         node = atom(tokens)
-        while len(tokens) > 0 and (tokens[0].kind in ["*", "/", "%"]):
-            token = tokens.pop(0)
-            node = BinaryOperatorNode(token.value, node, atom(tokens))
+        while tokens.at("*", "/", "%", "truediv"):
+            token = tokens.advance()
+            if token.kind == "truediv":
+                node = TrueDivisionNode(node, atom(tokens))
+            else:
+                node = BinaryOperatorNode(token.value, node, atom(tokens))
         return node
 
     def addi(tokens):
         node = mul(tokens)
-        while len(tokens) > 0 and (tokens[0].kind in ["+", "-"]):
-            token = tokens.pop(0)
+        while tokens.at("+", "-"):
+            token = tokens.advance()
             node = BinaryOperatorNode(token.value, node, mul(tokens))
         return node
 
     def comp(tokens):
         node = addi(tokens)
-        while len(tokens) > 0 and (
-            tokens[0].kind in ["==", "!=", ">", ">=", "<", "<="]
-        ):
-            token = tokens.pop(0)
+        while tokens.at("==", "!=", ">", ">=", "<", "<="):
+            token = tokens.advance()
             node = BinaryOperatorNode(token.value, node, addi(tokens))
         return node
 
     def expr(tokens):
         node = comp(tokens)
-        if len(tokens) > 0 and tokens[0].kind == "if":
-            tokens.pop(0)
+        if tokens.at("if"):
+            tokens.advance()
             condition = comp(tokens)
-            if tokens.pop(0).kind != "else":
-                raise Exception("Expected else")
+            tokens.expect("else", "Expected else")
             false_branch = comp(tokens)
             node = IfExpressionNode(condition, node, false_branch)
-        elif len(tokens) > 0 and tokens[0].kind == "=":
-            tokens.pop(0)
+        elif tokens.at("="):
+            tokens.advance()
             value = comp(tokens)
             if not isinstance(node, VariableNode) and not isinstance(
                 node, ListElementNode
@@ -691,41 +1913,88 @@ def parse(tokens):
                 node = DeclarationNode(node, value)
         return node
 
+    def skip_newlines(tokens):
+        while tokens.at("\n"):
+            tokens.advance()
+
+    def import_statement(tokens):
+        # only functools, for its decorators; an import emits no code
+        names = []
+        if tokens.advance().kind == "from":
+            module = tokens.expect("name", "Expected module name").value
+            tokens.expect("import", "Expected import")
+            names.append(tokens.expect("name", "Expected name").value)
+            while tokens.at(","):
+                tokens.advance()
+                names.append(tokens.expect("name", "Expected name").value)
+        else:
+            module = tokens.expect("name", "Expected module name").value
+        if module != "functools":
+            raise Exception("Unsupported module: " + module)
+        for name in names:
+            if name not in ("cache", "lru_cache"):
+                raise Exception(f"Unsupported import: {module}.{name}")
+
+    def decorator(tokens):
+        """
+        Parse a decorator after its @ and return the capacity of the memo
+        table it asks for: None for unbounded, 0 for none at all.
+        """
+        name = tokens.expect("name", "Expected decorator").value
+        while tokens.at("."):
+            tokens.advance()
+            name += "." + tokens.expect("name", "Expected name").value
+        if name in ("cache", "functools.cache"):
+            return None
+        if name not in ("lru_cache", "functools.lru_cache"):
+            raise Exception("Unsupported decorator: " + name)
+        size = 128
+        if tokens.at("("):
+            tokens.advance()
+            if not tokens.at(")"):
+                if tokens.at("name") and tokens.peek(1).kind == "=":
+                    if tokens.advance().value != "maxsize":
+                        raise Exception("Unsupported argument of lru_cache")
+                    tokens.advance()
+                token = tokens.advance()
+                if token.kind == "int":
+                    size = token.value
+                elif token.kind == "name" and token.value == "None":
+                    size = None
+                else:
+                    raise Exception("Expected maxsize")
+            tokens.expect(")", "Missing )")
+        return size
+
     def statement(tokens):
-        if tokens[0].kind == "return":
-            tokens.pop(0)
+        if tokens.at("return"):
+            tokens.advance()
             return ReturnNode(expr(tokens))
-        elif tokens[0].kind == "def":
-            tokens.pop(0)
-            name = tokens.pop(0).value
+        elif tokens.at("def"):
+            tokens.advance()
+            name = tokens.advance().value
             if name in scopes:
                 raise Exception("Variable already defined")
-            if tokens.pop(0).kind != "(":
-                raise Exception("Expected (")
+            tokens.expect("(", "Expected (")
             args = []
-            while tokens[0].kind != ")":
-                if tokens[0].kind != "name":
+            while not tokens.at(")"):
+                if not tokens.at("name"):
                     raise Exception("Expected variable name")
-                if tokens[0].value in args:
+                if tokens.peek().value in [arg.name for arg in args]:
                     raise Exception("Duplicate argument")
-                name_token = tokens.pop(0)
-                type_token = None
-                if len(tokens) > 0 and tokens[0].kind == ":":
-                    tokens.pop(0)
-                    if len(tokens) > 0 and tokens[0].kind == "type":
-                        type_token = tokens.pop(0)
-                    else:
-                        raise Exception("Expected type")
-                args.append(
-                    VariableNode(
-                        name_token.value, type_token.value if type_token else "auto"
-                    )
-                )
-            tokens.pop(0)
-            if tokens.pop(0).kind != ":":
-                raise Exception("Expected :")
-            if tokens[0].kind == "\n":
-                tokens.pop(0)
+                name_token = tokens.advance()
+                arg_type = "auto"
+                if tokens.at(":"):
+                    tokens.advance()
+                    arg_type = type_annotation(tokens)
+                args.append(VariableNode(name_token.value, arg_type))
+                if not tokens.at(","):
+                    break
+                tokens.advance()
+            tokens.expect(")", "Expected )")
+            tokens.expect(":", "Expected :")
+            if tokens.at("\n"):
+                tokens.advance()
             scopes.push()
             for arg in args:
                 scopes.add(arg)
@@ -734,105 +2003,2414 @@ def parse(tokens):
             node = FunctionNode(name, args, body)
             scopes.add(node)
             return node
-        elif tokens[0].kind == "if":
-            tokens.pop(0)
+        elif tokens.at("@"):
+            tokens.advance()
+            size = decorator(tokens)
+            skip_newlines(tokens)
+            if not tokens.at("def"):
+                raise Exception("Expected def after decorator")
+            node = statement(tokens)
+            if node.name == "main":
+                raise Exception("main() cannot be memoized")
+            if size != 0:
+                node.memoized = True
+                node.memo_size = size
+            return node
+        elif tokens.at("import", "from"):
+            import_statement(tokens)
+            return None
+        elif tokens.at("if"):
+            tokens.advance()
             if_condition = comp(tokens)
-            if tokens.pop(0).kind != ":":
-                raise Exception("Expected :")
-
-            if tokens[0].kind == "\n":
-                tokens.pop(0)
+            tokens.expect(":", "Expected :")
+            if tokens.at("\n"):
+                tokens.advance()
             if_body = brace(tokens)
 
             if_node = IfNode(if_condition, if_body)
             elif_nodes = []
-            while len(tokens) > 0 and tokens[0].kind == "\n":
-                tokens.pop(0)
-            while len(tokens) > 0 and tokens[0].kind == "elif":
-                tokens.pop(0)
+            skip_newlines(tokens)
+            while tokens.at("elif"):
+                tokens.advance()
                 condition = comp(tokens)
-                if tokens.pop(0).kind != ":":
-                    raise Exception("Expected :")
-                if tokens[0].kind == "\n":
-                    tokens.pop(0)
+                tokens.expect(":", "Expected :")
+                if tokens.at("\n"):
+                    tokens.advance()
                 body = brace(tokens)
                 elif_nodes.append(ElifNode(condition, body))
-                while len(tokens) > 0 and tokens[0].kind == "\n":
-                    tokens.pop(0)
+                skip_newlines(tokens)
             else_node = None
-            while len(tokens) > 0 and tokens[0].kind == "\n":
-                tokens.pop(0)
-            if len(tokens) > 0 and tokens[0].kind == "else":
-                tokens.pop(0)
-                if tokens.pop(0).kind != ":":
-                    raise Exception("Expected :")
-                if tokens[0].kind == "\n":
-                    tokens.pop(0)
+            skip_newlines(tokens)
+            if tokens.at("else"):
+                tokens.advance()
+                tokens.expect(":", "Expected :")
+                if tokens.at("\n"):
+                    tokens.advance()
                 else_node = ElseNode(brace(tokens))
 
             return IfStatementsNode(if_node, elif_nodes, else_node)
-        elif tokens[0].kind == "while":
-            tokens.pop(0)
+        elif tokens.at("while"):
+            tokens.advance()
             condition = comp(tokens)
-            if tokens.pop(0).kind != ":":
-                raise Exception("Expected :")
-            while tokens[0].kind == "\n":
-                tokens.pop(0)
+            tokens.expect(":", "Expected :")
+            skip_newlines(tokens)
 
             body = brace(tokens)
             return WhileNode(condition, body)
-        elif tokens[0].kind == "for":
-            tokens.pop(0)
-            name = tokens.pop(0)
-            if name.kind != "name":
-                raise Exception("Expected variable name")
-            if tokens.pop(0).kind != "in":
-                raise Exception("Expected in")
+        elif tokens.at("for"):
+            tokens.advance()
+            name = tokens.expect("name", "Expected variable name")
+            tokens.expect("in", "Expected in")
             iterable = atom(tokens)
-            if tokens.pop(0).kind != ":":
-                raise Exception("Expected :")
-            while tokens[0].kind == "\n":
-                tokens.pop(0)
+            tokens.expect(":", "Expected :")
+            skip_newlines(tokens)
+            item_type = element_type(iterable)
+            scopes.push(block=True)
+            scopes.add(VariableNode(name.value, "auto"))
+            scopes.get(name.value).type = item_type
             body = brace(tokens)
-            return ForNode(iterable.type, name.value, iterable, body)
-        elif tokens[0].kind == "break":
-            tokens.pop(0)
+            scopes.pop()
+            loop = counted_loop(name.value, iterable, body)
+            if loop is None:
+                return ForNode(item_type, name.value, iterable, body)
+            if loop.index_type == "std::int64_t":
+                include_flags["cstdint"] = True
+            return loop
+        elif tokens.at("break"):
+            tokens.advance()
             return BreakNode()
-        elif tokens[0].kind == "continue":
-            tokens.pop(0)
+        elif tokens.at("continue"):
+            tokens.advance()
             return ContinueNode()
         return StatementNode(expr(tokens))
 
     def brace(tokens):
         statements = StatementList()
-        if tokens[0].kind != "{":
-            statements.add(statement(tokens))
+        if not tokens.at("{", "INDENT"):
+            node = statement(tokens)
+            if node is not None:
+                statements.add(node)
             return BraceNode(statements)
-        tokens.pop(0)
+        closing = "}" if tokens.advance().kind == "{" else "DEDENT"
         while True:
-            statements.add(statement(tokens))
-            if tokens[0].kind in [";", "\n"]:
-                tokens.pop(0)
-            if tokens[0].kind == "}":
+            node = statement(tokens)
+            if node is not None:
+                statements.add(node)
+            if tokens.at(";", "\n"):
+                tokens.advance()
+            if tokens.at(closing):
                 break
-        tokens.pop(0)
+        tokens.advance()
         return BraceNode(statements)
 
     def statements(tokens):
         expr_list = StatementList()
         node = statement(tokens)
-        expr_list.add(node)
-        while len(tokens) > 0 and tokens[0].kind in [";", "\n"]:
-            tokens.pop(0)
-            if len(tokens) == 0:
+        while True:
+            # imports parse to None
+            if node is not None:
+                expr_list.add(node)
+            if not tokens.at(";", "\n"):
                 break
-            if tokens[0].kind in [";", "\n"]:
+            tokens.advance()
+            if tokens.at_end():
+                break
+            if tokens.at(";", "\n"):
+                node = None
                 continue
             node = statement(tokens)
-            expr_list.add(node)
         return expr_list
 
-    return include_flags, statements(tokens)
+    if not isinstance(tokens, TokenStream):
+        tokens = TokenStream(tokens)
+    tree = statements(tokens)
+    include_header(tree, include_flags)
+    return include_flags, tree
+
+
+def replace_children(node, replace):
+    """
+    Replace each child of node by replace(child), in the order of children().
+    Return whether any child changed.
+    """
+    changed = False
+    for cls in type(node).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            value = getattr(node, name, None)
+            if isinstance(value, Node):
+                new = replace(value)
+                if new is not value:
+                    setattr(node, name, new)
+                    changed = True
+            elif isinstance(value, list):
+                for i, item in enumerate(value):
+                    if isinstance(item, Node):
+                        new = replace(item)
+                        if new is not item:
+                            value[i] = new
+                            changed = True
+    return changed
+
+
+def literal(node):
+    """
+    Return the Python value of a numeric or bool literal, or None.
+    """
+    if isinstance(node, (IntNode, FloatNode)):
+        return node.value
+    if isinstance(node, TrueNode):
+        return True
+    if isinstance(node, FalseNode):
+        return False
+    return None
+
+
+def constant(value):
+    """
+    Return the literal node for a Python int, float or bool.
+    """
+    if value is True:
+        return TrueNode()
+    if value is False:
+        return FalseNode()
+    if isinstance(value, int):
+        return IntNode(value)
+    return FloatNode(value)
+
+
+FOLDS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a // b,
+    "%": lambda a, b: a % b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+
+
+def fold_binary(node):
+    """
+    Return the literal a binary operator on literals evaluates to, or node
+    itself if it cannot be folded without changing what the C++ code does.
+    """
+    if isinstance(node.left, StringNode) and isinstance(node.right, StringNode):
+        if node.operator == "+":
+            return StringNode(node.left.value[:-1] + node.right.value[1:])
+        return node
+    a = literal(node.left)
+    b = literal(node.right)
+    if a is None or b is None:
+        return node
+    comparison = node.operator in BinaryOperatorNode.COMPARISONS
+    if not comparison and (isinstance(a, bool) or isinstance(b, bool)):
+        return node
+    if node.operator in "/%":
+        # doubles divide exactly in C++, and division by zero is left to
+        # happen at run time
+        if isinstance(a, float) or isinstance(b, float) or b == 0:
+            return node
+    value = FOLDS[node.operator](a, b)
+    if isinstance(value, float) and not math.isfinite(value):
+        return node
+    return constant(value)
+
+
+def fold(node):
+    """
+    Return the folded replacement of node, whose children are already folded.
+    """
+    if isinstance(node, BinaryOperatorNode):
+        return fold_binary(node)
+    if isinstance(node, NegateNode):
+        if isinstance(node.operand, (IntNode, FloatNode)):
+            return negate(node.operand)
+    if isinstance(node, ParenthesisNode):
+        if literal(node.inner) is not None or isinstance(node.inner, StringNode):
+            return node.inner
+    elif isinstance(node, IfExpressionNode):
+        condition = literal(node.condition)
+        if condition is not None:
+            return node.true_branch if condition else node.false_branch
+    elif isinstance(node, ForNode):
+        # a step that folded to a literal makes a range() loop countable
+        loop = counted_loop(node.item_name, node.iterable, node.body)
+        if loop is not None:
+            return loop
+    return node
+
+
+def decided_branches(node):
+    """
+    Return the statements an if statement with literal conditions reduces to:
+    a list of statements to splice in its place, or a single if statement
+    without the branches that can never run.
+    """
+    branches = []
+    otherwise = node.else_node.body if node.else_node else None
+    decided = False
+    for branch in [node.if_node, *node.elif_nodes]:
+        condition = literal(branch.condition)
+        if condition is None:
+            branches.append(branch)
+            continue
+        decided = True
+        if condition:
+            # this branch always runs when reached, so none after it does
+            otherwise = branch.body
+            break
+    if not decided:
+        return node
+    if not branches:
+        return otherwise.statements.expressions if otherwise else []
+    first, *rest = branches
+    return IfStatementsNode(
+        IfNode(first.condition, first.body),
+        [ElifNode(branch.condition, branch.body) for branch in rest],
+        ElseNode(otherwise) if otherwise else None,
+    )
+
+
+def fold_constants(tree):
+    """
+    Evaluate the operators on literals in tree at compile time, with Python's
+    semantics, and drop the if, elif and while branches their literal
+    conditions decide; a branch that always runs is spliced into the
+    surrounding statements.
+    """
+    # replaced nodes stay referenced here, so that their ids are not reused
+    replacements = {}
+
+    def replacement(child):
+        return replacements.get(id(child), (child, child))[1]
+
+    for node in postorder(tree):
+        if replace_children(node, replacement):
+            node.infer()
+        if isinstance(node, StatementList):
+            statements = []
+            for statement in node.expressions:
+                if isinstance(statement, IfStatementsNode):
+                    decided = decided_branches(statement)
+                    if isinstance(decided, list):
+                        statements.extend(decided)
+                        continue
+                    statement = decided
+                elif isinstance(statement, WhileNode):
+                    condition = literal(statement.condition)
+                    if condition is not None and not condition:
+                        continue
+                statements.append(statement)
+            node.expressions = statements
+        folded = fold(node)
+        if folded is not node:
+            replacements[id(node)] = (node, folded)
+
+
+def header_parts(tree):
+    """
+    Return the include flags for the parts of pcpp.h that tree needs: pcpp
+    for pcpp::Range, when it calls range() other than in a counted loop, and
+    with pcpp_memo for the memo table of a memoized function, or with
+    pcpp_array for arrays and sum() and dot(). Arrays are only ever declared
+    by annotations, so they are found before types are inferred.
+    """
+    parts = set()
+    for node in walk(tree):
+        if isinstance(node, FunctionCallNode) and node.name in RANGES:
+            parts.add("pcpp")
+        elif isinstance(node, FunctionNode) and node.memoized:
+            parts.update(("pcpp", "pcpp_memo"))
+        elif isinstance(node, ReductionNode) or isinstance(
+            getattr(node, "type", None), ArrayType
+        ):
+            parts.update(("pcpp", "pcpp_array"))
+    return parts
+
+
+def include_header(tree, include_flags):
+    """
+    Set the include flags for the parts of pcpp.h that tree needs.
+    """
+    parts = header_parts(tree)
+    for flag in ("pcpp_array", "pcpp_memo", "pcpp"):
+        include_flags[flag] = flag in parts
+
+
+def eliminate_dead_code(tree, include_flags):
+    """
+    Drop the statements after a return, break or continue, and, in a program
+    with a main(), the functions that neither main() nor the top-level
+    statements call, directly or indirectly.
+    """
+    for node in walk(tree):
+        if isinstance(node, StatementList):
+            for i, statement in enumerate(node.expressions):
+                if isinstance(statement, (ReturnNode, BreakNode, ContinueNode)):
+                    del node.expressions[i + 1 :]
+                    break
+
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    if "main" in functions:
+        roots = [
+            node
+            for node in tree.expressions
+            if not isinstance(node, FunctionNode) or node.name == "main"
+        ]
+        reached = {"main"}
+        while roots:
+            for node in walk(roots.pop()):
+                if (
+                    isinstance(node, FunctionCallNode)
+                    and node.name in functions
+                    and node.name not in reached
+                ):
+                    reached.add(node.name)
+                    roots.append(functions[node.name])
+        tree.expressions = [
+            node
+            for node in tree.expressions
+            if not isinstance(node, FunctionNode) or node.name in reached
+        ]
+    include_header(tree, include_flags)
+
+
+def assigned_names(node):
+    """
+    Return the names of the variables assigned, as a whole or by element,
+    anywhere within node.
+    """
+    names = set()
+    for child in walk(node):
+        if isinstance(child, (AssignmentNode, DeclarationNode)):
+            if isinstance(child.name, VariableNode):
+                names.add(child.name.name)
+            elif isinstance(child.name, ListElementNode):
+                names.add(child.name.array)
+        elif isinstance(child, AppendNode):
+            names.add(child.target.name)
+        elif isinstance(child, (ForNode, CountedForNode)):
+            names.add(child.item_name)
+    return names
+
+
+def read_names(node):
+    """
+    Return the names of the variables read, as a whole or by element,
+    anywhere within node.
+    """
+    return {
+        child.name if isinstance(child, VariableNode) else child.array
+        for child in walk(node)
+        if isinstance(child, (VariableNode, ListElementNode))
+    }
+
+
+def _uses(function):
+    """
+    Yield (name, node, in_loop, statement) for every read or write of a
+    variable in function, in pre-order. statement is the outermost statement
+    of the body containing the use.
+    """
+    stack = [(function.body, False, None)]
+    while stack:
+        node, in_loop, statement = stack.pop()
+        if statement is None and not isinstance(node, (BraceNode, StatementList)):
+            statement = node
+        if isinstance(node, VariableNode):
+            yield node.name, node, in_loop, statement
+        elif isinstance(node, ListElementNode):
+            yield node.array, node, in_loop, statement
+        in_loop = in_loop or isinstance(node, (WhileNode, ForNode, CountedForNode))
+        stack.extend(
+            (child, in_loop, statement) for child in reversed(list(node.children()))
+        )
+
+
+def move_last_uses(function, functions):
+    """
+    Wrap in a MoveNode each call argument that is the last use of a local
+    aggregate and is passed to a by-value parameter of another function.
+
+    Uses inside loops, and arguments whose variable appears more than once in
+    the same statement, are left alone: there the order of evaluation does
+    not make the use provably last.
+    """
+    movable = {
+        node.name.name
+        for node in walk(function.body)
+        if isinstance(node, DeclarationNode) and isinstance(node.name, VariableNode)
+    }
+    movable.update(arg.name for arg in function.args if arg.name in function.mutated)
+
+    uses = list(_uses(function))
+    last = {name: node for name, node, _, _ in uses}
+    per_statement = {}
+    for name, _, _, statement in uses:
+        per_statement[name, id(statement)] = (
+            per_statement.get((name, id(statement)), 0) + 1
+        )
+    candidates = {
+        id(node)
+        for name, node, in_loop, statement in uses
+        if name in movable
+        and isinstance(node, VariableNode)
+        and last[name] is node
+        and not in_loop
+        and per_statement[name, id(statement)] == 1
+        and not node.type.scalar
+    }
+
+    moved = False
+    for call in walk(function.body):
+        if not isinstance(call, FunctionCallNode) or call.name not in functions:
+            continue
+        callee = functions[call.name]
+        for i, (arg, param) in enumerate(zip(call.args, callee.args)):
+            if id(arg) in candidates and callee.by_value(param):
+                call.args[i] = MoveNode(arg)
+                moved = True
+    return moved
+
+
+def analyze_parameters(tree, include_flags):
+    """
+    Decide how each function takes its parameters.
+
+    Parameters the body assigns to are taken by value; other non-scalar
+    parameters by const reference. Appending to a parameter is refused, as
+    Python would grow the caller's list. Callers then hand over their last use of a
+    local with std::move where the parameter is taken by value.
+    """
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    for function in functions.values():
+        params = {arg.name for arg in function.args}
+        for node in walk(function.body):
+            if isinstance(node, AppendNode) and node.target.name in params:
+                # the append would go to a copy, not to the caller's list
+                raise Exception(
+                    f"Cannot append to parameter {node.target.name} of "
+                    f"{function.name}(): the caller's list would not change"
+                )
+        names = assigned_names(function.body)
+        function.mutated = {arg.name for arg in function.args if arg.name in names}
+    for function in functions.values():
+        if move_last_uses(function, functions):
+            include_flags["utility"] = True
+
+
+def common_type(types, what):
+    """
+    Return the one type that can hold every type in types, ignoring auto.
+    Raise if there is none, i.e. if what is genuinely polymorphic.
+    """
+    result = AUTO
+    for type_ in types:
+        if type_ is AUTO or type_ is result:
+            continue
+        pair = {result, type_}
+        if result is AUTO:
+            result = type_
+        elif pair == {INT, DOUBLE}:
+            result = DOUBLE
+        elif pair == {BOOL, INT}:
+            result = INT
+        elif pair == {CHAR, STRING}:
+            result = STRING
+        else:
+            raise Exception(f"{what} is polymorphic: {result} and {type_}")
+    return result
+
+
+def retype(tree, functions):
+    """
+    Recompute the types in tree from the current parameter and return types
+    of functions. Return the argument types seen by each parameter and the
+    returned types of each function, keyed by function name.
+
+    Variables, loop items and calls take their types from the declarations
+    and functions they refer to; every other node recomputes its type with
+    Node.infer() once its children are done.
+    """
+    arguments = {
+        name: [[] for _ in function.args] for name, function in functions.items()
+    }
+    returns = {name: [] for name in functions}
+    # an explicit stack, as in write(), so deep expressions do not recurse;
+    # entries are (action, node, variable types in scope, enclosing function)
+    stack = [("visit", tree, {}, None)]
+    while stack:
+        action, node, types, function = stack.pop()
+        if action == "bind":
+            node.infer()
+            types[node.item_name] = (
+                INT if isinstance(node, CountedForNode) else node.item_type
+            )
+            continue
+        if action == "visit":
+            if isinstance(node, FunctionNode):
+                scope = dict(types)
+                scope.update((arg.name, arg.type) for arg in node.args)
+                stack.append(("visit", node.body, scope, node))
+                continue
+            stack.append(("finish", node, types, function))
+            if isinstance(node, DeclarationNode):
+                children = [node.value]
+            elif isinstance(node, ForNode):
+                children = [node.iterable, ("bind", node), node.body]
+            elif isinstance(node, CountedForNode):
+                children = [node.start, node.stop, node.step, ("bind", node), node.body]
+            else:
+                children = list(node.children())
+            for child in reversed(children):
+                if isinstance(child, tuple):
+                    stack.append((*child, types, function))
+                else:
+                    stack.append(("visit", child, types, function))
+            continue
+
+        if isinstance(node, VariableNode) and node.name in types:
+            node.type = types[node.name]
+        elif isinstance(node, ListElementNode) and node.array in types:
+            node.set_array_type(types[node.array])
+        elif isinstance(node, FunctionCallNode) and node.name in functions:
+            for seen, arg in zip(arguments[node.name], node.args):
+                seen.append(arg.type)
+            node.type = functions[node.name].return_type
+        elif isinstance(node, ReturnNode) and function is not None:
+            returns[function.name].append(node.value.type)
+        node.infer()
+        if isinstance(node, DeclarationNode) and isinstance(node.name, VariableNode):
+            types[node.name.name] = node.name.type
+    return arguments, returns
+
+
+def infer_types(tree, include_flags):
+    """
+    Give functions concrete parameter and return types where possible.
+
+    An unannotated parameter takes the common type of the arguments passed
+    to it at every call site, and a function returns the common type of the
+    values it returns, or void if it returns none. Each round of retyping can
+    make more types known, so rounds repeat until nothing changes. A
+    parameter that is never passed a known type stays auto, and its function
+    a template.
+    """
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    unannotated = {
+        name: [arg for arg in function.args if arg.type is AUTO]
+        for name, function in functions.items()
+    }
+    changed = True
+    while changed:
+        arguments, returns = retype(tree, functions)
+        changed = promote_char_variables(tree)
+        for name, function in functions.items():
+            for i, arg in enumerate(function.args):
+                if arg in unannotated[name]:
+                    type_ = common_type(
+                        arguments[name][i], f"Parameter {arg.name} of {name}()"
+                    )
+                    changed = changed or type_ is not arg.type
+                    arg.type = type_
+            if name == "main":
+                continue
+            type_ = VOID
+            if returns[name]:
+                type_ = common_type(returns[name], f"The return type of {name}()")
+            changed = changed or type_ is not function.return_type
+            function.return_type = type_
+    include_flags["cstdint"] = any(
+        isinstance(node, CountedForNode) and node.index_type == "std::int64_t"
+        for node in walk(tree)
+    )
+
+
+def promote_char_variables(tree):
+    """
+    Declare str the variables declared from a char but later assigned a str,
+    as in `c = s[0]` followed by `c = c + "x"`. Return whether any was.
+    """
+    changed = False
+    functions = [node for node in walk(tree) if isinstance(node, FunctionNode)]
+    scopes = [tree, *(function.body for function in functions)]
+    for scope in scopes:
+        declarations = {}
+        strings = set()
+        stack = [scope]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, FunctionNode):
+                continue
+            if isinstance(node, (AssignmentNode, DeclarationNode)) and isinstance(
+                node.name, VariableNode
+            ):
+                if isinstance(node, DeclarationNode):
+                    declarations[node.name.name] = node
+                elif node.value.type is STRING:
+                    strings.add(node.name.name)
+            stack.extend(node.children())
+        for name in strings:
+            declaration = declarations.get(name)
+            if declaration is not None and declaration.name.type is CHAR:
+                declaration.name.type = STRING
+                declaration.infer()
+                changed = True
+    return changed
+
+
+def promote_char_arguments(tree):
+    """
+    Promote chars passed to str parameters of the functions in tree, and
+    returned by functions that return str.
+    """
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    for call in walk(tree):
+        if isinstance(call, FunctionCallNode) and call.name in functions:
+            for i, (arg, param) in enumerate(zip(call.args, functions[call.name].args)):
+                if param.type is STRING:
+                    call.args[i] = as_string(arg)
+    for function in functions.values():
+        stack = [function.body] if function.return_type is STRING else []
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ReturnNode):
+                node.value = as_string(node.value)
+            elif not isinstance(node, FunctionNode):
+                stack.extend(node.children())
+
+
+def temporaries(tree, prefix):
+    """
+    Yield names for new variables, prefix followed by a number, skipping the
+    names already used in tree.
+    """
+    used = {node.name for node in walk(tree) if isinstance(node, VariableNode)}
+    for i in itertools.count():
+        if f"{prefix}{i}" not in used:
+            yield f"{prefix}{i}"
+
+
+def substitute(node, replacements):
+    """
+    Replace the nodes below node whose ids are keys of replacements.
+    """
+
+    def replace(value):
+        # a variable needs no parentheses
+        if isinstance(value, ParenthesisNode) and id(value.inner) in replacements:
+            return replacements[id(value.inner)]
+        return replacements.get(id(value), value)
+
+    for child in walk(node):
+        replace_children(child, replace)
+
+
+def declare(name, value):
+    """
+    Return the statement declaring a new variable name initialised to value,
+    and a function returning fresh reads of it.
+    """
+    statement = StatementNode(DeclarationNode(VariableNode(name, "auto"), value))
+
+    def read():
+        variable = VariableNode(name, "auto")
+        variable.type = value.type
+        return variable
+
+    return statement, read
+
+
+def evaluated_first(statement):
+    """
+    Return the expressions statement always evaluates once, before any of its
+    other parts: the values of simple statements, the first condition of an
+    if statement and the bounds of a for loop.
+    """
+    if isinstance(statement, StatementNode):
+        statement = statement.statement
+    if isinstance(statement, (DeclarationNode, AssignmentNode)):
+        if isinstance(statement.name, ListElementNode):
+            return [statement.name.index, statement.value]
+        return [statement.value]
+    if isinstance(statement, ReturnNode):
+        return [statement.value]
+    if isinstance(statement, IfStatementsNode):
+        return [statement.if_node.condition]
+    if isinstance(statement, CountedForNode):
+        return [statement.start, statement.stop]
+    if isinstance(statement, ForNode):
+        return [statement.iterable]
+    if isinstance(statement, (WhileNode, FunctionNode, BreakNode, ContinueNode)):
+        return []
+    return [statement]
+
+
+def number_values(block):
+    """
+    Number the values of the expressions the statements of block evaluate
+    first (see evaluated_first()), so that equal numbers mean equal values.
+
+    Return the occurrences of each number, as (statement index, node) pairs in
+    order, for the pure scalar operators and list loads, and the size of each
+    numbered subtree. Assigning a variable gives it a new version, so reads
+    on either side of an assignment have different numbers; calls,
+    conditional branches and comprehensions are never equal to anything.
+    """
+    versions = {}
+    numbers = {}
+    keys = {}
+    sizes = {}
+    occurrences = {}
+    unique = itertools.count(-1, -1)
+    for index, statement in enumerate(block.expressions):
+        for root in evaluated_first(statement):
+            stack = [(root, False)]
+            while stack:
+                node, expanded = stack.pop()
+                if not expanded and not isinstance(
+                    node, (IfExpressionNode, ComprehensionNode)
+                ):
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node.children())
+                    continue
+                children = list(node.children())
+                if isinstance(node, ParenthesisNode):
+                    numbers[id(node)] = numbers[id(node.inner)]
+                    sizes[id(node)] = sizes[id(node.inner)]
+                    continue
+                if isinstance(node, VariableNode):
+                    key = ("variable", node.name, versions.get(node.name, 0))
+                elif isinstance(node, ListElementNode):
+                    version = versions.get(node.array, 0)
+                    key = ("load", node.array, version, numbers[id(node.index)])
+                elif isinstance(node, (IntNode, FloatNode, StringNode, CharNode)):
+                    key = (type(node), node.value)
+                elif isinstance(node, (TrueNode, FalseNode)):
+                    key = (type(node),)
+                elif isinstance(node, (BinaryOperatorNode, NegateNode)):
+                    operator = getattr(node, "operator", "-")
+                    key = (type(node), operator, *(numbers[id(c)] for c in children))
+                else:
+                    key = None
+                if key is None:
+                    number = next(unique)
+                else:
+                    number = keys.setdefault(key, len(keys))
+                numbers[id(node)] = number
+                sizes[id(node)] = 1 + sum(sizes.get(id(c), 1) for c in children)
+                if (
+                    number >= 0
+                    and node.type.scalar
+                    and (
+                        isinstance(node, BinaryOperatorNode)
+                        or isinstance(node, ListElementNode)
+                        and node.is_list
+                    )
+                ):
+                    occurrences.setdefault(number, []).append((index, node))
+        for name in assigned_names(statement):
+            versions[name] = versions.get(name, 0) + 1
+        if isinstance(statement, (ForNode, CountedForNode)):
+            versions[statement.item_name] = versions.get(statement.item_name, 0) + 1
+    return occurrences, sizes
+
+
+def eliminate_common_subexpressions(tree):
+    """
+    Compute each pure scalar value that a block evaluates more than once only
+    once, into a temporary declared before the statement of its first use.
+
+    Only the expressions a statement evaluates first count (see
+    evaluated_first()), so a temporary never computes something that was
+    not computed at that point before. The largest repeated values go first;
+    their repeats no longer count for the values within them.
+    """
+    names = temporaries(tree, "_cse")
+    blocks = [node for node in walk(tree) if isinstance(node, StatementList)]
+    for block in blocks:
+        occurrences, sizes = number_values(block)
+        replacements = {}
+        removed = set()
+        declarations = {}
+        for number in sorted(
+            occurrences, key=lambda number: -sizes[id(occurrences[number][0][1])]
+        ):
+            live = [
+                (index, node)
+                for index, node in occurrences[number]
+                if id(node) not in removed
+            ]
+            if len(live) < 2:
+                continue
+            (index, first), *repeats = live
+            statement, read = declare(next(names), first)
+            # values within the first occurrence are declared after this
+            # one, and come first in the block
+            declarations.setdefault(index, []).insert(0, statement)
+            replacements[id(first)] = read()
+            for _, node in repeats:
+                replacements[id(node)] = read()
+                removed.update(id(child) for child in walk(node))
+        if not replacements:
+            continue
+        statements = []
+        for index, statement in enumerate(block.expressions):
+            for declaration in declarations.get(index, []):
+                substitute(declaration.statement.value, replacements)
+                statements.append(declaration)
+            substitute(statement, replacements)
+            statements.append(statement)
+        block.expressions = statements
+
+
+def invariant_values(loop, variant, int_model):
+    """
+    Return the largest pure scalar operations evaluated in each iteration of
+    loop whose operands no iteration changes. variant holds the names the
+    loop assigns.
+
+    Operators that can fail are left in place, as hoisting evaluates them
+    even when the loop never runs: // and %, list loads, calls, and int
+    arithmetic under the checked int model.
+    """
+    if isinstance(loop, WhileNode):
+        roots = [loop.condition, loop.body]
+    else:
+        roots = [loop.body]
+    invariant = {}
+    for root in roots:
+        for node in postorder(root):
+            if isinstance(node, VariableNode):
+                invariant[id(node)] = node.name not in variant
+            elif isinstance(node, (IntNode, FloatNode, TrueNode, FalseNode)):
+                invariant[id(node)] = True
+            elif isinstance(node, BinaryOperatorNode):
+                invariant[id(node)] = (
+                    node.operator not in BinaryOperatorNode.FLOORED
+                    and not (int_model == "checked" and node.type is INT)
+                    and invariant[id(node.left)]
+                    and invariant[id(node.right)]
+                )
+            elif isinstance(node, (NegateNode, ParenthesisNode)):
+                invariant[id(node)] = invariant[id(next(node.children()))]
+            else:
+                invariant[id(node)] = False
+    found = []
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        if (
+            isinstance(node, BinaryOperatorNode)
+            and invariant[id(node)]
+            and node.type.scalar
+        ):
+            found.append(node)
+            continue
+        stack.extend(reversed(list(node.children())))
+    return found
+
+
+def hoist_loop_invariants(tree, int_model):
+    """
+    Move the invariant operations of each loop (see invariant_values()) into
+    temporaries declared just before it, one per distinct expression. Inner
+    loops go first, so an operation invariant in several nested loops moves
+    out one loop at a time. Then name the stop bound of each counted loop,
+    for when it is evaluated once.
+    """
+    names = temporaries(tree, "_inv")
+    for block in postorder(tree):
+        if not isinstance(block, StatementList):
+            continue
+        statements = []
+        for statement in block.expressions:
+            if isinstance(statement, (WhileNode, ForNode, CountedForNode)):
+                variant = assigned_names(statement)
+                variant.add(getattr(statement, "item_name", None))
+                reads = {}
+                replacements = {}
+                for node in invariant_values(statement, variant, int_model):
+                    key = node.evaluate()
+                    if key not in reads:
+                        declaration, reads[key] = declare(next(names), node)
+                        statements.append(declaration)
+                    replacements[id(node)] = reads[key]()
+                substitute(statement, replacements)
+            statements.append(statement)
+        block.expressions = statements
+    # the stop bounds evaluated once, in the init statement of their loop;
+    # later passes may still change whether a stop needs it
+    stops = temporaries(tree, "_stop")
+    for node in walk(tree):
+        if isinstance(node, CountedForNode):
+            node.stop_name = next(stops)
+
+
+def simple_bound(node):
+    return isinstance(node, (IntNode, VariableNode))
+
+
+def copy_bound(node):
+    """
+    Return a new node for the literal or variable node.
+    """
+    if isinstance(node, IntNode):
+        copy = IntNode(node.value)
+    else:
+        copy = VariableNode(node.name, "auto")
+    copy.type = node.type
+    return copy
+
+
+def reserve_appends(tree):
+    """
+    Reserve room in a vector before a loop that appends to it, when the
+    number of appends is known before the loop runs: a fixed number of
+    appends per iteration, outside any condition, over a counted range() or
+    the items of a list or str (see ReserveNode), in a loop without a break
+    or return that could end it early. A bound or iterable that
+    is not a literal or a variable is first computed into a temporary.
+
+    Only vectors declared in the block of the loop, or filled by a
+    comprehension, are reserved for. A vector declared outside an enclosing
+    loop would be reserved for exactly the appends of each run of the inner
+    one, reallocating on every run instead of growing geometrically.
+    """
+    names = temporaries(tree, "_bound")
+    comprehensions = {
+        id(node.body): node.name
+        for node in walk(tree)
+        if isinstance(node, ComprehensionNode)
+    }
+    for block in [node for node in walk(tree) if isinstance(node, StatementList)]:
+        declared = set()
+        statements = []
+        for statement in block.expressions:
+            if isinstance(statement, StatementNode) and isinstance(
+                statement.statement, DeclarationNode
+            ):
+                name = statement.statement.name
+                if isinstance(name, VariableNode) and isinstance(name.type, VectorType):
+                    declared.add(name.name)
+            if isinstance(statement, (ForNode, CountedForNode)):
+                statements += reservations(
+                    statement, declared, comprehensions.get(id(block)), names
+                )
+            statements.append(statement)
+        block.expressions = statements
+
+
+def reservations(loop, declared, fresh, names):
+    """
+    Return the statements reserve_appends() inserts before loop, for the
+    vectors named in declared or the new vector fresh.
+    """
+    appends = {}
+    for statement in loop.body.statements.expressions:
+        if isinstance(statement, StatementNode) and isinstance(
+            statement.statement, AppendNode
+        ):
+            target = statement.statement.target
+            if target.name in declared or target.name == fresh:
+                appends.setdefault(target.name, [target, 0])[1] += 1
+    statements = []
+    if not appends:
+        return statements
+    # a loop that may stop early may append far fewer items than it could
+    if breaks_out(loop.body) or any(
+        isinstance(node, ReturnNode) for node in walk(loop.body)
+    ):
+        return statements
+    if isinstance(loop, CountedForNode):
+        for bound in ("start", "stop"):
+            if not simple_bound(getattr(loop, bound)):
+                declaration, read = declare(next(names), getattr(loop, bound))
+                statements.append(declaration)
+                setattr(loop, bound, read())
+        bounds = (loop.start, loop.stop, loop.step)
+        items = None
+    elif isinstance(loop.iterable.type, VectorType) or loop.iterable.type is STRING:
+        if not isinstance(loop.iterable, VariableNode):
+            declaration, read = declare(next(names), loop.iterable)
+            statements.append(declaration)
+            loop.iterable = read()
+        bounds = (None,) * 3
+        items = loop.iterable
+    else:
+        return statements
+    for name, (target, per_trip) in appends.items():
+        copies = [None if node is None else copy_bound(node) for node in bounds]
+        statements.append(
+            ReserveNode(
+                copy_bound(target),
+                per_trip,
+                name == fresh,
+                None if items is None else copy_bound(items),
+                copies,
+            )
+        )
+    return statements
+
+
+# element types a constexpr std::array can hold
+CONSTANT_ELEMENTS = (INT, INT64, DOUBLE, BOOL, CHAR)
+
+
+def escaped_lists(nodes):
+    """
+    Return the names of the variables that nodes use other than by reading
+    them through an element, an iteration or their size.
+    """
+    # the places a list may be read from as a whole
+    allowed = set()
+    for node in nodes:
+        if isinstance(node, DeclarationNode):
+            allowed.add(id(node.name))
+        elif isinstance(node, ForNode):
+            allowed.add(id(node.iterable))
+        elif isinstance(node, ReserveNode):
+            allowed.add(id(node.items))
+        elif isinstance(node, LenNode):
+            allowed.add(id(node.sequence))
+    escaped = {
+        node.name
+        for node in nodes
+        if isinstance(node, VariableNode) and id(node) not in allowed
+    }
+    for node in nodes:
+        if isinstance(node, (AssignmentNode, DeclarationNode)) and isinstance(
+            node.name, ListElementNode
+        ):
+            escaped.add(node.name.array)
+    return escaped
+
+
+def constant_lists(tree, include_flags):
+    """
+    Emit as static constexpr std::array the lists declared with a literal of
+    literal scalars that are only ever read: by element, by iterating over
+    them, or for their size (by len() or a ReserveNode). Any other use, such as
+    assigning an element, appending, or passing the list to a function, which
+    takes a std::vector, keeps it a vector.
+    """
+    functions = [node for node in walk(tree) if isinstance(node, FunctionNode)]
+    for scope in [tree, *functions]:
+        if scope is tree:
+            # the top-level statements, without the functions
+            nodes = [
+                node
+                for statement in tree.expressions
+                if not isinstance(statement, FunctionNode)
+                for node in walk(statement)
+            ]
+        else:
+            nodes = list(walk(scope.body))
+        declarations = {}
+        for node in nodes:
+            if isinstance(node, DeclarationNode) and isinstance(
+                node.name, VariableNode
+            ):
+                declarations.setdefault(node.name.name, []).append(node)
+        escaped = escaped_lists(nodes)
+        if scope is tree:
+            # a top-level list is also used by the functions that do not
+            # declare a variable of the same name
+            for function in functions:
+                local = {arg.name for arg in function.args}
+                local.update(
+                    node.name.name
+                    for node in walk(function.body)
+                    if isinstance(node, DeclarationNode)
+                    and isinstance(node.name, VariableNode)
+                )
+                escaped |= escaped_lists(list(walk(function.body))) - local
+        for name, found in declarations.items():
+            declaration = found[0]
+            value = declaration.value
+            if (
+                len(found) == 1
+                and name not in escaped
+                and isinstance(value, ListNode)
+                and value.elements
+                and value.element_type in CONSTANT_ELEMENTS
+                and all(
+                    literal(element) is not None or isinstance(element, CharNode)
+                    for element in value.elements
+                )
+            ):
+                declaration.constant = True
+                include_flags["array"] = True
+
+
+def self_call(node, function):
+    """
+    Return node, under any parentheses, if it is a call of function.
+    """
+    while isinstance(node, ParenthesisNode):
+        node = node.inner
+    if isinstance(node, FunctionCallNode) and node.name == function.name:
+        return node
+    return None
+
+
+def parenthesized(node):
+    if isinstance(node, (BinaryOperatorNode, IfExpressionNode)):
+        return ParenthesisNode(node)
+    return node
+
+
+def falls_through(block):
+    """
+    Whether control can reach the end of the statement list block, as far as
+    its last statement tells.
+    """
+    if not block.expressions:
+        return True
+    last = block.expressions[-1]
+    if isinstance(last, (ReturnNode, ContinueNode)):
+        return False
+    if isinstance(last, IfStatementsNode) and last.else_node is not None:
+        branches = [last.if_node, *last.elif_nodes, last.else_node]
+        return any(falls_through(branch.body.statements) for branch in branches)
+    return True
+
+
+def rebind(params, values, names):
+    """
+    Return the statements assigning values to the parameters params all at
+    once, as a call binds its arguments: a value reading a parameter assigned
+    before it is saved in a temporary first.
+    """
+    saved = []
+    assignments = []
+    assigned = set()
+    for param, value in zip(params, values):
+        if isinstance(value, VariableNode) and value.name == param.name:
+            continue
+        if read_names(value) & assigned:
+            declaration, read = declare(next(names), value)
+            saved.append(declaration)
+            value = read()
+        variable = VariableNode(param.name, "auto")
+        variable.type = param.type
+        assignments.append(StatementNode(AssignmentNode(variable, value)))
+        assigned.add(param.name)
+    return saved + assignments
+
+
+def recursion_to_loop(function, accumulate, names):
+    """
+    Rewrite the self-recursive function as a loop if every recursive call is
+    in a return outside any loop (see recursion_to_loops()), and return
+    whether it was.
+    """
+    returns = []
+    stack = [function.body]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (WhileNode, ForNode, CountedForNode, FunctionNode)):
+            continue
+        if isinstance(node, StatementList):
+            returns += [
+                (node, statement)
+                for statement in node.expressions
+                if isinstance(statement, ReturnNode)
+            ]
+        stack.extend(node.children())
+
+    # id of each return with a recursive call -> (call, term added to it)
+    tails = {}
+    operator = None
+    for _, statement in returns:
+        value = statement.value
+        while isinstance(value, ParenthesisNode):
+            value = value.inner
+        call = self_call(value, function)
+        if call is not None:
+            tails[id(statement)] = (call, None)
+        elif isinstance(value, BinaryOperatorNode) and value.operator in ("+", "*"):
+            for operand, term in [(value.left, value.right), (value.right, value.left)]:
+                call = self_call(operand, function)
+                if call is not None and operator in (None, value.operator):
+                    tails[id(statement)] = (call, term)
+                    operator = value.operator
+                    break
+    handled = {id(call) for call, _ in tails.values()}
+    if (
+        not tails
+        or any(
+            self_call(node, function) is not None and id(node) not in handled
+            for node in walk(function.body)
+        )
+        or any(len(call.args) != len(function.args) for call, _ in tails.values())
+    ):
+        return False
+    if operator is not None and not (
+        accumulate
+        and function.return_type is INT
+        and all(term is None or term.type is INT for _, term in tails.values())
+    ):
+        return False
+
+    body = StatementList()
+    if operator is not None:
+        identity = 0 if operator == "+" else 1
+        declaration, accumulator = declare(next(names["_acc"]), IntNode(identity))
+        body.add(declaration)
+        # every other return, in a loop or not, ends the sum or product
+        stack = [function.body]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, FunctionNode):
+                continue
+            if isinstance(node, ReturnNode) and id(node) not in tails:
+                value = node.value
+                if isinstance(value, IntNode) and value.value == identity:
+                    node.value = accumulator()
+                else:
+                    node.value = BinaryOperatorNode(
+                        operator, accumulator(), parenthesized(value)
+                    )
+            stack.extend(node.children())
+    for block, statement in returns:
+        if id(statement) not in tails:
+            continue
+        call, term = tails[id(statement)]
+        statements = []
+        if term is not None:
+            total = BinaryOperatorNode(operator, accumulator(), parenthesized(term))
+            statements.append(StatementNode(AssignmentNode(accumulator(), total)))
+        statements += rebind(function.args, call.args, names["_tail"])
+        statements.append(ContinueNode())
+        index = next(i for i, node in enumerate(block.expressions) if node is statement)
+        block.expressions[index : index + 1] = statements
+
+    loop = function.body.statements
+    if falls_through(loop):
+        loop.add(BreakNode())
+    body.add(WhileNode(TrueNode(), BraceNode(loop)))
+    function.body = BraceNode(body)
+    return True
+
+
+def recursion_to_loops(tree, int_model):
+    """
+    Turn self-recursive functions into loops, and return their names.
+
+    A recursive call in a return, return f(a, b), assigns a and b to the
+    parameters and jumps back to the top of a while (true) loop around the
+    body. So does return e + f(a, b) in a function returning int, or with *
+    instead of +, if every recursive call has that form: e is then added to
+    an accumulator, which the other returns add to their value. That reorders
+    the arithmetic, so it is not done under the checked int model, where the
+    new order could overflow where Python's does not.
+
+    Memoized functions are left alone, as their recursive calls go through
+    the memo table.
+    """
+    names = {prefix: temporaries(tree, prefix) for prefix in ("_acc", "_tail")}
+    return [
+        node.name
+        for node in list(walk(tree))
+        if isinstance(node, FunctionNode)
+        and not node.memoized
+        and recursion_to_loop(node, int_model != "checked", names)
+    ]
+
+
+INT64_RANGE = (-(2**63), 2**63 - 1)
+
+
+def fits(interval, bounds=INT64_RANGE):
+    """
+    Whether interval is known and lies within bounds.
+    """
+    return interval is not None and bounds[0] <= interval[0] <= interval[1] <= bounds[1]
+
+
+def operator_range(node, ranges):
+    """
+    Return the interval of an int-valued operator node from the intervals of
+    its operands in ranges, or None if it is unbounded or unknown.
+    """
+    if isinstance(node, IntNode):
+        return (node.value, node.value)
+    if isinstance(node, LenNode):
+        return (0, INT64_RANGE[1])
+    if isinstance(node, ParenthesisNode):
+        return ranges.get(id(node.inner))
+    if isinstance(node, NegateNode):
+        operand = ranges.get(id(node.operand))
+        return None if operand is None else (-operand[1], -operand[0])
+    if not isinstance(node, BinaryOperatorNode):
+        return None
+    a = ranges.get(id(node.left))
+    b = ranges.get(id(node.right))
+    if node.operator == "%" and b is not None and not b[0] <= 0 <= b[1]:
+        # the remainder is smaller than the divisor and takes its sign
+        if b[0] > 0:
+            if a is not None and a[0] >= 0:
+                return (0, min(a[1], b[1] - 1))
+            return (0, b[1] - 1)
+        if a is not None and a[1] <= 0:
+            return (max(a[0], b[0] + 1), 0)
+        return (b[0] + 1, 0)
+    if a is None or b is None:
+        return None
+    if node.operator == "+":
+        return (a[0] + b[0], a[1] + b[1])
+    if node.operator == "-":
+        return (a[0] - b[1], a[1] - b[0])
+    if node.operator == "*":
+        corners = [x * y for x in a for y in b]
+        return (min(corners), max(corners))
+    if node.operator == "/" and not b[0] <= 0 <= b[1]:
+        # the quotient is monotonic in each operand away from a zero divisor
+        corners = [x // y for x in a for y in b]
+        return (min(corners), max(corners))
+    return None
+
+
+def union(intervals):
+    """
+    Return the smallest interval containing all of intervals, or None if
+    there are none or any of them is unbounded.
+    """
+    if not intervals or None in intervals:
+        return None
+    return (min(lo for lo, _ in intervals), max(hi for _, hi in intervals))
+
+
+def trip_count(loop, ranges):
+    """
+    Return an upper bound on the number of iterations of a counted loop, or
+    None if its bounds are unknown.
+    """
+    start = ranges.get(id(loop.start))
+    stop = ranges.get(id(loop.stop))
+    if start is None or stop is None:
+        return None
+    step = loop.step.value
+    if step > 0:
+        return max(0, -((start[0] - stop[1]) // step))
+    return max(0, -((stop[0] - start[1]) // step))
+
+
+def accumulators(function):
+    """
+    Return the local variables of function that are declared once and only
+    ever updated as `v = v + e`, `v = e + v` or `v = v - e`, mapped to the
+    operators of those updates by id(assignment).
+    """
+    declared = {}
+    updates = {}
+    for node in walk(function.body):
+        if isinstance(node, DeclarationNode) and isinstance(node.name, VariableNode):
+            declared[node.name.name] = declared.get(node.name.name, 0) + 1
+        elif isinstance(node, AssignmentNode) and isinstance(node.name, VariableNode):
+            name = node.name.name
+            value = node.value
+            update = None
+            if isinstance(value, BinaryOperatorNode) and value.operator in "+-":
+                if isinstance(value.left, VariableNode) and value.left.name == name:
+                    update = (value.operator, value.right)
+                elif (
+                    value.operator == "+"
+                    and isinstance(value.right, VariableNode)
+                    and value.right.name == name
+                ):
+                    update = ("+", value.left)
+            updates.setdefault(name, {})[id(node)] = update
+    return {
+        name: operators
+        for name, operators in updates.items()
+        if declared.get(name) == 1 and None not in operators.values()
+    }
+
+
+def range_pass(tree, assumed):
+    """
+    One round of value_ranges(): return the intervals of the nodes in tree,
+    given the intervals assumed for parameters, return values and
+    accumulators, and the intervals those assumptions imply in turn.
+    """
+    reassigned = {
+        node.name.name
+        for node in walk(tree)
+        if isinstance(node, AssignmentNode) and isinstance(node.name, VariableNode)
+    }
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    updates = {name: accumulators(function) for name, function in functions.items()}
+    arguments = {}
+    returns = {}
+    increments = {}
+    ranges = {}
+    # the trip counts of the counted loops around the current node
+    loops = []
+    # an explicit stack, as in retype(); entries are (action, node, variables,
+    # function) where variables maps the names in scope to their intervals
+    stack = [("visit", tree, {}, None)]
+    while stack:
+        action, node, variables, function = stack.pop()
+        if action == "bind":
+            name, interval = node
+            if name is not None:
+                variables[name] = interval
+            loops.pop()
+        elif action == "visit":
+            if isinstance(node, FunctionNode):
+                scope = dict(variables)
+                for i, arg in enumerate(node.args):
+                    # a parameter the body assigns to may leave its arguments'
+                    # interval
+                    ranges[id(arg)] = None
+                    if arg.name not in reassigned:
+                        ranges[id(arg)] = assumed.get(("param", node.name, i))
+                    scope[arg.name] = ranges[id(arg)]
+                stack.append(("visit", node.body, scope, node))
+                continue
+            stack.append(("finish", node, variables, function))
+            if isinstance(node, DeclarationNode):
+                stack.append(("visit", node.value, variables, function))
+            elif isinstance(node, (ForNode, CountedForNode, WhileNode)):
+                item_name = getattr(node, "item_name", None)
+                outer = (item_name, variables.get(item_name))
+                stack.append(("bind", outer, variables, function))
+                stack.append(("visit", node.body, variables, function))
+                stack.append(("index", node, variables, function))
+                stack.extend(
+                    ("visit", child, variables, function)
+                    for child in reversed(list(node.children()))
+                    if child is not node.body
+                )
+            else:
+                stack.extend(
+                    ("visit", child, variables, function)
+                    for child in reversed(list(node.children()))
+                )
+        elif action == "index":
+            interval = None
+            trips = None
+            if isinstance(node, CountedForNode):
+                # the index lies between its bounds, and an unknown bound is
+                # at worst an int64 (see lower_ints())
+                start = ranges.get(id(node.start)) or INT64_RANGE
+                stop = ranges.get(id(node.stop)) or INT64_RANGE
+                if node.step.value > 0:
+                    interval = (start[0], max(start[0], stop[1] - 1))
+                else:
+                    interval = (min(start[1], stop[0] + 1), start[1])
+                ranges[id(node)] = interval
+                trips = trip_count(node, ranges)
+            loops.append(trips)
+            if not isinstance(node, WhileNode):
+                variables[node.item_name] = interval
+        elif isinstance(node, VariableNode):
+            ranges[id(node)] = variables.get(node.name)
+        elif isinstance(node, DeclarationNode):
+            name = node.name.name
+            interval = None
+            if function is not None and name in updates[function.name]:
+                increments.setdefault((function.name, name), [])
+                initial = ranges.get(id(node.value))
+                increments[(function.name, name)].append((initial, 1))
+                interval = assumed.get(("accumulator", function.name, name))
+            elif name not in reassigned:
+                interval = ranges.get(id(node.value))
+            variables[name] = interval
+            ranges[id(node.name)] = interval
+        elif isinstance(node, AssignmentNode):
+            name = getattr(node.name, "name", None)
+            if function is not None and name in updates[function.name]:
+                operator, term = updates[function.name][name][id(node)]
+                term = ranges.get(id(term))
+                count = None if None in loops else 1
+                for trips in loops:
+                    count = None if count is None else count * trips
+                if term is not None and operator == "-":
+                    term = (-term[1], -term[0])
+                if term is not None:
+                    term = (min(term[0], 0), max(term[1], 0))
+                increments.setdefault((function.name, name), []).append((term, count))
+        elif isinstance(node, FunctionCallNode) and node.name in functions:
+            for i, arg in enumerate(node.args):
+                arguments.setdefault((node.name, i), []).append(ranges.get(id(arg)))
+            ranges[id(node)] = assumed.get(("return", node.name))
+        else:
+            if isinstance(node, ReturnNode) and function is not None:
+                returns.setdefault(function.name, []).append(ranges.get(id(node.value)))
+            if getattr(node, "type", None) is INT:
+                ranges[id(node)] = operator_range(node, ranges)
+
+    derived = {}
+    for (name, i), intervals in arguments.items():
+        derived[("param", name, i)] = union(intervals)
+    for name, intervals in returns.items():
+        derived[("return", name)] = union(intervals)
+    for (name, variable), terms in increments.items():
+        lo = hi = 0
+        for term, count in terms:
+            if term is None or count is None:
+                break
+            lo += term[0] * count
+            hi += term[1] * count
+        else:
+            derived[("accumulator", name, variable)] = (lo, hi)
+    return ranges, {key: value for key, value in derived.items() if value is not None}
+
+
+def value_ranges(tree):
+    """
+    Return the interval of values every int-valued node in tree can take, keyed
+    by id(node), with None where no bound is known. Counted loops map to the
+    interval of their index.
+
+    Bounds come from literals and range() loops and flow through arithmetic,
+    through variables assigned only by their declaration, and from call sites
+    into parameters and from returns into calls. A variable only ever updated
+    as `v = v + e` inside counted loops is bounded by its initial value plus
+    the trip counts times the bounds of e.
+
+    Each round assumes what the previous one proved, starting from nothing,
+    so every round is sound on its own; rounds stop once nothing changes.
+    """
+    assumed = {}
+    for _ in range(len(tree.expressions) + 2):
+        ranges, derived = range_pass(tree, assumed)
+        if derived == assumed:
+            break
+        assumed = derived
+    return ranges
+
+
+def rebound_names(node):
+    """
+    Return the names given a new value, or for a list a new length, anywhere
+    within node: assigned or declared as a whole, appended to, or bound by a
+    for loop. Unlike assigned_names(), assigning an element does not count.
+    """
+    names = set()
+    for child in walk(node):
+        if isinstance(child, (AssignmentNode, DeclarationNode)):
+            if isinstance(child.name, VariableNode):
+                names.add(child.name.name)
+        elif isinstance(child, AppendNode):
+            names.add(child.target.name)
+        elif isinstance(child, (ForNode, CountedForNode)):
+            names.add(child.item_name)
+    return names
+
+
+def index_offset(node):
+    """
+    Return (name, offset) if node is `name`, `name + k`, `k + name` or
+    `name - k` for a literal k, else None.
+    """
+    while isinstance(node, ParenthesisNode):
+        node = node.inner
+    if isinstance(node, VariableNode):
+        return node.name, 0
+    if not isinstance(node, BinaryOperatorNode) or node.operator not in "+-":
+        return None
+    left, right = node.left, node.right
+    if node.operator == "+" and isinstance(left, IntNode):
+        left, right = right, left
+    if isinstance(left, VariableNode) and isinstance(right, IntNode):
+        return left.name, right.value if node.operator == "+" else -right.value
+    return None
+
+
+def length_bound(node, lengths):
+    """
+    Return (array, k) if node is `len(array) - k`, where len(array) may also
+    be a variable holding it (see lengths in eliminate_bounds_checks()), else
+    None.
+    """
+    while isinstance(node, ParenthesisNode):
+        node = node.inner
+    if isinstance(node, LenNode) and isinstance(node.sequence, VariableNode):
+        return node.sequence.name, 0
+    if isinstance(node, VariableNode) and node.name in lengths:
+        return lengths[node.name], 0
+    if (
+        isinstance(node, BinaryOperatorNode)
+        and node.operator in "+-"
+        and isinstance(node.right, IntNode)
+    ):
+        bound = length_bound(node.left, lengths)
+        if bound is not None:
+            k = node.right.value
+            return bound[0], bound[1] + (k if node.operator == "-" else -k)
+    return None
+
+
+def comparison_bounds(condition, lengths, holds=True):
+    """
+    Return what condition, or its negation if not holds, proves about an
+    index: {(name, array): slack} for a comparison that implies
+    `name + slack < len(array)`.
+    """
+    while isinstance(condition, ParenthesisNode):
+        condition = condition.inner
+    if not isinstance(condition, BinaryOperatorNode) or condition.operator not in (
+        "<",
+        "<=",
+        ">",
+        ">=",
+    ):
+        return {}
+    left, operator, right = condition.left, condition.operator, condition.right
+    if operator in (">", ">="):
+        left, right = right, left
+        operator = "<" if operator == ">" else "<="
+    if not holds:
+        # not (a < b) is b <= a, and not (a <= b) is b < a
+        left, right = right, left
+        operator = "<=" if operator == "<" else "<"
+    offset = index_offset(left)
+    bound = length_bound(right, lengths)
+    if offset is None or bound is None:
+        return {}
+    # name + d < len(array) - k, or <=, which for ints is one less
+    slack = offset[1] + bound[1] - (operator == "<=")
+    return {(offset[0], bound[0]): slack}
+
+
+def exits(block):
+    """
+    Whether block ends by leaving it: with a return, break or continue.
+    """
+    expressions = block.statements.expressions
+    return bool(expressions) and isinstance(
+        expressions[-1], (ReturnNode, BreakNode, ContinueNode)
+    )
+
+
+def list_size(node):
+    """
+    Return the number of elements of the list node builds, if it is a list
+    literal or a comprehension over a range() of literals without a
+    condition, or None.
+    """
+    if isinstance(node, ListNode):
+        return len(node.elements)
+    if not isinstance(node, ComprehensionNode):
+        return None
+    statements = [
+        statement
+        for statement in node.body.expressions
+        if not isinstance(statement, ReserveNode)
+    ]
+    if len(statements) != 1 or not isinstance(statements[0], CountedForNode):
+        return None
+    loop = statements[0]
+    bounds = [literal(bound) for bound in (loop.start, loop.stop, loop.step)]
+    body = loop.body.statements.expressions
+    if (
+        any(type(bound) is not int for bound in bounds)
+        or len(body) != 1
+        or not isinstance(body[0], StatementNode)
+        or not isinstance(body[0].statement, AppendNode)
+    ):
+        return None
+    return len(range(*bounds))
+
+
+def eliminate_bounds_checks(tree, bounds, ranges, include_flags):
+    """
+    Under --bounds=checked, index lists and strings through pcpp::at(), which
+    raises on an index out of range, except where the index is provably in
+    range. Return (kept, total), the number of checks left and of indexing
+    operations; under unchecked, return None and leave indexing unchecked.
+
+    An index is in range when ranges (from value_ranges()) put it in [0, n)
+    for a list declared once from an n-element literal, or a comprehension
+    over range() of n items (see list_size()), and never appended to.
+    Otherwise it must be `i`, `i + k` or `i - k`, non-negative by ranges or
+    because i only ever grows from a non-negative value, and below len(a) by
+    a comparison that dominates it: the stop of `for i in range(..., len(a))`,
+    the start of a descending range(len(a) - 1, ...), the condition of an
+    enclosing if or while, or an earlier `if i >= len(a):` that returns,
+    breaks or continues. A comparison holds until i is assigned or a changes
+    length, and len(a) may have been saved in a variable first, as in
+    `n = len(a)`.
+    """
+    if bounds == "unchecked":
+        return None
+    if bounds not in BOUNDS:
+        raise ValueError(f"Unknown bounds mode {bounds}")
+    counts = [0, 0]
+
+    def check(node, sizes, growing, facts):
+        counts[1] += 1
+        interval = ranges.get(id(node.index))
+        if node.array in sizes and fits(interval, (0, sizes[node.array] - 1)):
+            return
+        offset = index_offset(node.index)
+        if offset is not None and offset[1] <= facts.get((offset[0], node.array), -1):
+            if (interval is not None and interval[0] >= 0) or (
+                offset[1] >= 0 and offset[0] in growing
+            ):
+                return
+        node.checked = True
+        counts[0] += 1
+        include_flags["pcpp"] = True
+
+    def without(lengths, facts, names):
+        return (
+            {n: a for n, a in lengths.items() if n not in names and a not in names},
+            {k: slack for k, slack in facts.items() if names.isdisjoint(k)},
+        )
+
+    def visit(node, sizes, growing, lengths, facts):
+        # lengths maps variables to the lists whose length they hold, and
+        # facts maps (index, list) to the slack proved for them, before node
+        if isinstance(node, FunctionNode):
+            return
+        if isinstance(node, StatementList):
+            for statement in node.expressions:
+                visit(statement, sizes, growing, lengths, facts)
+                lengths, facts = without(lengths, facts, rebound_names(statement))
+                inner = getattr(statement, "statement", None)
+                if (
+                    isinstance(inner, DeclarationNode)
+                    and isinstance(inner.name, VariableNode)
+                    and isinstance(inner.value, LenNode)
+                    and isinstance(inner.value.sequence, VariableNode)
+                ):
+                    lengths = {**lengths, inner.name.name: inner.value.sequence.name}
+                if (
+                    isinstance(statement, IfStatementsNode)
+                    and not statement.elif_nodes
+                    and statement.else_node is None
+                    and exits(statement.if_node.body)
+                ):
+                    condition = statement.if_node.condition
+                    facts = {**facts, **comparison_bounds(condition, lengths, False)}
+            return
+        if isinstance(node, IfStatementsNode):
+            for branch in [node.if_node, *node.elif_nodes]:
+                visit(branch.condition, sizes, growing, lengths, facts)
+                proved = comparison_bounds(branch.condition, lengths)
+                visit(branch.body, sizes, growing, lengths, {**facts, **proved})
+            if node.else_node is not None:
+                visit(node.else_node.body, sizes, growing, lengths, facts)
+            return
+        if isinstance(node, (WhileNode, ForNode, CountedForNode)):
+            if not isinstance(node, WhileNode):
+                # the iterable or bounds are evaluated once, before the loop
+                for child in node.children():
+                    if child is not node.body:
+                        visit(child, sizes, growing, lengths, facts)
+            # what holds at the start of every iteration
+            changed = rebound_names(node)
+            lengths, facts = without(lengths, facts, changed)
+            proved = {}
+            if isinstance(node, WhileNode):
+                visit(node.condition, sizes, growing, lengths, facts)
+                proved = comparison_bounds(node.condition, lengths)
+            elif isinstance(node, CountedForNode):
+                if node.step.value > 0:
+                    bound = length_bound(node.stop, lengths)
+                    slack = 0 if bound is None else bound[1]
+                else:
+                    bound = length_bound(node.start, lengths)
+                    slack = 0 if bound is None else bound[1] - 1
+                if bound is not None and bound[0] not in changed:
+                    proved = {(node.item_name, bound[0]): slack}
+            visit(node.body, sizes, growing, lengths, {**facts, **proved})
+            return
+        if isinstance(node, ListElementNode):
+            check(node, sizes, growing, facts)
+        for child in node.children():
+            visit(child, sizes, growing, lengths, facts)
+
+    def scope(body, function):
+        rebound = {}
+        for node in walk(body):
+            if isinstance(node, (AssignmentNode, DeclarationNode)):
+                if isinstance(node.name, VariableNode):
+                    rebound.setdefault(node.name.name, []).append(node)
+            elif isinstance(node, AppendNode):
+                rebound.setdefault(node.target.name, []).append(node)
+            elif isinstance(node, (ForNode, CountedForNode)):
+                rebound.setdefault(node.item_name, []).append(node)
+        # the lists of fixed size, declared once from a literal or range()
+        sizes = {
+            name: list_size(nodes[0].value)
+            for name, nodes in rebound.items()
+            if len(nodes) == 1 and isinstance(nodes[0], DeclarationNode)
+        }
+        sizes = {name: size for name, size in sizes.items() if size is not None}
+        # the variables that start non-negative and never decrease; a for
+        # loop may rebind one to anything
+        growing = set()
+        if function is not None:
+            for name, updates in accumulators(function).items():
+                if any(
+                    isinstance(node, (ForNode, CountedForNode))
+                    for node in rebound[name]
+                ):
+                    continue
+                initial = [
+                    ranges.get(id(node.value))
+                    for node in rebound[name]
+                    if isinstance(node, DeclarationNode)
+                ]
+                steps = [
+                    ranges.get(id(term)) if operator == "+" else None
+                    for operator, term in updates.values()
+                ]
+                if all(
+                    interval is not None and interval[0] >= 0
+                    for interval in initial + steps
+                ):
+                    growing.add(name)
+        visit(body, sizes, growing, {}, {})
+
+    scope(tree, None)
+    for node in tree.expressions:
+        if isinstance(node, FunctionNode):
+            scope(node.body, node)
+    return tuple(counts)
+
+
+def floor_divisions(tree, ranges, include_flags):
+    """
+    Give int // and % Python's rounding toward negative infinity.
+
+    C++ truncates toward zero instead, which only differs when an operand is
+    negative, so the plain operator is kept where ranges (from value_ranges())
+    prove both operands non-negative, as for indices of ascending range() loops.
+    """
+    for node in walk(tree):
+        if (
+            isinstance(node, BinaryOperatorNode)
+            and node.operator in BinaryOperatorNode.FLOORED
+            and node.type is INT
+        ):
+            signs = (ranges.get(id(node.left)), ranges.get(id(node.right)))
+            node.floored = not all(
+                interval is not None and interval[0] >= 0 for interval in signs
+            )
+            if node.floored:
+                include_flags["pcpp"] = True
+
+
+def lower_ints(tree, int_model, include_flags, ranges):
+    """
+    Choose the C++ representation of Python ints for int_model.
+
+    int32 keeps C++ int, and int64 uses std::int64_t; both wrap around on
+    overflow. checked also uses std::int64_t, but every +, - and * that
+    value_ranges() cannot prove to fit raises std::overflow_error instead.
+    bigint keeps variables, return values and arithmetic that provably fit on
+    std::int64_t and moves everything else to pcpp::BigInt, converting
+    explicitly where the two meet; range() loops always count in std::int64_t.
+    ranges are the intervals from value_ranges().
+    """
+    if int_model == "int32":
+        return
+    if int_model not in INT_MODELS:
+        raise ValueError(f"Unknown int model {int_model}")
+    include_flags["cstdint"] = True
+    big = int_model == "bigint"
+    checked = int_model == "checked"
+    element = BIGINT if big else INT64
+    if big:
+        include_flags["pcpp"] = True
+
+    def lowered(type_):
+        if type_ is INT:
+            return element
+        if isinstance(type_, VectorType):
+            return VectorType(lowered(type_.element))
+        if isinstance(type_, ArrayType):
+            # fixed-width, like NumPy's int64
+            return ArrayType(INT64 if type_.element is INT else type_.element)
+        return type_
+
+    def storage(node):
+        # the type of a variable or return value with the values of node
+        return INT64 if not big or fits(ranges.get(id(node))) else BIGINT
+
+    def to_native(node):
+        return CastNode(node, INT64) if node.type is BIGINT else node
+
+    def to_big(node):
+        return CastNode(node, BIGINT) if node.type is INT64 else node
+
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    for function in functions.values():
+        # signatures first, so that calls can convert to them in any order
+        for arg in function.args:
+            arg.type = storage(arg) if arg.type is INT else lowered(arg.type)
+        if function.name == "main":
+            continue
+        if function.return_type is INT:
+            values = [
+                node.value
+                for node in walk(function.body)
+                if isinstance(node, ReturnNode)
+            ]
+            function.return_type = INT64
+            if any(storage(value) is BIGINT for value in values):
+                function.return_type = BIGINT
+        else:
+            function.return_type = lowered(function.return_type)
+
+    for statement in tree.expressions:
+        function = statement if isinstance(statement, FunctionNode) else None
+        for node in postorder(statement):
+            if isinstance(node, VariableNode):
+                node.type = storage(node) if node.type is INT else lowered(node.type)
+            elif isinstance(node, IntNode):
+                node.type = storage(node)
+            elif isinstance(node, NegateNode) and node.type is INT:
+                if not big:
+                    node.type = INT64
+                    node.checked = checked and not fits(ranges.get(id(node)))
+                elif node.operand.type is INT64 and fits(ranges.get(id(node))):
+                    node.type = INT64
+                else:
+                    node.type = BIGINT
+                    node.operand = to_big(node.operand)
+            elif isinstance(node, BinaryOperatorNode) and node.type is INT:
+                native = node.left.type is INT64 and node.right.type is INT64
+                if not big:
+                    node.type = INT64
+                    node.checked = (
+                        checked
+                        and node.operator in BinaryOperatorNode.CHECKED
+                        and not fits(ranges.get(id(node)))
+                    )
+                elif native and fits(ranges.get(id(node))):
+                    node.type = INT64
+                else:
+                    node.type = BIGINT
+                    # pcpp::BigInt already rounds // and % like Python
+                    node.floored = False
+                    if native:
+                        node.left = to_big(node.left)
+            elif isinstance(getattr(node, "type", None), ArrayType) and isinstance(
+                node, (BinaryOperatorNode, TrueDivisionNode)
+            ):
+                node.left = to_native(node.left)
+                node.right = to_native(node.right)
+                node.type = lowered(node.type)
+            elif isinstance(node, TrueDivisionNode):
+                if node.left.type is BIGINT:
+                    node.left = CastNode(node.left, DOUBLE)
+                if node.right.type is BIGINT:
+                    node.right = CastNode(node.right, DOUBLE)
+            elif isinstance(node, BinaryOperatorNode) and DOUBLE in (
+                node.left.type,
+                node.right.type,
+            ):
+                # Python mixes ints and floats as floats
+                if node.left.type is BIGINT:
+                    node.left = CastNode(node.left, DOUBLE)
+                if node.right.type is BIGINT:
+                    node.right = CastNode(node.right, DOUBLE)
+            elif isinstance(node, IfExpressionNode) and node.type is INT:
+                branches = (node.true_branch.type, node.false_branch.type)
+                node.type = BIGINT if BIGINT in branches else INT64
+            elif isinstance(node, FunctionCallNode):
+                if node.name in functions:
+                    callee = functions[node.name]
+                    node.type = callee.return_type
+                    node.args = [
+                        to_native(value)
+                        if arg.type is INT64
+                        else to_big(value)
+                        if arg.type is BIGINT
+                        else value
+                        for arg, value in zip(callee.args, node.args)
+                    ]
+                elif node.name in RANGES:
+                    node.args = [to_native(arg) for arg in node.args]
+                else:
+                    node.type = lowered(node.type)
+            elif isinstance(node, ListElementNode):
+                node.index = to_native(node.index)
+                node.type = lowered(node.type)
+            elif isinstance(node, LenNode):
+                node.type = INT64
+            elif isinstance(node, ReductionNode):
+                node.infer()
+            elif isinstance(node, DeclarationNode):
+                if node.name.type is INT64:
+                    node.value = to_native(node.value)
+                node.type = node.name.type
+            elif isinstance(node, AssignmentNode):
+                if node.name.type is INT64:
+                    node.value = to_native(node.value)
+                node.type = node.name.type
+            elif isinstance(node, ReturnNode) and function is not None:
+                if function.name == "main" or function.return_type is INT64:
+                    node.value = to_native(node.value)
+            elif isinstance(node, ForNode):
+                node.set_item_type(lowered(element_type(node.iterable)))
+            elif isinstance(node, CountedForNode):
+                node.index_type = storage(node).cpp()
+                if storage(node) is INT64:
+                    node.start = to_native(node.start)
+                    node.stop = to_native(node.stop)
+            elif isinstance(node, ListNode):
+                node.type = lowered(node.type)
+                node.element_type = lowered(node.element_type)
+            elif getattr(node, "type", None) is not None:
+                node.type = lowered(node.type)
+            if getattr(node, "checked", False):
+                include_flags["pcpp"] = True
+
+
+# OpenMP reduction operators for `s = s op value`; partial sums of
+# subtractions are combined by adding them
+REDUCTIONS = {"+": "+", "-": "+", "*": "*"}
+
+
+def reduction_operator(assignment):
+    """
+    Return the OpenMP reduction operator if assignment is `s = s op value`,
+    or `s = value op s` for a commutative op, else None.
+    """
+    name = assignment.name.name
+    value = assignment.value
+    if not isinstance(value, BinaryOperatorNode) or value.operator not in REDUCTIONS:
+        return None
+    operands = [value.left, value.right]
+    if value.operator != "-":
+        operands.append(value.left)
+    for accumulator, rest in zip(operands, operands[1:]):
+        if isinstance(accumulator, VariableNode) and accumulator.name == name:
+            if name not in read_names(rest):
+                return REDUCTIONS[value.operator]
+    return None
+
+
+def breaks_out(block):
+    """
+    Whether a break in block leaves the loop whose body it is, rather than a
+    loop nested in it.
+    """
+    stack = [block]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, BreakNode):
+            return True
+        if not isinstance(node, (WhileNode, ForNode, CountedForNode)):
+            stack.extend(node.children())
+    return False
+
+
+def raises(node):
+    """
+    Whether node may raise an exception: a checked index or int operation,
+    or an elementwise operation between arrays whose sizes may differ.
+    """
+    if getattr(node, "checked", False):
+        return True
+    if isinstance(node, ReductionNode):
+        operands = node.args
+    elif isinstance(node, (BinaryOperatorNode, TrueDivisionNode)):
+        operands = [node.left, node.right]
+    else:
+        return False
+    return sum(isinstance(operand.type, ArrayType) for operand in operands) > 1
+
+
+def parallel_reductions(loop, unsafe):
+    """
+    Return {name: operator} for the accumulators of the prange() loop, or
+    raise if an iteration may depend on another one, or may raise an
+    exception, which cannot leave an OpenMP region. unsafe maps the functions
+    that cannot be called from the loop to the reason why.
+
+    Variables declared in the body are private to each iteration, and outer
+    variables the body only reads are shared. An outer variable the body
+    assigns must be an accumulator: only ever updated by `s = s op value`
+    with the same reduction operator, and read nowhere else. An outer list
+    may be written by element only at the loop index plus a fixed offset,
+    and read at that same index only, so each iteration owns its elements.
+    """
+
+    def refuse(reason):
+        raise Exception(f"Cannot parallelize loop over {loop.item_name}: {reason}")
+
+    body = loop.body
+    local = {loop.item_name}
+    for node in walk(body):
+        if isinstance(node, DeclarationNode) and isinstance(node.name, VariableNode):
+            local.add(node.name.name)
+        elif isinstance(node, (ForNode, CountedForNode)):
+            local.add(node.item_name)
+        elif isinstance(node, ComprehensionNode):
+            local.add(node.name)
+    if breaks_out(body):
+        refuse("break leaves it early")
+
+    reductions = {}
+    updates = {}
+    written = {}
+    for node in walk(body):
+        if isinstance(node, ReturnNode):
+            refuse("return leaves it early")
+        elif isinstance(node, FunctionCallNode) and node.name in unsafe:
+            refuse(f"{node.name}() {unsafe[node.name]}")
+        elif raises(node):
+            refuse("it may raise an exception, which cannot leave the parallel loop")
+        elif isinstance(node, AppendNode) and node.target.name not in local:
+            refuse(f"every iteration appends to {node.target.name}")
+        elif not isinstance(node, AssignmentNode):
+            continue
+        elif isinstance(node.name, VariableNode) and node.name.name not in local:
+            name = node.name.name
+            operator = reduction_operator(node)
+            if operator is None or reductions.setdefault(name, operator) != operator:
+                refuse(f"{name} carries over from one iteration to the next")
+            if node.type not in (INT, INT64, DOUBLE):
+                refuse(f"{name} is not a native int or float")
+            if node.value.checked:
+                # OpenMP combines the partial results without overflow checks
+                refuse(f"{name} is updated with overflow checks")
+            updates[name] = updates.get(name, 0) + 1
+        elif isinstance(node.name, ListElementNode) and node.name.array not in local:
+            name = node.name.array
+            offset = index_offset(node.name.index)
+            if offset is None or offset[0] != loop.item_name:
+                refuse(f"other iterations may write the same element of {name}")
+            if node.name.type is BOOL:
+                refuse(f"the elements of {name} share bytes")
+            written[name] = offset
+
+    sized = {id(node.sequence) for node in walk(body) if isinstance(node, LenNode)}
+    reads = {}
+    for node in walk(body):
+        if isinstance(node, VariableNode) and id(node) not in sized:
+            reads[node.name] = reads.get(node.name, 0) + 1
+        elif isinstance(node, ListElementNode) and node.array in written:
+            if index_offset(node.index) != written[node.array]:
+                refuse(f"{node.array} is read at an element other iterations write")
+    for name, count in updates.items():
+        # each update reads the accumulator once and assigns it once
+        if reads[name] != 2 * count:
+            refuse(f"{name} is read before the loop has finished updating it")
+    for name in written:
+        if name in reads:
+            refuse(f"{name} is used as a whole while its elements are written")
+    if set(reductions) & read_names(loop.stop):
+        refuse("its stop bound changes in the body")
+    return reductions
+
+
+def parallel_loops(tree):
+    """
+    Check every prange() loop, and find the reductions its OpenMP parallel
+    for needs (see parallel_reductions()). A prange() that could not become
+    a counted loop is refused rather than run serially.
+    """
+    functions = {
+        node.name: node for node in walk(tree) if isinstance(node, FunctionNode)
+    }
+    calls = {
+        name: {
+            node.name
+            for node in walk(function.body)
+            if isinstance(node, FunctionCallNode) and node.name in functions
+        }
+        for name, function in functions.items()
+    }
+    # why a call to each function is unsafe in a parallel loop, if it is,
+    # directly or through the functions it calls
+    unsafe = {}
+    for name, function in functions.items():
+        if function.memoized:
+            unsafe[name] = "uses a shared memo table"
+        elif any(raises(node) for node in walk(function.body)):
+            unsafe[name] = "may raise an exception"
+    changed = True
+    while changed:
+        changed = False
+        for name in functions:
+            callee = next((callee for callee in calls[name] if callee in unsafe), None)
+            if name not in unsafe and callee is not None:
+                unsafe[name] = unsafe[callee]
+                changed = True
+    for node in walk(tree):
+        if isinstance(node, CountedForNode) and node.parallel:
+            node.reductions = parallel_reductions(node, unsafe)
+        elif isinstance(node, ForNode) and isinstance(node.iterable, FunctionCallNode):
+            if node.iterable.name == "prange":
+                raise Exception(
+                    f"Cannot parallelize loop over {node.item_name}: prange() needs"
+                    f" a constant step and a loop variable the body does not assign"
+                )
+        elif isinstance(node, FunctionCallNode) and node.name == "prange":
+            raise Exception("prange() can only be iterated by a for loop")
+
+
+def verify(tree):
+    """
+    Check the invariants every pass keeps, and raise if one is broken: each
+    node is reachable only once, so that rewriting one place never changes
+    another, typed nodes have a type, and comparisons are bools.
+    """
+    seen = set()
+    for node in walk(tree):
+        if id(node) in seen:
+            raise Exception(f"Shared {type(node).__name__}: {node.evaluate()}")
+        seen.add(id(node))
+        slots = [getattr(cls, "__slots__", ()) for cls in type(node).__mro__]
+        if any("type" in names for names in slots) and not isinstance(
+            getattr(node, "type", None), Type
+        ):
+            raise Exception(f"Untyped {type(node).__name__}: {node.evaluate()}")
+        if (
+            isinstance(node, BinaryOperatorNode)
+            and node.operator in BinaryOperatorNode.COMPARISONS
+            and node.type is not BOOL
+        ):
+            raise Exception(f"Comparison of type {node.type}: {node.evaluate()}")
+
+
+class PassManager:
+    """
+    Runs passes over a parsed tree in the order they were added, recording
+    the wall time of each and the number of nodes it leaves. With verify,
+    the tree is checked with verify() after every pass.
+
+    A pass is called as run(tree, context); context is a dict shared by the
+    passes, holding the include flags, the int model and any results passes
+    hand on to later ones.
+    """
+
+    def __init__(self, verify=False):
+        self.passes = []
+        self.verify = verify
+        # (name, seconds, nodes) for each pass run
+        self.timings = []
+        # the context of the last run, with the results the passes left in it
+        self.context = None
+
+    def add(self, name, run):
+        self.passes.append((name, run))
+
+    def run(self, tree, context):
+        self.context = context
+        for name, run in self.passes:
+            start = time.perf_counter()
+            run(tree, context)
+            elapsed = time.perf_counter() - start
+            self.timings.append((name, elapsed, sum(1 for _ in walk(tree))))
+            if self.verify:
+                try:
+                    verify(tree)
+                except Exception as error:
+                    raise Exception(f"After {name}: {error}") from error
+
+    def summary(self):
+        return "\n".join(
+            f"{name}: {seconds * 1000:.2f}ms ({nodes} nodes)"
+            for name, seconds, nodes in self.timings
+        )
+
+
+def default_passes(verify=False):
+    """
+    Return a PassManager with the passes analyze() runs.
+    """
+    manager = PassManager(verify)
+    manager.add("fold_constants", lambda tree, context: fold_constants(tree))
+    manager.add(
+        "eliminate_dead_code",
+        lambda tree, context: eliminate_dead_code(tree, context["include_flags"]),
+    )
+    manager.add(
+        "infer_types",
+        lambda tree, context: infer_types(tree, context["include_flags"]),
+    )
+    manager.add(
+        "recursion_to_loops",
+        lambda tree, context: context.update(
+            loops=recursion_to_loops(tree, context["int_model"])
+        ),
+    )
+    manager.add(
+        "promote_char_arguments", lambda tree, context: promote_char_arguments(tree)
+    )
+    manager.add(
+        "eliminate_common_subexpressions",
+        lambda tree, context: eliminate_common_subexpressions(tree),
+    )
+    manager.add(
+        "hoist_loop_invariants",
+        lambda tree, context: hoist_loop_invariants(tree, context["int_model"]),
+    )
+    manager.add("reserve_appends", lambda tree, context: reserve_appends(tree))
+    manager.add(
+        "value_ranges",
+        lambda tree, context: context.update(ranges=value_ranges(tree)),
+    )
+    manager.add(
+        "eliminate_bounds_checks",
+        lambda tree, context: context.update(
+            bounds_checks=eliminate_bounds_checks(
+                tree, context["bounds"], context["ranges"], context["include_flags"]
+            )
+        ),
+    )
+    manager.add(
+        "floor_divisions",
+        lambda tree, context: floor_divisions(
+            tree, context["ranges"], context["include_flags"]
+        ),
+    )
+    manager.add(
+        "lower_ints",
+        lambda tree, context: lower_ints(
+            tree, context["int_model"], context["include_flags"], context["ranges"]
+        ),
+    )
+    manager.add("parallel_loops", lambda tree, context: parallel_loops(tree))
+    manager.add(
+        "analyze_parameters",
+        lambda tree, context: analyze_parameters(tree, context["include_flags"]),
+    )
+    manager.add(
+        "constant_lists",
+        lambda tree, context: constant_lists(tree, context["include_flags"]),
+    )
+    return manager
+
+
+def analyze(tree, include_flags, int_model="int32", verify=False, bounds="unchecked"):
+    """
+    Run the analyses that decide how the parsed tree is emitted, and return
+    the PassManager that ran them, with its timings.
+    """
+    manager = default_passes(verify)
+    manager.run(
+        tree, {"include_flags": include_flags, "int_model": int_model, "bounds": bounds}
+    )
+    return manager
 
 
 def evaluate_include_flags(include_flags):
@@ -841,23 +4419,101 @@ def evaluate_include_flags(include_flags):
         if include_flags[flag]:
             if flag == "pcpp":
                 includes += '#include "pcpp.h"\n'
+            elif flag.startswith("pcpp_"):
+                includes += f"#define {flag.upper()}\n"
             else:
                 includes += f"#include <{flag}>\n"
     return includes
 
 
-def transpile_code(code, use_template):
-    unoffsided = unoffside(code)
-    tokens = tokenize(unoffsided)
-    include_flags, parsed = parse(tokens)
-    inclusion_value = evaluate_include_flags(include_flags)
-    value = parsed.evaluate()
+def transpile(
+    code, sink, use_template, int_model="int32", verify=False, bounds="unchecked"
+):
+    """
+    Transpile code, given either as a string or as an iterable of lines such
+    as an open file, and write the C++ output to sink (see write()).
+    int_model is one of INT_MODELS (see lower_ints()); verify checks the tree
+    between passes (see PassManager); bounds is one of BOUNDS, and under
+    checked the output starts with a comment counting the checks kept (see
+    eliminate_bounds_checks()). A comment also names the functions turned
+    into loops (see recursion_to_loops()).
+    """
+    lines = io.StringIO(code) if isinstance(code, str) else code
+    include_flags, parsed = parse(lex(lines))
+    manager = analyze(parsed, include_flags, int_model, verify, bounds)
+    out = sink.append if isinstance(sink, list) else sink.write
+    report = manager.context["bounds_checks"]
+    if report is not None:
+        out(f"// pcpp: {report[0]} of {report[1]} bounds checks kept\n")
+    loops = manager.context["loops"]
+    if loops:
+        out(f"// pcpp: recursion turned into loops in {', '.join(loops)}\n")
+    out(evaluate_include_flags(include_flags))
     if use_template:
-        return inclusion_value + TEMPLATE.replace("{{STATEMENTS}}", value)
+        prefix, suffix = TEMPLATE.split("{{STATEMENTS}}")
+        out(prefix)
+        write(parsed, sink)
+        out(suffix)
     else:
-        return inclusion_value + value
+        write(parsed, sink)
+
 
+def transpile_code(
+    code, use_template, cache=None, int_model="int32", verify=False, bounds="unchecked"
+):
+    """
+    Transpile code to a C++ string.
 
-def main(code, output_file, use_template):
+    If cache (a pcpp.cache.TranspileCache) is given, a previous result for
+    the same source and options is returned without transpiling again.
+    """
+    if cache is not None:
+        if not isinstance(code, str):
+            code = "".join(code)
+        key = cache.key(
+            code, use_template=use_template, int_model=int_model, bounds=bounds
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    buffer = []
+    transpile(code, buffer, use_template, int_model, verify, bounds)
+    result = "".join(buffer)
+
+    if cache is not None:
+        cache.put(key, result)
+    return result
+
+
+def write_if_changed(output_file, text):
+    """
+    Write text to output_file unless it already holds exactly that text, so
+    an unchanged output keeps its mtime and does not trigger a rebuild.
+    """
+    try:
+        with open(output_file, "r") as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(output_file, "w") as f:
+        f.write(text)
+    return True
+
+
+def main(
+    code,
+    output_file,
+    use_template,
+    cache=None,
+    int_model="int32",
+    verify=False,
+    bounds="unchecked",
+):
+    if cache is not None:
+        text = transpile_code(code, use_template, cache, int_model, verify, bounds)
+        write_if_changed(output_file, text)
+        return
     with open(output_file, "w") as f:
-        f.write(transpile_code(code, use_template))
+        transpile(code, f, use_template, int_model, verify, bounds)
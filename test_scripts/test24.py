@@ -0,0 +1,18 @@
+def total(a: list[int]):
+    s = 0
+    for x in a:
+        s = s + x
+    return s
+
+
+def first_changed(a: list[int], value: int):
+    a[0] = value
+    return a[0]
+
+
+def main():
+    a = [1, 2, 3]
+    b = [9]
+    if total(a) == 6:
+        return first_changed(b, 40) + a[1]
+    return 0
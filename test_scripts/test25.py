@@ -0,0 +1,15 @@
+def count_down(n: int):
+    s = 0
+    for i in range(n, 0, -1):
+        s = s + i
+    return s
+
+
+def main():
+    n = 5
+    s = 0
+    for i in range(1, n + 1):
+        s = s + i
+    for i in range(0, 10, 3):
+        s = s + i
+    return s + count_down(n) - 6
@@ -0,0 +1,22 @@
+def count(s: str, c: str):
+    n = 0
+    for ch in s:
+        if ch == c:
+            n = n + 1
+    return n
+
+
+def main():
+    s = "hello, world"
+    t = s[0] + s[1]
+    u: str = s[4]
+    u = s[5]
+    n = 0
+    for i in range(0, 12):
+        if s[i] == "o":
+            n = n + 1
+        if s[i] == "'":
+            n = n + 100
+    if s[0] < s[1]:
+        n = n + 1
+    return n + count(s, s[2]) + count(t + u, "e") + 36
@@ -0,0 +1,9 @@
+def mixed(a: int, b: int):
+    return a // b * 10 + a % b
+
+
+def main():
+    s = mixed(-7, 2) + mixed(7, -2) + mixed(-7, -2) + mixed(7, 2)
+    for i in range(-5, 5):
+        s = s + i // 2 + i % 3
+    return s + 57
@@ -0,0 +1,25 @@
+from functools import cache, lru_cache
+
+
+@cache
+def fib(n: int):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+
+@lru_cache(maxsize=32)
+def binomial(n: int, k: int):
+    if k == 0:
+        return 1
+    if k == n:
+        return 1
+    return (binomial(n - 1, k - 1) + binomial(n - 1, k)) % 1000003
+
+
+def main():
+    if fib(45) != 1134903170:
+        return 1
+    if binomial(60, 30) != 118264581564861424 % 1000003:
+        return 2
+    return 42
@@ -0,0 +1,34 @@
+def gcd(a: int, b: int):
+    if b == 0:
+        return a
+    return gcd(b, a % b)
+
+
+def digit_sum(n: int):
+    if n < 10:
+        return n
+    return n % 10 + digit_sum(n // 10)
+
+
+def factorial(n: int):
+    if n <= 1:
+        return 1
+    return n * factorial(n - 1)
+
+
+def repeat(s: str, n: int, acc: str):
+    if n == 0:
+        return acc
+    return repeat(s, n - 1, acc + s)
+
+
+def main():
+    if gcd(1071, 462) != 21:
+        return 1
+    if digit_sum(987654321) != 45:
+        return 2
+    if factorial(10) != 3628800:
+        return 3
+    if repeat("ab", 3, "") != "ababab":
+        return 4
+    return 42
@@ -0,0 +1,32 @@
+def squares(n: int):
+    result: list[int] = []
+    for i in range(n):
+        result.append(i * i)
+    return result
+
+
+def evens(xs: list[int]):
+    return [x for x in xs if x % 2 == 0]
+
+
+def main():
+    a = squares(10)
+    b = [x * 2 for x in a]
+    c = [[j for j in range(i)] for i in range(1, 4)]
+    d = evens(b)
+    names: list[str] = []
+    for ch in "abc":
+        names.append(ch)
+        names.append("-")
+    e = [k for k in range(10, 0, -3)]
+    total = 0
+    for x in d:
+        total = total + x
+    for row in c:
+        for v in row:
+            total = total + v
+    for k in e:
+        total = total + k
+    if names[5] != "-":
+        return 1
+    return total - 596 + 42
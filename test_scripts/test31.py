@@ -0,0 +1,31 @@
+def score(c: int):
+    table = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3]
+    return table[c % 10]
+
+
+def weights(n: int):
+    w = [0.5, 1.5, -2.0]
+    total = 0.0
+    for x in w:
+        total = total + x * n
+    return total
+
+
+def first(xs: list[int]):
+    return xs[0]
+
+
+def main():
+    passed = [7, 8]
+    changed = [1, 2]
+    changed[0] = 5
+    grown = [1]
+    grown.append(2)
+    doubled = [v * 2 for v in [1, 2, 3]]
+    total = 0
+    for i in range(100):
+        total = total + score(i)
+    if weights(2) != 0.0:
+        return 1
+    total = total + first(passed) + changed[0] + grown[1] + doubled[2]
+    return total - 410 + 42
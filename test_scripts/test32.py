@@ -0,0 +1,30 @@
+def rises(a: list[int]):
+    count = 0
+    for i in range(1, len(a)):
+        if a[i] > a[i - 1]:
+            count = count + 1
+    return count
+
+
+def last_even(a: list[int]):
+    for i in range(len(a) - 1, -1, -1):
+        if a[i] % 2 == 0:
+            return a[i]
+    return -1
+
+
+def vowels(s: str):
+    count = 0
+    i = 0
+    while i < len(s):
+        if s[i] == "a":
+            count = count + 1
+        i = i + 1
+    return count
+
+
+def main():
+    a = [3, 1, 4, 1, 5, 9, 2, 6]
+    if len(a) != 8:
+        return 1
+    return rises(a) * 10 + last_even(a) + vowels("banana") + a[7] - 13
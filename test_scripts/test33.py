@@ -0,0 +1,20 @@
+def scaled(x: array[float], k: float):
+    return x * k - x / 2
+
+
+def main():
+    a: array[float] = [1.0, 2.0, 3.0, 4.0]
+    n: array[int] = [i * 3 for i in range(4)]
+    b = scaled(a, 1.5)
+    b = b + n
+    halves = -n // 2
+    if sum(halves) != -10:
+        return 1
+    if dot(a, b) != 90.0:
+        return 2
+    total = 0.0
+    for v in b:
+        total = total + v
+    if total != sum(b):
+        return 3
+    return len(b) * 10 + 2
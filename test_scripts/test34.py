@@ -0,0 +1,20 @@
+def norm(a: list[float]):
+    total = 0.0
+    for i in prange(len(a)):
+        total = total + a[i] * a[i]
+    return total
+
+
+def main():
+    a = [0.0 for i in range(100)]
+    count = 0
+    for i in prange(len(a)):
+        a[i] = i / 4
+        if i % 3 == 0:
+            count = count + 1
+    squares = [0 for i in range(10)]
+    for i in prange(10):
+        squares[i] = i * i
+    if norm(a) != 20521.875:
+        return 1
+    return count + squares[3] - 1
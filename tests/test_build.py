@@ -0,0 +1,178 @@
+import os
+import subprocess
+
+import pytest
+
+from pcpp import build
+from pcpp.__main__ import main
+
+CODE = "def main():\n    return 42\n"
+
+
+def test_build_reuses_cached_objects(tmp_path):
+    (tmp_path / "a.py").write_text(CODE)
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+
+    first = build.build(targets, cache_dir=tmp_path / "objects")
+    second = build.build(targets, cache_dir=tmp_path / "objects")
+
+    assert first.failures == second.failures == []
+    assert not first.programs[0].cached
+    assert second.programs[0].cached
+    assert list(second.timings) == ["transpile", "compile", "link"]
+    assert subprocess.run([str(tmp_path / "out" / "a")]).returncode == 42
+
+
+def test_build_reports_compile_errors(tmp_path):
+    (tmp_path / "a.py").write_text("def main():\n    return b\n")
+    (tmp_path / "b.py").write_text(CODE)
+    targets = [(tmp_path / f"{name}.py", tmp_path / "out" / name) for name in "ab"]
+
+    report = build.build(targets, cache_dir=tmp_path / "objects")
+
+    assert [program.source.name for program in report.failures] == ["a.py"]
+    assert (tmp_path / "out" / "b").exists()
+
+
+def test_build_with_precompiled_header(tmp_path):
+    (tmp_path / "a.py").write_text(
+        'def main():\n    a = "x"\n    if a == "x":\n        return 42\n    return 1\n'
+    )
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+
+    report = build.build(targets, cache_dir=tmp_path / "objects", pch=True)
+
+    assert report.failures == []
+    assert "pch" in report.timings
+    assert list((tmp_path / "objects" / "pch").glob("*/pcpp_pch.h.*ch"))
+    assert subprocess.run([str(tmp_path / "out" / "a")]).returncode == 42
+
+
+def test_build_command(tmp_path, capsys):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.py").write_text(CODE)
+
+    status = main(
+        [
+            "build",
+            str(tmp_path / "src"),
+            "-d",
+            str(tmp_path / "out"),
+            "--object-cache",
+            str(tmp_path / "objects"),
+        ]
+    )
+
+    assert status == 0
+    assert "compile: " in capsys.readouterr().err
+    assert subprocess.run([str(tmp_path / "out" / "a")]).returncode == 42
+
+
+@pytest.mark.parametrize("int_model, returncode", [("bigint", 42), ("checked", -6)])
+def test_build_int_models(tmp_path, int_model, returncode):
+    (tmp_path / "a.py").write_text(
+        "def main():\n    x = 1\n    for i in range(70):\n        x = x * 2\n"
+        "    return x // 1180591620717411303424 * 42\n"
+    )
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+
+    report = build.build(targets, cache_dir=tmp_path / "objects", int_model=int_model)
+
+    assert report.failures == []
+    result = subprocess.run([str(tmp_path / "out" / "a")], capture_output=True)
+    assert result.returncode == returncode
+
+
+def test_build_stop_bound_does_not_shadow(tmp_path):
+    code = (
+        "def f(n: int):\n    i_stop = 7\n    s = 0\n"
+        "    for i in range(n * 2):\n        s = s + i_stop\n    return s\n"
+        "def main():\n    return f(3)\n"
+    )
+    (tmp_path / "a.py").write_text(code)
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+    namespace = {}
+    exec(code, namespace)
+
+    report = build.build(targets, cache_dir=tmp_path / "objects")
+
+    assert report.failures == []
+    result = subprocess.run([str(tmp_path / "out" / "a")])
+    assert result.returncode == namespace["main"]() == 42
+
+
+@pytest.mark.parametrize("index, returncode", [("-1", 42), ("3", -6)])
+def test_build_bounds_checks(tmp_path, index, returncode):
+    (tmp_path / "a.py").write_text(
+        f"def main():\n    a = [1, 2, 42]\n    i = {index}\n    return a[i]\n"
+    )
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+
+    report = build.build(targets, cache_dir=tmp_path / "objects", bounds="checked")
+
+    assert report.failures == []
+    result = subprocess.run([str(tmp_path / "out" / "a")], capture_output=True)
+    assert result.returncode == returncode
+
+
+@pytest.mark.parametrize("pch", [False, True])
+def test_build_parallel_loops(tmp_path, pch):
+    (tmp_path / "a.py").write_text(
+        "def main():\n    a = [0 for i in range(1000)]\n    s = 0\n"
+        "    for i in prange(len(a)):\n        a[i] = i % 7\n        s = s + a[i]\n"
+        "    return s - a[999] - 2950\n"
+    )
+    (tmp_path / "b.py").write_text("def main():\n    return len([1, 2]) + 40\n")
+    targets = [
+        (tmp_path / "a.py", tmp_path / "out" / "a"),
+        (tmp_path / "b.py", tmp_path / "out" / "b"),
+    ]
+    # the pragma only compiles if the build adds -fopenmp, and a PCH built
+    # without it would not be used
+    toolchain = build.Toolchain(
+        cxxflags=["-O2", "-Werror=unknown-pragmas", "-Werror=invalid-pch"]
+    )
+
+    report = build.build(targets, toolchain, cache_dir=tmp_path / "objects", pch=pch)
+
+    assert report.failures == []
+    environment = {**os.environ, "OMP_NUM_THREADS": "3"}
+    result = subprocess.run([str(tmp_path / "out" / "a")], env=environment)
+    assert result.returncode == 42
+
+
+def test_build_memo_stats(tmp_path):
+    (tmp_path / "a.py").write_text(
+        "from functools import cache\n"
+        "@cache\ndef fib(n: int):\n"
+        "    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n"
+        "def main():\n    return fib(10) - 13\n"
+    )
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+    toolchain = build.Toolchain(cxxflags=["-O2", "-DPCPP_MEMO_STATS"])
+
+    report = build.build(targets, toolchain, cache_dir=tmp_path / "objects")
+
+    assert report.failures == []
+    result = subprocess.run(
+        [str(tmp_path / "out" / "a")], capture_output=True, text=True
+    )
+    assert result.returncode == 42
+    assert result.stderr == "fib: 8 hits, 11 misses\n"
+
+
+def test_build_deep_recursion_without_optimization(tmp_path):
+    (tmp_path / "a.py").write_text(
+        "def count(n: int, acc: int):\n    if n == 0:\n        return acc\n"
+        "    return count(n - 1, (acc + n) % 1000)\n"
+        "def total(n: int):\n    if n == 0:\n        return 0\n"
+        "    return n % 2 + total(n - 1)\n"
+        "def main():\n    return count(10000000, 0) + total(10000000) - 5000000 + 42\n"
+    )
+    targets = [(tmp_path / "a.py", tmp_path / "out" / "a")]
+    toolchain = build.Toolchain(cxxflags=["-O0"])
+
+    report = build.build(targets, toolchain, cache_dir=tmp_path / "objects")
+
+    assert report.failures == []
+    assert subprocess.run([str(tmp_path / "out" / "a")]).returncode == 42
@@ -0,0 +1,58 @@
+import os
+
+from pcpp import cache as cache_module
+from pcpp import pcpp
+from pcpp.cache import TranspileCache
+
+CODE = "def main():\n    return 42\n"
+
+
+def test_cache_hit_and_miss(tmp_path):
+    cache = TranspileCache(tmp_path)
+    first = pcpp.transpile_code(CODE, False, cache)
+    second = pcpp.transpile_code(CODE, False, cache)
+    assert first == second == pcpp.transpile_code(CODE, False)
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_cache_key_depends_on_options(tmp_path):
+    cache = TranspileCache(tmp_path)
+    assert cache.key(CODE, use_template=True) != cache.key(CODE, use_template=False)
+    assert cache.key(CODE, use_template=True) == cache.key(CODE, use_template=True)
+
+
+def test_cache_key_depends_on_transpiler(tmp_path, monkeypatch):
+    source = tmp_path / "pcpp.py"
+    source.write_text("# one")
+    monkeypatch.setattr(cache_module, "SOURCES", [source])
+    before = TranspileCache(tmp_path).key(CODE, use_template=False)
+    source.write_text("# two")
+    assert TranspileCache(tmp_path).key(CODE, use_template=False) != before
+
+
+def test_cache_accepts_lines(tmp_path):
+    cache = TranspileCache(tmp_path)
+    pcpp.transpile_code(CODE, False, cache)
+    pcpp.transpile_code(iter(CODE.splitlines(True)), False, cache)
+    assert cache.hits == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = TranspileCache(tmp_path, max_bytes=250)
+    cache.put("a" * 64, "a" * 100)
+    cache.put("b" * 64, "b" * 100)
+    os.utime(cache._path("a" * 64), (0, 0))
+    cache.put("c" * 64, "c" * 100)
+    assert cache.get("a" * 64) is None
+    assert cache.get("b" * 64) == "b" * 100
+    assert cache.get("c" * 64) == "c" * 100
+
+
+def test_main_keeps_unchanged_output(tmp_path):
+    cache = TranspileCache(tmp_path / "cache")
+    output = tmp_path / "out.cpp"
+    pcpp.main(CODE, output, False, cache)
+    os.utime(output, (0, 0))
+    pcpp.main(CODE, output, False, cache)
+    assert output.stat().st_mtime == 0
+    assert output.read_text() == pcpp.transpile_code(CODE, False)
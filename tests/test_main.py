@@ -0,0 +1,84 @@
+from pcpp import pcpp
+from pcpp.__main__ import main
+from pcpp.build import collect_sources
+
+CODE = "def main():\n    return 42\n"
+
+
+def make_tree(root):
+    (root / "pkg" / "sub").mkdir(parents=True)
+    (root / "pkg" / "a.py").write_text(CODE)
+    (root / "pkg" / "sub" / "b.py").write_text(CODE)
+    (root / "pkg" / "notes.txt").write_text("")
+
+
+def test_collect_sources_directory(tmp_path):
+    make_tree(tmp_path)
+    sources, missing = collect_sources([str(tmp_path / "pkg")])
+    assert [str(relative) for _, relative in sources] == ["a.py", "sub/b.py"]
+    assert missing == []
+
+
+def test_collect_sources_glob(tmp_path):
+    make_tree(tmp_path)
+    sources, missing = collect_sources([str(tmp_path / "pkg" / "**" / "*.py")])
+    assert [str(relative) for _, relative in sources] == ["a.py", "sub/b.py"]
+    assert missing == []
+
+
+def test_collect_sources_missing(tmp_path):
+    assert collect_sources([str(tmp_path / "nothing.py")]) == (
+        [],
+        [str(tmp_path / "nothing.py")],
+    )
+
+
+def test_batch_mirrors_tree(tmp_path):
+    make_tree(tmp_path)
+    out = tmp_path / "out"
+    assert main([str(tmp_path / "pkg"), "-d", str(out), "-j", "2"]) == 0
+    assert (out / "a.cpp").read_text() == pcpp.transpile_code(CODE, False)
+    assert (out / "sub" / "b.cpp").read_text() == pcpp.transpile_code(CODE, False)
+    assert (out / "pcpp.h").exists()
+    assert (out / "sub" / "pcpp.h").exists()
+
+
+def test_batch_reports_failures(tmp_path, capsys):
+    make_tree(tmp_path)
+    (tmp_path / "pkg" / "bad.py").write_text("def main(:\n")
+    out = tmp_path / "out"
+    assert main([str(tmp_path / "pkg"), "-d", str(out), "-j", "2"]) == 1
+    assert "bad.py" in capsys.readouterr().err
+    assert (out / "a.cpp").exists()
+    assert (out / "sub" / "b.cpp").exists()
+
+
+def test_single_output_file(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text(CODE)
+    assert main([str(source), "-o", str(tmp_path / "x" / "a.cpp")]) == 0
+    assert (tmp_path / "x" / "a.cpp").exists()
+    assert (tmp_path / "x" / "pcpp.h").exists()
+
+
+def test_int_model_option(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text("def main():\n    a = 1\n    return a\n")
+    assert main([str(source), "--int-model", "int64"]) == 0
+    assert "std::int64_t a = 1;" in (tmp_path / "a.cpp").read_text()
+
+
+def test_bounds_option(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text("def f(a: list[int], i: int):\n    return a[i]\n")
+    assert main([str(source), "--bounds", "checked"]) == 0
+    output = (tmp_path / "a.cpp").read_text()
+    assert output.startswith("// pcpp: 1 of 1 bounds checks kept\n")
+    assert "return pcpp::at(a, i);" in output
+
+
+def test_verify_option(tmp_path):
+    source = tmp_path / "a.py"
+    source.write_text(CODE)
+    assert main([str(source), "--verify"]) == 0
+    assert (tmp_path / "a.cpp").read_text() == pcpp.transpile_code(CODE, False)
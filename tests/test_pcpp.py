@@ -1,10 +1,11 @@
 import glob
-import shutil
+import io
 import subprocess
+import time
 
 import pytest
 
-from pcpp import __version__, pcpp
+from pcpp import __version__, build, pcpp
 
 Token = pcpp.Token
 
@@ -21,6 +22,52 @@ def test_unoffside_nested_indent():
     assert pcpp.unoffside("a\n b\n  c") == "a\n{b\n{c}}"
 
 
+def test_lex_indent():
+    assert list(pcpp.lex(["a", " b"])) == [
+        Token("name", "a"),
+        Token("\n", 0),
+        Token("INDENT", " "),
+        Token("name", "b"),
+        Token("DEDENT", " "),
+    ]
+
+
+def test_lex_dedent():
+    assert list(pcpp.lex(["a", " b", "c"])) == [
+        Token("name", "a"),
+        Token("\n", 0),
+        Token("INDENT", " "),
+        Token("name", "b"),
+        Token("\n", 0),
+        Token("DEDENT", " "),
+        Token("\n", 0),
+        Token("name", "c"),
+    ]
+
+
+def test_lex_skips_blank_lines():
+    assert list(pcpp.lex(["a\n", "   \n", "b\n"])) == [
+        Token("name", "a"),
+        Token("\n", 0),
+        Token("name", "b"),
+    ]
+
+
+def test_lex_is_lazy():
+    def lines():
+        yield "a = 1\n"
+        raise AssertionError("read past the first line")
+
+    assert next(pcpp.lex(lines())) == Token("name", "a")
+
+
+def test_transpile_code_from_lines():
+    code = ["def main():\n", "    return 42\n"]
+    assert pcpp.transpile_code(iter(code), False) == pcpp.transpile_code(
+        "".join(code), False
+    )
+
+
 def test_tokenize_1():
     assert pcpp.tokenize("1") == [Token("int", 1)]
 
@@ -174,6 +221,154 @@ def test_tokenize_newline():
     assert pcpp.tokenize("1\n 2") == [Token("int", 1), Token("\n", 1), Token("int", 2)]
 
 
+def test_tokenize_keyword_prefix_is_name():
+    assert pcpp.tokenize("index = 1") == [
+        Token("name", "index"),
+        Token("=", "="),
+        Token("int", 1),
+    ]
+
+
+def test_tokenize_keyword_suffix_is_name():
+    assert pcpp.tokenize("return_value") == [Token("name", "return_value")]
+
+
+def test_tokenize_string():
+    assert pcpp.tokenize('"a b"') == [Token("str", '"a b"')]
+
+
+def test_tokenize_float():
+    assert pcpp.tokenize("1.5") == [Token("float", 1.5)]
+
+
+def test_tokenize_invalid_number():
+    with pytest.raises(ValueError):
+        pcpp.tokenize("1.2.3")
+
+
+def test_token_stream_does_not_mutate_tokens():
+    tokens = pcpp.tokenize("a = 1")
+    stream = pcpp.TokenStream(tokens)
+    assert stream.peek() == Token("name", "a")
+    assert stream.advance() == Token("name", "a")
+    assert stream.expect("=", "Expected =") == Token("=", "=")
+    assert stream.peek(1) == pcpp.TokenStream.END
+    assert len(tokens) == 3
+
+
+def test_token_stream_expect_raises():
+    with pytest.raises(Exception):
+        pcpp.TokenStream(pcpp.tokenize("a")).expect("=", "Expected =")
+
+
+def test_parse_scales_linearly():
+    def time_per_token(line_count):
+        tokens = pcpp.tokenize("a = 1\n" * line_count)
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            pcpp.parse(tokens)
+            best = min(best, time.perf_counter() - start)
+        return best / len(tokens)
+
+    assert time_per_token(32000) < 4 * time_per_token(1000)
+
+
+def test_write_to_list_and_stream():
+    node = pcpp.BinaryOperatorNode("+", pcpp.IntNode(1), pcpp.IntNode(2))
+    buffer = []
+    pcpp.write(node, buffer)
+    stream = io.StringIO()
+    pcpp.write(node, stream)
+    assert "".join(buffer) == stream.getvalue() == node.evaluate() == "1 + 2"
+
+
+def test_transpile_long_expression_chain():
+    code = "def main():\n    a = 1\n    return " + " + ".join(["a"] * 5000) + "\n"
+    assert pcpp.transpile_code(code, False).endswith(" + a; }")
+
+
+def test_main_streams_to_file(tmp_path):
+    output = tmp_path / "out.cpp"
+    pcpp.main("def main():\n    return 42\n", output, False)
+    assert output.read_text() == "int main() { return 42; }"
+
+
+def test_types_are_interned():
+    assert pcpp.VectorType(pcpp.INT) is pcpp.VectorType(pcpp.IntType())
+    assert pcpp.VectorType(pcpp.INT) is not pcpp.VectorType(pcpp.DOUBLE)
+    assert pcpp.parse_type("list[int]") is pcpp.VectorType(pcpp.INT)
+
+
+def test_type_cpp_spelling():
+    assert pcpp.parse_type("list[list[str]]").cpp() == (
+        "std::vector<std::vector<std::string>>"
+    )
+
+
+def test_nodes_have_no_instance_dict():
+    assert not hasattr(pcpp.IntNode(1), "__dict__")
+
+
+def test_read_only_parameter_by_const_reference():
+    code = "def f(a, n: int):\n    return a[n]\n"
+    assert "auto f(const auto& a,int n)" in pcpp.transpile_code(code, False)
+
+
+def test_mutated_parameter_by_value():
+    code = "def f(a):\n    a = 1\n    return a\n"
+    assert "auto f(auto a)" in pcpp.transpile_code(code, False)
+
+
+def test_append_to_parameter_is_an_error():
+    code = (
+        "def fill(a: list[int], n: int):\n    for i in range(n):\n"
+        "        a.append(i)\n    return len(a)\n"
+        "def main():\n    b = [1, 2, 3]\n    return fill(b, 3) + len(b)\n"
+    )
+    with pytest.raises(Exception, match="Cannot append to parameter a of fill()"):
+        pcpp.transpile_code(code, False)
+
+
+def test_move_last_use_into_by_value_parameter():
+    code = (
+        "def f(a):\n    a[0] = 1\n    return a[0]\n"
+        "def main():\n    b = [1]\n    c = f(b)\n    return f(b)\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "int c = f(b);" in output
+    assert "return f(std::move(b));" in output
+    assert "#include <utility>" in output
+
+
+def test_no_move_inside_loop():
+    code = (
+        "def f(a):\n    a[0] = 1\n    return a[0]\n"
+        "def main():\n    b = [1]\n    while True:\n        return f(b)\n"
+    )
+    assert "std::move" not in pcpp.transpile_code(code, False)
+
+
+def test_for_binds_strings_by_const_reference():
+    code = "def f(a: list[str]):\n    for s in a:\n        print(s)\n"
+    assert "for (const std::string& s : a)" in pcpp.transpile_code(code, False)
+
+
+def test_for_binds_scalars_and_assigned_items_by_value():
+    code = (
+        "def f(a: list[str]):\n    for s in a:\n        s = s + s\n"
+        "def g():\n    for x in [1, 2]:\n        print(x)\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "for (std::string s : a)" in output
+    assert "for (int x : std::vector<int> {1,2})" in output
+
+
+def test_for_body_assigns_outer_variable():
+    code = "def f(a: list[int]):\n    s = 0\n    for x in a:\n        s = x\n"
+    assert "{ s = x; }" in pcpp.transpile_code(code, False)
+
+
 def test_evaluate_range_function():
     assert (
         pcpp.FunctionCallNode("range", [pcpp.IntNode("5")]).evaluate()
@@ -181,17 +376,765 @@ def test_evaluate_range_function():
     )
 
 
-@pytest.mark.parametrize("file_name", glob.glob("./test_scripts/*.py"))
-def test_script(file_name):
-    with open(file_name) as f:
-        with open("./.test/test.cpp", "w") as fw:
-            fw.write(pcpp.transpile_code(f.read(), False))
+def test_range_loop_with_runtime_bounds():
+    code = "def f(n: int):\n    for i in range(n):\n        print(i)\n"
+    output = pcpp.transpile_code(code, False)
+    assert "for (int i = 0; i < n; ++i)" in output
+    assert "pcpp.h" not in output
+
+
+def test_range_loop_with_negative_step():
+    code = "def f(n: int):\n    for i in range(n, -1, -2):\n        print(i)\n"
+    assert "for (int i = n; i > -1; i -= 2)" in pcpp.transpile_code(code, False)
+
+
+def test_range_loop_evaluates_stop_once():
+    code = "def f(a):\n    for i in range(0, g(a)):\n        print(i)\n"
+    output = pcpp.transpile_code(code, False)
+    assert "for (std::int64_t i = 0, _stop0 = g(a); i < _stop0; ++i)" in output
+    assert "#include <cstdint>" in output
+
+
+def test_range_loop_with_dynamic_step_falls_back():
+    code = "def f(n: int):\n    for i in range(0, 9, n):\n        print(i)\n"
+    output = pcpp.transpile_code(code, False)
+    assert "for (int i : pcpp::Range(0, 9, n))" in output
+    assert '#include "pcpp.h"' in output
+
+
+def test_range_zero_step():
+    with pytest.raises(Exception, match="must not be zero"):
+        pcpp.transpile_code("for i in range(0, 9, 0):\n    print(i)\n", False)
+
+
+def test_string_index_is_a_char():
+    code = 's = "abc"\nif s[1] == "b":\n    s = "d"\n'
+    assert "if (s[1] == 'b')" in pcpp.transpile_code(code, False)
+
+
+def test_char_promoted_in_string_context():
+    code = 's = "abc"\nt = s[0] + s[1]\nu = t + s[2]\n'
+    output = pcpp.transpile_code(code, False)
+    assert "std::string t = std::string(1, s[0]) + std::string(1, s[1]);" in output
+    assert "std::string u = t + std::string(1, s[2]);" in output
+
+
+def test_char_variable_assigned_a_string():
+    code = 's = "abc"\nc = s[0]\nd = c\nc = c + "x"\nd = c\n'
+    output = pcpp.transpile_code(code, False)
+    assert "std::string c = std::string(1, s[0]);" in output
+    assert "std::string d = c;" in output
+    assert 'c = c + std::string("x");' in output
+
+
+def test_char_returned_as_string():
+    code = (
+        "def f(s: str, k: int):\n    if k > 0:\n        return s[0]\n"
+        '    return "xy"\n'
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "std::string f(const std::string& s,int k)" in output
+    assert "{ return std::string(1, s[0]); }" in output
+
+
+def test_iterating_a_string_yields_chars():
+    code = "def f(s: str):\n    for c in s:\n        print(c)\n"
+    assert "for (char c : s)" in pcpp.transpile_code(code, False)
+
 
-        shutil.copyfile("./pcpp/pcpp.h", "./.test/pcpp.h")
+def test_char_literal_escaping():
+    assert pcpp.CharNode("'").evaluate() == "'\\''"
+    assert pcpp.as_char(pcpp.StringNode('"\\n"')).evaluate() == "'\\n'"
+    assert pcpp.as_char(pcpp.StringNode('"ab"')) is None
+
+
+def test_signature_inferred_from_call_sites():
+    code = (
+        "def twice(x):\n    return x * 2\n"
+        "def show(s):\n    print(s)\n"
+        'def main():\n    show("a")\n    return twice(3) + twice(4.0)\n'
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "double twice(double x)" in output
+    assert "void show(const std::string& s)" in output
+
+
+def test_uncalled_function_stays_generic():
+    code = "def f(a):\n    return a\n"
+    assert "auto f(const auto& a)" in pcpp.transpile_code(code, False)
+
+
+def test_polymorphic_parameter_is_an_error():
+    code = 'def f(a):\n    return a\ndef main():\n    f(1)\n    return f("a")\n'
+    with pytest.raises(Exception, match="Parameter a of f\\(\\) is polymorphic"):
+        pcpp.transpile_code(code, False)
+
+
+def test_fold_constants():
+    code = (
+        "def main():\n    a = 2 * 3 - -7 // 2 + (-7 % 3)\n    b = 1.5 * 2\n"
+        '    c = 1 < 2\n    d = "ab" + "cd"\n    e = (1 if 2 > 3 else 4)\n'
+        "    f = 7 // 0\n    return a\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "int a = 12;" in output
+    assert "double b = 3.0;" in output
+    assert "bool c = true;" in output
+    assert 'std::string d = std::string("abcd");' in output
+    assert "int e = 4;" in output
+    assert "int f = 7 / 0;" in output
+
+
+def test_fold_decided_branches():
+    code = (
+        "def main():\n    a = 1\n    if False:\n        a = 2\n"
+        "    elif a > 0:\n        a = 3\n    elif True:\n        a = 4\n"
+        "    else:\n        a = 5\n    if 1 == 1:\n        a = a + 6\n"
+        "    while 0:\n        a = 7\n    return a\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "if (a > 0) { a = 3; }else { a = 4; }\na = a + 6;\nreturn a; }" in output
+    assert "a = 2" not in output
+    assert "a = 5" not in output
+    assert "while" not in output
+
+
+def test_eliminate_dead_code():
+    code = (
+        "def unused():\n    return 1\ndef used(n: int):\n"
+        "    while n > 0:\n        n = n - 1\n        continue\n        n = 0\n"
+        "    return n\n    n = 2\n"
+        "def main():\n    return used(3)\n    unused()\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "unused" not in output
+    assert "n = 0" not in output
+    assert "n = 2" not in output
+    assert "return used(3); }" in output
+
+
+def test_fold_makes_range_loops_countable():
+    code = "def f(n: int):\n    for i in range(0, n, 1 + 1):\n        n = n + i\n"
+    output = pcpp.transpile_code(code, False)
+    assert "for (int i = 0, _stop0 = n; i < _stop0; i += 2)" in output
+    assert "pcpp" not in output
+
+
+def test_eliminate_common_subexpressions():
+    code = (
+        "def f(a: int, b: int, xs: list[int]):\n"
+        "    x = (a * b + 1) * (a * b + 1)\n    y = xs[a] + xs[a]\n"
+        "    a = a + 1\n    return x + y + a * b\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert (
+        "int _cse0 = a * b + 1;\nint x = _cse0 * _cse0;\n"
+        "int _cse1 = xs[a];\nint y = _cse1 + _cse1;\na = a + 1;\n"
+        "return x + y + a * b;"
+    ) in output
+
+
+def test_common_subexpressions_only_where_evaluated():
+    code = (
+        "def f(a: int, b: int):\n    if a > 0:\n        return a * b\n"
+        "    x = (a * b if b > 0 else 0)\n    return a * b\n"
+    )
+    assert "_cse" not in pcpp.transpile_code(code, False)
+
+
+def test_hoist_loop_invariants():
+    code = (
+        "def f(a: int, b: int, n: int):\n    t = 0\n    i = 0\n"
+        "    while i < n * b:\n        for j in range(n):\n"
+        "            t = t + j * (a + b) + a // b\n        i = i + 1\n    return t\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "int _inv1 = n * b;\nint _inv2 = a + b;\nwhile (i < _inv1)" in output
+    assert "int _inv0 = _inv2;\nfor (int j = 0; j < n; ++j)" in output
+    assert "t = t + j * _inv0 + pcpp::floordiv(a, b);" in output
+
+
+def test_no_int_hoisting_under_checked_model():
+    code = (
+        "def f(a: int, n: int):\n    while n > 0:\n        n = n - a * a\n"
+        "    return n\n"
+    )
+    assert "_inv" not in pcpp.transpile_code(code, False, int_model="checked")
+
+
+def test_pass_manager_records_passes():
+    code = "def main():\n    a = 1 + 2\n    return a * a + a * a\n"
+    include_flags, tree = pcpp.parse(pcpp.lex(io.StringIO(code)))
+    manager = pcpp.analyze(tree, include_flags, verify=True)
+    names = [name for name, _, _ in manager.timings]
+    assert names == [name for name, _ in pcpp.default_passes().passes]
+    assert names[:2] == ["fold_constants", "eliminate_dead_code"]
+    assert all(seconds >= 0 and nodes > 0 for _, seconds, nodes in manager.timings)
+    assert "eliminate_common_subexpressions: " in manager.summary()
+
+
+def test_verify_rejects_shared_nodes():
+    code = "def main():\n    a = 1\n    return a\n"
+    include_flags, tree = pcpp.parse(pcpp.lex(io.StringIO(code)))
+    manager = pcpp.PassManager(verify=True)
+
+    def share(tree, context):
+        declaration = tree.expressions[0].body.statements.expressions[0].statement
+        declaration.value = tree.expressions[0].body.statements.expressions[1].value
+
+    manager.add("share", share)
+    with pytest.raises(Exception, match="After share: Shared VariableNode: a"):
+        manager.run(tree, {})
+
+
+def test_comparison_is_bool():
+    code = "def less(a: int, b: int):\n    return a < b\n"
+    assert "bool less(int a,int b)" in pcpp.transpile_code(code, False)
+
+
+def test_value_ranges():
+    code = "def f(n: int):\n    for i in range(10):\n        j = i * 3 - 1\n        k = j + n\n"
+    tree = pcpp.parse(pcpp.lex(io.StringIO(code)))[1]
+    ranges = pcpp.value_ranges(tree)
+    declarations = {
+        node.name.name: ranges[id(node.name)]
+        for node in pcpp.walk(tree)
+        if isinstance(node, pcpp.DeclarationNode)
+    }
+    assert declarations == {"j": (-1, 26), "k": None}
+
+
+def test_floor_division_and_modulo():
+    code = (
+        "def f(a: int, b: int):\n    for i in range(b):\n"
+        "        a = a + i // 2 + i % b\n    return a // b + a % 3\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "a = a + i / 2 + pcpp::floormod(i, b);" in output
+    assert "return pcpp::floordiv(a, b) + pcpp::floormod(a, 3);" in output
+    assert '#include "pcpp.h"' in output
+
+
+def test_value_ranges_round_like_python():
+    code = (
+        "def f(n: int):\n    for i in range(-9, 10):\n"
+        "        j = i // -4\n        k = n % -4\n"
+    )
+    tree = pcpp.parse(pcpp.lex(io.StringIO(code)))[1]
+    ranges = pcpp.value_ranges(tree)
+    declarations = {
+        node.name.name: ranges[id(node.name)]
+        for node in pcpp.walk(tree)
+        if isinstance(node, pcpp.DeclarationNode)
+    }
+    assert declarations == {"j": (-3, 2), "k": (-3, 0)}
+
+
+def test_int64_model():
+    code = "def f(a: list[int], n: int):\n    return a[n] + 1\n"
+    output = pcpp.transpile_code(code, False, int_model="int64")
+    assert "std::int64_t f(const std::vector<std::int64_t>& a,std::int64_t n)" in output
+    assert "#include <cstdint>" in output
+
+
+def test_checked_model_checks_only_unbounded_arithmetic():
+    code = (
+        "def f(n: int):\n    s = 0\n    for i in range(100):\n"
+        "        s = s + i * i\n    while s > 0:\n        n = n * 3\n    return -n\n"
+    )
+    output = pcpp.transpile_code(code, False, int_model="checked")
+    assert "s = s + i * i;" in output
+    assert "n = pcpp::checked_mul(n, 3);" in output
+    assert "return pcpp::checked_neg(n);" in output
+
+
+def test_bigint_model_keeps_bounded_values_native():
+    code = (
+        "def total(n: int):\n    s = 0\n    for i in range(n):\n"
+        "        d = i % 7\n        s = s + d * 99999999999\n    return s\n"
+        "def main():\n    t = 1\n    while t < 1000:\n        t = t * total(100)\n"
+        "    return t\n"
+    )
+    output = pcpp.transpile_code(code, False, int_model="bigint")
+    assert "std::int64_t total(std::int64_t n) { std::int64_t s = 0;" in output
+    assert "for (std::int64_t i = 0; i < n; ++i)" in output
+    assert "std::int64_t d = i % 7;" in output
+    assert "pcpp::BigInt t = 1;" in output
+    assert "return static_cast<std::int64_t>(t);" in output
+
+
+def test_value_ranges_across_calls_and_accumulators():
+    code = (
+        "def f(n: int):\n    s = 1\n    for i in range(n):\n        s = s - i\n"
+        "    return s\n"
+        "def main():\n    return f(10) + f(20)\n"
+    )
+    tree = pcpp.parse(pcpp.lex(io.StringIO(code)))[1]
+    pcpp.infer_types(tree, {})
+    ranges = pcpp.value_ranges(tree)
+    s = next(node for node in pcpp.walk(tree) if isinstance(node, pcpp.DeclarationNode))
+    call = next(
+        node
+        for node in pcpp.walk(tree)
+        if isinstance(node, pcpp.ReturnNode)
+        and isinstance(node.value, pcpp.BinaryOperatorNode)
+    )
+    assert ranges[id(s.name)] == (1 - 19 * 20, 1)
+    assert ranges[id(call.value)] == (2 * (1 - 19 * 20), 2)
+
+
+def test_bigint_model_promotes_overflowing_arithmetic():
+    code = "def main():\n    a = 3000000000\n    b = a * a * a\n    return 0\n"
+    output = pcpp.transpile_code(code, False, int_model="bigint")
+    assert "pcpp::BigInt b = pcpp::BigInt(a * a) * a;" in output
+
+
+def test_bigint_model_converts_call_arguments():
+    code = (
+        "def f(n: int):\n    return n\n"
+        "def main():\n    i = 0\n    while i < 10:\n        i = i + f(5 + i % 2)\n"
+        "    return i\n"
+    )
+    output = pcpp.transpile_code(code, False, int_model="bigint")
+    assert "std::int64_t f(std::int64_t n)" in output
+    assert "f(static_cast<std::int64_t>(5 + i % 2))" in output
+
+
+def test_memoized_functions():
+    code = (
+        "from functools import cache, lru_cache\n"
+        "import functools\n"
+        "@cache\ndef fib(n: int):\n"
+        "    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n"
+        "@functools.lru_cache(maxsize=64)\n"
+        "def twice(s: str, n: int):\n    return s + s\n"
+        "@lru_cache(maxsize=0)\ndef one():\n    return 1\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert '#include "pcpp.h"' in output
+    assert "int fib(int n);\nint fib_uncached(int n) { " in output
+    assert (
+        'int fib(int n) { static pcpp::Memo<int, int> memo("fib"); '
+        "return memo.get([&] { return fib_uncached(n); },n); }"
+    ) in output
+    assert (
+        'static pcpp::LruMemo<std::string, std::string, int> memo("twice", 64); '
+        "return memo.get([&] { return twice_uncached(s,n); },s,n);"
+    ) in output
+    assert "int one() { return 1; }" in output
+
+
+@pytest.mark.parametrize(
+    "code, message",
+    [
+        ("@property\ndef f(n: int):\n    return n\n", "Unsupported decorator"),
+        ("@lru_cache(typed=True)\ndef f(n: int):\n    return n\n", "lru_cache"),
+        ("import math\n", "Unsupported module: math"),
+        ("@cache\ndef f(n):\n    return n\n", r"Cannot memoize f\(\)"),
+        (
+            "@cache\ndef f(a: list[int]):\n    return a[0]\n",
+            r"Cannot memoize f\(\): a is not hashable",
+        ),
+    ],
+)
+def test_memoized_function_errors(code, message):
+    with pytest.raises(Exception, match=message):
+        pcpp.transpile_code(code, False)
+
+
+def test_append_reserves_before_counted_loops():
+    code = (
+        "def f(n: int):\n    a: list[int] = []\n"
+        "    for i in range(1, n + 1, 2):\n        a.append(i)\n        a.append(-i)\n"
+        "    b: list[str] = []\n    for i in range(n):\n"
+        '        for j in range(n):\n            b.append("x")\n'
+        "    return a\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "std::vector<int> a = std::vector<int> {};\nint _bound0 = n + 1;\n" in output
+    assert (
+        "if (_bound0 > 1) a.reserve(a.size() + 2 * ((_bound0 - 1 + 1) / 2));"
+    ) in output
+    assert "for (int i = 1; i < _bound0; i += 2) { a.push_back(i);" in output
+    assert "b.reserve" not in output
+    assert 'b.push_back(std::string("x"))' in output
+
+
+def test_no_reserve_before_loops_that_end_early():
+    code = (
+        "def f(n: int):\n    a: list[int] = []\n"
+        "    for i in range(4000000000):\n        if i == 3:\n            break\n"
+        "        a.append(i)\n"
+        "    b: list[int] = []\n    for i in range(n):\n"
+        "        if i == 3:\n            return b\n        b.append(i)\n"
+        "    return a\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "reserve" not in output
+    assert "a.push_back(i);" in output and "b.push_back(i);" in output
+
+
+def test_list_comprehensions():
+    code = (
+        "def f(xs: list[int]):\n    return [x * x for x in xs]\n"
+        "def g(n: int):\n"
+        "    return [[i for i in range(j)] for j in range(n) if j > 1]\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert (
+        "return [&] { std::vector<int> _list0; _list0.reserve(xs.size());\n"
+        "for (int x : xs) { _list0.push_back(x * x); } return _list0; }();"
+    ) in output
+    assert "std::vector<std::vector<int>> _list1; for (int j = 0; j < n; ++j)" in output
+    assert "if (j > 0) _list0.reserve(j);" in output
+
+
+def test_comprehension_element_typed_by_iterable():
+    # the element is parsed before the iterable, while c is still auto
+    code = (
+        'def f(s: str):\n    return [c + "x" for c in s]\n'
+        "def g(xs: list[float]):\n    return [x / 2 for x in xs]\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert (
+        "std::vector<std::string> f(const std::string& s) "
+        "{ return [&] { std::vector<std::string> _list0; _list0.reserve(s.size());\n"
+        'for (char c : s) { _list0.push_back(std::string(1, c) + std::string("x")); }'
+    ) in output
+    assert "std::vector<double> g(const std::vector<double>& xs)" in output
+
+
+def test_constant_lists():
+    code = (
+        "def f(i: int):\n    table = [3, 1, 4]\n    w = [0.5, -1.0]\n"
+        "    t = w[0]\n    for x in w:\n        t = t + x\n"
+        "    changed = [1, 2]\n    changed[0] = i\n"
+        "    grown = [1]\n    grown.append(i)\n"
+        "    passed = [1]\n    return table[i] + g(passed) + changed[0] + grown[0]\n"
+        "def g(xs: list[int]):\n    return xs[0]\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "#include <array>" in output
+    assert "static constexpr std::array<int, 3> table = {3,1,4};" in output
+    assert "static constexpr std::array<double, 2> w = {0.5,-1.0};" in output
+    assert "std::vector<int> changed = std::vector<int> {1,2};" in output
+    assert "std::vector<int> grown = std::vector<int> {1};" in output
+    assert "std::vector<int> passed = std::vector<int> {1};" in output
+    # a top-level list passed on by a function, and one it shadows
+    code = (
+        "table = [3, 1, 4]\nkept = [1, 2]\nt = kept[0]\n"
+        "def f():\n    return g(table)\n"
+        "def h(kept: list[int]):\n    return g(kept)\n"
+        "def g(xs: list[int]):\n    return xs[0]\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "std::vector<int> table = std::vector<int> {3,1,4};" in output
+    assert "static constexpr std::array<int, 2> kept = {1,2};" in output
+
+
+def test_empty_list_needs_annotation():
+    with pytest.raises(Exception, match="Cannot infer the type of an empty list"):
+        pcpp.transpile_code("def f():\n    a = []\n    return a\n", False)
+
+
+def test_inner_loop_variables_are_not_invariant():
+    code = (
+        "def f(n: int):\n    t = 0\n    for i in range(n):\n"
+        "        for j in range(n):\n            t = t + j * 2\n    return t\n"
+    )
+    assert "t = t + j * 2;" in pcpp.transpile_code(code, False)
+
+
+def test_recursion_to_loops():
+    code = (
+        "def gcd(a: int, b: int):\n    if b == 0:\n        return a\n"
+        "    return gcd(b, a % b)\n"
+        "def total(n: int):\n    if n == 0:\n        return 0\n"
+        "    return n * 2 + total(n - 1)\n"
+        "def fib(n: int):\n    if n < 2:\n        return n\n"
+        "    return fib(n - 1) + fib(n - 2)\n"
+        "def down(n: int):\n    while n > 0:\n        return down(n - 1)\n"
+        "    return 0\n"
+        "def main():\n    return gcd(84, 126) + total(3) - fib(2) + down(3) - 1\n"
+    )
+    include_flags, tree = pcpp.parse(pcpp.lex(io.StringIO(code)))
+    manager = pcpp.analyze(tree, include_flags)
+    output = tree.evaluate()
+
+    assert manager.context["loops"] == ["gcd", "total"]
+    assert (
+        "int gcd(int a,int b) { while (true) { if (b == 0) { return a; }\n"
+        "int _tail0 = pcpp::floormod(a, b);\na = b;\nb = _tail0;\ncontinue; } }"
+    ) in output
+    assert (
+        "int total(int n) { int _acc0 = 0;\n"
+        "while (true) { if (n == 0) { return _acc0; }\n"
+        "_acc0 = _acc0 + (n * 2);\nn = n - 1;\ncontinue; } }"
+    ) in output
+    assert "return fib(n - 1) + fib(n - 2);" in output
+    assert "return down(_inv1);" in output
+    output = pcpp.transpile_code(code, False)
+    assert output.startswith("// pcpp: recursion turned into loops in gcd, total\n")
+    assert not pcpp.transpile_code("def f():\n    return 1\n", False).startswith("//")
+
+
+def test_accumulator_returns_in_loops():
+    code = (
+        "def f(n: int):\n    for i in range(n):\n        if i > 100:\n"
+        "            return i\n    if n == 0:\n        return 0\n"
+        "    return 1 + f(n - 1)\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert "if (i > 100) { return _acc0 + i; }" in output
+    assert "if (n == 0) { return _acc0; }" in output
+
+
+def test_no_accumulator_under_checked_model():
+    code = (
+        "def total(n: int):\n    if n == 0:\n        return 0\n"
+        "    return n + total(n - 1)\n"
+        "def main():\n    return total(3) + 36\n"
+    )
+    output = pcpp.transpile_code(code, False, int_model="checked")
+    assert "total(pcpp::checked_sub(n, 1))" in output
+
+
+def test_len():
+    code = "def f(a: list[int], s: str):\n    return len(a) + len(s)\n"
+    output = pcpp.transpile_code(code, False)
+    assert "return static_cast<int>(a.size()) + static_cast<int>(s.size());" in output
+    output = pcpp.transpile_code(code, False, int_model="bigint")
+    assert "static_cast<std::int64_t>(a.size())" in output
+
+
+def test_bounds_checks():
+    code = (
+        "def f(a: list[int], j: int):\n    s = 0\n"
+        "    for i in range(1, len(a)):\n        s = s + a[i] - a[i - 1]\n"
+        "    for i in range(len(a) - 1, -1, -1):\n        s = s + a[i]\n"
+        "    k = 0\n    n = len(a)\n"
+        "    while k < n:\n        s = s + a[k]\n        k = k + 1\n"
+        "        s = s + a[k]\n"
+        "    if j < len(a):\n        s = s + a[j]\n"
+        "    if j >= len(a):\n        return s\n"
+        "    return s + a[j + 1]\n"
+        "def main():\n    b = [1, 2, 3]\n    c = [4, 5]\n    c.append(6)\n"
+        "    return f(c, 1) + f(c, 0) + b[2] + c[2]\n"
+    )
+    include_flags, tree = pcpp.parse(pcpp.lex(io.StringIO(code)))
+    manager = pcpp.analyze(tree, include_flags, bounds="checked")
+    output = tree.evaluate()
+
+    assert manager.context["bounds_checks"] == (3, 9)
+    assert "s = s + a[i] - a[i - 1];" in output
+    assert "s = s + a[k];\nk = k + 1;\ns = s + pcpp::at(a, k);" in output
+    assert "if (j < static_cast<int>(a.size())) { s = s + a[j]; }" in output
+    assert "return s + pcpp::at(a, j + 1);" in output
+    assert "b[2] + pcpp::at(c, 2)" in output
+    assert include_flags["array"] and include_flags["pcpp"]
+
+    assert pcpp.transpile_code(code, False, bounds="checked").startswith(
+        "// pcpp: 3 of 9 bounds checks kept\n"
+    )
+    assert "pcpp::at" not in pcpp.transpile_code(code, False)
+
+
+def test_bounds_checks_comprehension_sizes():
+    code = (
+        "def f():\n    a = [0 for i in range(1, 10, 2)]\n"
+        "    b = [i for i in range(10) if i > 4]\n"
+        "    return a[4] + b[4]\n"
+    )
+    output = pcpp.transpile_code(code, False, bounds="checked")
+    assert "return a[4] + pcpp::at(b, 4);" in output
+
+
+def test_bounds_checks_loop_rebinds_accumulator():
+    code = (
+        "def f(a: list[int]):\n    t = 0\n    i = 0\n    i = i + 1\n"
+        "    for i in range(-2, len(a)):\n        t = t + a[i]\n    return t\n"
+    )
+    output = pcpp.transpile_code(code, False, bounds="checked")
+    assert "t = t + pcpp::at(a, i);" in output
+
+
+@pytest.mark.parametrize(
+    "code, defines",
+    [
+        ("r = range(3)\n", []),
+        ("x = sum([1, 2])\n", ["#define PCPP_ARRAY"]),
+        (
+            "from functools import cache\n@cache\ndef f(n: int):\n    return n\n",
+            ["#define PCPP_MEMO"],
+        ),
+    ],
+)
+def test_header_parts(code, defines):
+    header = pcpp.transpile_code(code, False).split('#include "pcpp.h"')[0]
+    assert [line for line in header.splitlines() if "#define" in line] == defines
+
+
+def test_true_division():
+    code = "def f(a: int, b: int, x: float):\n    return a / b + x / 2 + a // b\n"
+    output = pcpp.transpile_code(code, False)
+    assert "double f(int a,int b,double x)" in output
+    assert "static_cast<double>(a) / b + x / 2 + pcpp::floordiv(a, b)" in output
+
+
+def test_arrays():
+    code = (
+        "def f(a: array[float], b: array[float], k: float):\n"
+        "    return a * k + b / 2 - 1\n"
+        "def main():\n    a: array[float] = [1.0, 2.0]\n"
+        "    n: array[int] = [i for i in range(2)]\n"
+        "    m = -n * 3 // 2\n"
+        "    c = f(a, n / 1, 2.0)\n"
+        "    return sum(c) + dot(a, c) + sum(m) + sum([1, 2])\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert (
+        "pcpp::Array<double> f(const pcpp::Array<double>& a,"
+        "const pcpp::Array<double>& b,double k) "
+        "{ return a * k + pcpp::true_divide(b, 2) - 1; }"
+    ) in output
+    assert (
+        "pcpp::Array<double> a = pcpp::Array<double>(std::vector<double> {1.0,2.0});"
+    ) in output
+    assert "pcpp::Array<int> m = -n * 3 / 2;" in output
+    assert "pcpp::Array<double> c = f(a,pcpp::true_divide(n, 1),2.0);" in output
+    assert "pcpp::sum(c) + pcpp::dot(a, c) + pcpp::sum(m)" in output
+    assert '#define PCPP_ARRAY\n#include "pcpp.h"' in output
+
+    output = pcpp.transpile_code(code, False, int_model="int64")
+    assert "pcpp::Array<std::int64_t> m = -n * 3 / 2;" in output
+
+
+@pytest.mark.parametrize(
+    "code, message",
+    [
+        ("a: array[str] = []\n", "Arrays hold int or float"),
+        ("a: array[int] = [1]\nb = a < a\n", "Cannot perform <"),
+        ("a: array[int] = [1]\na.append(2)\n", "Cannot append to array a"),
+        ("x = dot([1], [2])\n", "Cannot compute dot()"),
+        ("x = sum(1, 2)\n", "Invalid number of arguments for sum: 2"),
+    ],
+)
+def test_array_errors(code, message):
+    with pytest.raises(Exception, match=message):
+        pcpp.transpile_code(code, False)
+
+
+def test_parallel_loops():
+    code = (
+        "def f(a: list[float], n: int):\n    s = 0\n    p = 1.0\n"
+        "    for i in prange(1, len(a)):\n        x = a[i] * 2.0\n"
+        "        a[i] = x - 1.0\n        p = x * p\n"
+        "        for j in range(n):\n            if j > i:\n                break\n"
+        "            s = s - j\n"
+        "    return s + p + a[1]\n"
+    )
+    output = pcpp.transpile_code(code, False)
+    assert (
+        "\n#pragma omp parallel for reduction(*:p) reduction(+:s)\n"
+        "for (int i = 1; i < static_cast<int>(a.size()); ++i) "
+    ) in output
+    assert "for (int j = 0; j < n; ++j)" in output
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        ("x = i", "x carries over from one iteration to the next"),
+        ("s = s + i\n        s = s * 2", "s carries over"),
+        ("s = s + i\n        x = x + s", "s is read before the loop has finished"),
+        ("a[i] = a[i - 1]", "a is read at an element other iterations write"),
+        ("a[0] = i", "other iterations may write the same element of a"),
+        ("a[i] = len(a) + f(a, n)", "a is used as a whole"),
+        ("a.append(i)", "every iteration appends to a"),
+        ("if i > 3:\n            break", "break leaves it early"),
+        ("return i", "return leaves it early"),
+    ],
+)
+def test_parallel_loop_errors(body, message):
+    code = (
+        "def f(a: list[int], n: int):\n    s = 0\n    x = 0\n"
+        f"    for i in prange(1, n):\n        {body}\n"
+        "    return s + x\n"
+    )
+    with pytest.raises(Exception, match=f"Cannot parallelize loop over i: {message}"):
+        pcpp.transpile_code(code, False)
+
+
+@pytest.mark.parametrize(
+    "code, int_model, message",
+    [
+        ("s = 0\nfor i in prange(9):\n    s = s + i\n", "checked", "overflow"),
+        ("s = 0\nfor i in prange(9):\n    s = s + i\n", "bigint", "not a native"),
+        ("n = 2\nfor i in prange(0, 9, n):\n    n = 1\n", "int32", "constant step"),
+        ("x = [i for i in prange(9)]\n", "int32", "list comprehension"),
+        ("x = prange(9)\n", "int32", "can only be iterated by a for loop"),
+        (
+            "from functools import cache\n@cache\ndef fib(n: int):\n"
+            "    if n < 2:\n        return n\n    return fib(n - 1) + fib(n - 2)\n"
+            "def g(n: int):\n    return fib(n) + 1\n"
+            "s = 0\nfor i in prange(9):\n    s = s + g(i)\n",
+            "int32",
+            r"g\(\) uses a shared memo table",
+        ),
+    ],
+)
+def test_prange_errors(code, int_model, message):
+    with pytest.raises(Exception, match=message):
+        pcpp.transpile_code(code, False, int_model=int_model)
+
+
+@pytest.mark.parametrize(
+    "code, options, message",
+    [
+        ("s = s + a[i]", {"bounds": "checked"}, "it may raise an exception"),
+        ("s = s + g(a, i)", {"bounds": "checked"}, r"g\(\) may raise an exception"),
+        ("a[i] = a[i] * n", {"int_model": "checked"}, "it may raise an exception"),
+        ("x = sum(b * b)", {}, "it may raise an exception"),
+    ],
+)
+def test_prange_refuses_exceptions(code, options, message):
+    code = (
+        "def g(a: list[int], i: int):\n    return a[i]\n"
+        "def f(a: list[int], b: array[float], n: int):\n    s = 0\n"
+        f"    for i in prange(n):\n        {code}\n    return s\n"
+    )
+    with pytest.raises(Exception, match=message):
+        pcpp.transpile_code(code, False, **options)
+
+
+def test_prange_without_bounds_checks():
+    # a loop over the whole list needs no checks, so nothing can raise
+    code = (
+        "def f(a: list[int]):\n    s = 0\n"
+        "    for i in prange(len(a)):\n        s = s + a[i]\n    return s\n"
+    )
+    output = pcpp.transpile_code(code, False, bounds="checked")
+    assert "#pragma omp parallel for reduction(+:s)" in output
+
+
+def test_prange_with_checked_bounds(tmp_path):
+    # every index in test34 is provably in range, so its loops stay parallel
+    executable = tmp_path / "test"
+    report = build.build(
+        [("test_scripts/test34.py", executable)],
+        cache_dir=tmp_path / "objects",
+        bounds="checked",
+    )
+    assert [program.error for program in report.failures] == []
+    assert subprocess.run([str(executable)], check=False).returncode == 42
+
+
+@pytest.mark.parametrize("file_name", glob.glob("./test_scripts/*.py"))
+def test_script(file_name, tmp_path):
+    executable = tmp_path / "test"
+    report = build.build([(file_name, executable)], cache_dir=tmp_path / "objects")
+    assert [program.error for program in report.failures] == []
 
-        subprocess.run(
-            "clang++ -std=c++20 -o ./.test/test.exe ./.test/test.cpp", check=True
-        )
-        return_value = subprocess.run("./.test/test.exe", check=False)
+    return_value = subprocess.run([str(executable)], check=False)
 
     assert return_value.returncode == 42